@@ -0,0 +1,234 @@
+"""aggregates.py — Statistiques thermiques incrémentales par pièce.
+
+Chaque relevé du pipeline samples met à jour, dans le seau du jour de sa pièce,
+des accumulateurs de Welford (n, moyenne, M2, min, max) par clé :
+
+  all            : toute la journée
+  h07            : heure de la journée
+  d4             : jour de semaine (0 = dimanche, comme storage.dow)
+  hc1 / hc0      : heures creuses / pleines
+  s0626 / s0730  : créneaux 06h20-06h40 et 07h20-07h40 (inertie fin HC → réveil)
+
+pour les mesures shelly, rad et delta (Shelly − radiateur, même relevé).
+Une fenêtre glissante de N jours = fusion de N seaux journaliers (formule de
+Chan), donc un coût constant quel que soit le nombre de relevés. L'état est
+sauvegardé en JSON (AGG_STATE) et amorcé depuis temp_logs s'il est absent ou
+périmé. Un trou de plus d'un seau (arrêt, restauration ancienne) fait
+repartir la période couverte : warm() reste faux jusqu'à ce qu'elle suffise.
+"""
+import json, os
+from datetime import datetime, timedelta
+from config import AGG_STATE, log
+import samples, storage
+
+WINDOW_DAYS = 14          # plus longue fenêtre servie (jours de semaine)
+SLOTS = {"s0626": (6, 20, 40), "s0730": (7, 20, 40)}
+BUCKET = timedelta(days=1)
+
+
+class Welford:
+    __slots__ = ("n", "mean", "m2", "lo", "hi")
+
+    def __init__(self, n=0, mean=0.0, m2=0.0, lo=None, hi=None):
+        self.n, self.mean, self.m2, self.lo, self.hi = n, mean, m2, lo, hi
+
+    def add(self, x: float):
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2   += d * (x - self.mean)
+        self.lo = x if self.lo is None else min(self.lo, x)
+        self.hi = x if self.hi is None else max(self.hi, x)
+
+    def merge(self, o: "Welford"):
+        if not o.n:
+            return self
+        if not self.n:
+            self.n, self.mean, self.m2, self.lo, self.hi = o.n, o.mean, o.m2, o.lo, o.hi
+            return self
+        n = self.n + o.n
+        d = o.mean - self.mean
+        self.mean += d * o.n / n
+        self.m2   += o.m2 + d * d * self.n * o.n / n
+        self.n     = n
+        self.lo, self.hi = min(self.lo, o.lo), max(self.hi, o.hi)
+        return self
+
+    @property
+    def var(self) -> float | None:
+        return self.m2 / (self.n - 1) if self.n > 1 else None
+
+    def dump(self) -> list:
+        return [self.n, self.mean, self.m2, self.lo, self.hi]
+
+
+# jour ISO → pièce → "clé:mesure" → Welford
+_days: dict[str, dict[str, dict[str, Welford]]] = {}
+_covered_since: datetime | None = None   # début de la période vue sans trou
+_last_seen: datetime | None = None       # dernier relevé agrégé
+
+
+def _keys(ts: datetime, hc: bool | None) -> list[str]:
+    keys = ["all", f"h{ts.hour:02d}", f"d{(ts.weekday() + 1) % 7}"]
+    if hc is not None:
+        keys.append(f"hc{int(hc)}")
+    for slot, (h, m0, m1) in SLOTS.items():
+        if ts.hour == h and m0 <= ts.minute <= m1:
+            keys.append(slot)
+    return keys
+
+
+def add(ts: datetime, room: str, rad: float | None, shelly: float | None,
+        hc: bool | None):
+    global _covered_since, _last_seen
+    if _last_seen is not None and ts - _last_seen > BUCKET:
+        _covered_since = None             # trou : la couverture repart d'ici
+    if _covered_since is None:
+        _covered_since = ts
+    _last_seen = max(ts, _last_seen or ts)
+    values = {"rad": rad, "shelly": shelly,
+              "delta": shelly - rad if shelly is not None and rad is not None else None}
+    bucket = _days.setdefault(ts.date().isoformat(), {}).setdefault(room, {})
+    for key in _keys(ts, hc):
+        for metric, v in values.items():
+            if v is not None:
+                bucket.setdefault(f"{key}:{metric}", Welford()).add(v)
+
+
+@samples.subscribe
+def on_sample(s: dict):
+    add(s["ts"], s["room"], s["temp_radiateur"], s["temp_shelly"], s["heure_creuse"])
+
+
+def _first_day(days: int) -> str:
+    """Premier seau d'une fenêtre de `days` jours : celui qui contient
+    maintenant − days (comme timestamp > %s côté SQL), compris."""
+    return (datetime.now() - timedelta(days=days)).date().isoformat()
+
+
+def _prune():
+    oldest = _first_day(WINDOW_DAYS)
+    for day in [d for d in _days if d < oldest]:
+        del _days[day]
+
+
+# ---------------------------------------------------------------------------
+# LECTURES
+# ---------------------------------------------------------------------------
+def warm(days: int) -> bool:
+    """True si les seaux des `days` derniers jours ont été vus en entier
+    (sinon repli SQL)."""
+    return _covered_since is not None and \
+        _covered_since.date().isoformat() < _first_day(days)
+
+
+def window(room: str, days: int) -> dict[str, Welford]:
+    """Accumulateurs fusionnés des seaux couvrant les `days` derniers jours."""
+    _prune()
+    first = _first_day(days)
+    out: dict[str, Welford] = {}
+    for day, rooms in _days.items():
+        if day >= first:
+            for key, w in rooms.get(room, {}).items():
+                out.setdefault(key, Welford()).merge(w)
+    return out
+
+
+def rad_delta(room: str, days: int = 7):
+    """(delta moyen Shelly − radiateur, n) — même forme que la requête SQL."""
+    w = window(room, days).get("all:delta")
+    return (w.mean, w.n) if w and w.n else (None, 0)
+
+
+def salon_rows(room: str):
+    """(hourly, hc_hp, by_day, inertie) aux formats des requêtes de get_salon_stats."""
+    w7, w14 = window(room, 7), window(room, WINDOW_DAYS)
+    hourly = []
+    for h in range(24):
+        amb, rad = w7.get(f"h{h:02d}:shelly"), w7.get(f"h{h:02d}:rad")
+        if amb:
+            hourly.append((h, amb.mean, rad.mean if rad else None, amb.n))
+    hc_hp = {hc: (hc, w.mean, w.n) for hc in (True, False)
+             if (w := w7.get(f"hc{int(hc)}:shelly"))}
+    by_day = [(d, w.mean, w.n) for d in range(7) if (w := w14.get(f"d{d}:shelly"))]
+
+    # Inertie : moyenne sur les jours ayant les deux créneaux
+    first = _first_day(7)
+    fin, reveil = [], []
+    for day, rooms in _days.items():
+        b = rooms.get(room, {})
+        if day >= first and "s0626:shelly" in b and "s0730:shelly" in b:
+            fin.append(b["s0626:shelly"].mean); reveil.append(b["s0730:shelly"].mean)
+    inertie = (sum(fin) / len(fin), sum(reveil) / len(reveil), len(fin)) if fin \
+        else (None, None, 0)
+    return hourly, hc_hp, by_day, inertie
+
+
+# ---------------------------------------------------------------------------
+# PERSISTANCE
+# ---------------------------------------------------------------------------
+def save(path: str = AGG_STATE):
+    try:
+        _prune()
+        state = {"covered_since": _covered_since.isoformat() if _covered_since else None,
+                 "last_seen": _last_seen.isoformat() if _last_seen else None,
+                 "days": {d: {r: {k: w.dump() for k, w in keys.items()}
+                              for r, keys in rooms.items()} for d, rooms in _days.items()}}
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+    except Exception as e:
+        log(f"Agrégats save ERR: {e}")
+
+
+def load(path: str = AGG_STATE) -> bool:
+    """Restaure l'état ; False (→ warmup) s'il est absent ou périmé."""
+    global _covered_since, _last_seen
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path) as f:
+            state = json.load(f)
+        seen = state.get("last_seen")
+        if not seen or datetime.now() - datetime.fromisoformat(seen) > BUCKET:
+            log("Agrégats : état périmé, réamorçage depuis la base")
+            return False
+        _days.clear()
+        for d, rooms in state["days"].items():
+            _days[d] = {r: {k: Welford(*v) for k, v in keys.items()}
+                        for r, keys in rooms.items()}
+        cs = state["covered_since"]
+        _covered_since = datetime.fromisoformat(cs) if cs else None
+        _last_seen = datetime.fromisoformat(seen)
+        _prune()
+        log(f"Agrégats restaurés ({len(_days)} jours)")
+        return True
+    except Exception as e:
+        log(f"Agrégats load ERR: {e}")
+        return False
+
+
+def warmup():
+    """Amorce les seaux depuis temp_logs (WINDOW_DAYS derniers jours)."""
+    global _covered_since, _last_seen
+    if not storage.ENABLED:
+        return
+    since = datetime.now() - timedelta(days=WINDOW_DAYS)
+    try:
+        _days.clear()
+        _covered_since = _last_seen = None
+        n = 0
+        for rows in storage.stream(
+                "SELECT timestamp, room, temp_radiateur, temp_shelly, heure_creuse"
+                " FROM temp_logs WHERE timestamp > %s ORDER BY timestamp",
+                (since,), name="agg_warmup"):
+            for ts, room, rad, shelly, hc in rows:
+                add(storage.as_datetime(ts), room, rad, shelly,
+                    None if hc is None else bool(hc))
+            n += len(rows)
+        if _last_seen is not None:        # la base couvre la fenêtre
+            _covered_since = since
+        log(f"Agrégats amorcés depuis la base ({n} relevés)")
+    except Exception as e:
+        log(f"Agrégats warmup ERR: {e}")
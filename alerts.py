@@ -0,0 +1,163 @@
+"""alerts.py — Alertes automatiques vers ADMIN_CHAT_ID.
+
+Règles déclaratives (ALERT_RULES en JSON, sinon DEFAULT_RULES) :
+
+  {"type": "below"|"above", "room": "Salon"|"*", "metric": "temp_shelly",
+   "value": 16, "for_min": 30}          seuil tenu pendant for_min minutes
+  {"type": "stale", "room": "*", "metric": "temp_radiateur", "max_min": 180}
+                                        aucun relevé de la série depuis max_min
+  {"type": "bec_hp", "cap": 99, "for_min": 10}
+                                        résistance du ballon active en HP
+  {"type": "db_errors", "value": 3}     écritures temp_logs en échec consécutif
+
+Les règles de seuil sont indexées par série (pièce, métrique) : un relevé
+(samples.subscribe) n'évalue que les règles de sa série et celles de "*".
+Les règles d'état (stale, bec_hp, db_errors) sont réévaluées par tick().
+
+Une alerte part une fois par épisode (réarmée quand la condition cesse), au
+plus une fois par ALERT_REPEAT_S pour une même clé et ALERT_MAX_PER_HOUR au
+total. Les messages sont déposés dans une file vidée par run() : l'ingestion
+n'attend jamais Telegram.
+"""
+import asyncio, time
+from collections import defaultdict, deque
+from datetime import datetime
+from config import (ADMIN_CHAT_ID, ALERT_RULES, ALERT_REPEAT_S, ALERT_MAX_PER_HOUR,
+                    ALERT_TICK_S, log)
+import samples, bec_watch, tariff, health
+
+DEFAULT_RULES = [
+    {"name": "Pièce froide", "type": "below", "room": "*", "metric": "temp_radiateur",
+     "value": 14, "for_min": 30},
+    {"name": "Salon froid", "type": "below", "room": "Salon", "metric": "temp_shelly",
+     "value": 16, "for_min": 30},
+    {"name": "Relevés radiateurs absents", "type": "stale", "room": "*",
+     "metric": "temp_radiateur", "max_min": 180},
+    {"name": "Résistance ballon en HP", "type": "bec_hp", "cap": 99, "for_min": 10},
+    {"name": "Écriture base en échec", "type": "db_errors", "value": 3},
+]
+UNITS = {"temp_radiateur": "°C", "temp_shelly": "°C", "consigne": "°C"}
+
+_index: dict[tuple[str, str], list[dict]] = defaultdict(list)
+_state_rules: list[dict] = []
+_seen: dict[tuple[str, str], datetime] = {}    # dernier relevé par série
+_since: dict[tuple, datetime] = {}             # condition vraie depuis
+_fired: set[tuple] = set()
+_outbox: deque[str] = deque(maxlen=50)
+_sent: dict[tuple, float] = {}
+_hour: deque[float] = deque()
+suppressed = 0
+
+
+def load_rules(rules: list[dict]):
+    """(Ré)indexe les règles ; chacune reçoit un nom par défaut."""
+    _index.clear(); _state_rules.clear()
+    for i, r in enumerate(rules):
+        r = {"name": f"règle {i + 1}", "room": "*", "for_min": 0, **r}
+        if r["type"] in ("below", "above"):
+            _index[(r["room"], r["metric"])].append(r)
+        else:
+            _state_rules.append(r)
+
+
+# ---------------------------------------------------------------------------
+# ÉPISODES + LIMITATION
+# ---------------------------------------------------------------------------
+def _episode(key: tuple, active: bool, ts: datetime, for_min: float, text: str):
+    if not active:
+        _since.pop(key, None)
+        if key in _fired:
+            _fired.discard(key)
+            notify(key + ("fin",), f"✅ Fin : {key[0]}" + (f" ({key[1]})" if key[1] else ""))
+        return
+    since = _since.setdefault(key, ts)
+    if key not in _fired and (ts - since).total_seconds() >= for_min * 60:
+        _fired.add(key)
+        notify(key, text)
+
+
+def notify(key: tuple, text: str) -> bool:
+    """Dépose une alerte dans la file si les limites le permettent."""
+    global suppressed
+    now = time.monotonic()
+    while _hour and now - _hour[0] > 3600:
+        _hour.popleft()
+    if now - _sent.get(key, -ALERT_REPEAT_S) < ALERT_REPEAT_S or len(_hour) >= ALERT_MAX_PER_HOUR:
+        suppressed += 1
+        log(f"Alerte limitée : {text}")
+        return False
+    _sent[key] = now
+    _hour.append(now)
+    _outbox.append(text)
+    log(f"Alerte : {text}")
+    return True
+
+
+# ---------------------------------------------------------------------------
+# ÉVALUATION
+# ---------------------------------------------------------------------------
+@samples.subscribe
+def on_sample(s: dict):
+    room, ts = s["room"], s["ts"]
+    for metric, unit in UNITS.items():
+        v = s.get(metric)
+        if v is None:
+            continue
+        _seen[(room, metric)] = ts
+        for r in _index.get((room, metric), []) + _index.get(("*", metric), []):
+            bad = v < r["value"] if r["type"] == "below" else v > r["value"]
+            sign = "<" if r["type"] == "below" else ">"
+            _episode((r["name"], room), bad, ts, r["for_min"],
+                     f"⚠️ {r['name']} — {room} : {v:.1f}{unit} {sign} {r['value']}{unit}"
+                     + (f" depuis {r['for_min']} min" if r["for_min"] else ""))
+
+
+@bec_watch.subscribe
+def on_bec_change(ts: datetime, changes: dict):
+    _check_bec(ts)
+
+
+def _check_bec(ts: datetime):
+    caps = bec_watch.state()
+    for r in _state_rules:
+        if r["type"] == "bec_hp" and r["cap"] in caps:
+            on = caps[r["cap"]] not in (None, "0")
+            _episode((r["name"], ""), on and not tariff.is_hc(ts), ts, r["for_min"],
+                     f"⚡ {r['name']} — {tariff.label(ts)}")
+
+
+def tick(now: datetime | None = None):
+    """Règles d'état : fraîcheur des séries, ballon, écritures en base."""
+    now = now or datetime.now()
+    for r in _state_rules:
+        if r["type"] == "stale":
+            series = [k for k in _seen if k[1] == r["metric"] and r["room"] in ("*", k[0])]
+            for room, metric in series:
+                age = (now - _seen[(room, metric)]).total_seconds() / 60
+                _episode((r["name"], room), age > r["max_min"], now, 0,
+                         f"📡 {r['name']} — {room} : aucun relevé depuis {age:.0f} min")
+        elif r["type"] == "db_errors":
+            n = samples.write_failures
+            _episode((r["name"], ""), n >= r["value"], now, 0,
+                     f"💾 {r['name']} — {n} écritures temp_logs échouées d'affilée")
+    _check_bec(now)
+
+
+async def run(bot):
+    """Évalue les règles d'état toutes les ALERT_TICK_S et envoie la file."""
+    last_tick = 0.0
+    while True:
+        try:
+            if time.monotonic() - last_tick >= ALERT_TICK_S:
+                last_tick = time.monotonic()
+                tick()
+                health.ok("alerts")
+            while _outbox and ADMIN_CHAT_ID:
+                await bot.send_message(ADMIN_CHAT_ID, _outbox[0])
+                _outbox.popleft()
+        except Exception as e:
+            log(f"Alertes ERR: {e}")
+        await asyncio.sleep(5)
+
+
+load_rules(ALERT_RULES or DEFAULT_RULES)
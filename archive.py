@@ -0,0 +1,248 @@
+"""archive.py — Archives colonnaires locales de temp_logs et bec_transitions.
+
+Les tables sont lues en flux (storage.stream : curseur serveur nommé sous
+PostgreSQL) et écrites par mois (et par
+pièce pour temp_logs) en fichiers compressés : Parquet (lu en memory-map) si
+pyarrow est installé, sinon NumPy .npz compressé.
+Les horodatages sont des int64 : secondes epoch de l'heure naïve stockée en
+base (round-trip exact via to_datetime()).
+
+    python archive.py export [AAAA-MM]   # incrémental, ou à partir du mois donné
+    python archive.py info
+"""
+import os, sys, time
+import numpy as np
+from datetime import datetime, timezone
+from config import ARCHIVE_DIR, log
+import storage
+
+try:
+    import pyarrow as pa, pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+CHUNK = 5000
+
+# Colonnes archivées (hors timestamp) : nom → dtype NumPy
+TABLES = {
+    "temp_logs": {"by_room": True, "cols": {
+        "temp_radiateur": "f4", "temp_shelly": "f4",
+        "consigne": "f4", "heure_creuse": "i1"}},
+    "bec_transitions": {"by_room": False, "cols": {
+        "index_kwh": "f8", "heure_creuse": "i1", "temp_eau": "f4"}},
+    "bec_samples": {"by_room": False, "cols": {
+        "index_kwh": "f8", "v40": "f4", "v40_total": "f4", "v40_pct": "f4",
+        "t_haut": "f4", "t_milieu": "f4", "t_bas": "f4"}},
+}
+EXT = ".parquet" if pq else ".npz"
+NO_ROOM = "_sans_piece"      # fichier des lignes temp_logs sans pièce (room NULL)
+
+
+def to_datetime(ts: int) -> datetime:
+    return datetime.fromtimestamp(int(ts), timezone.utc).replace(tzinfo=None)
+
+
+def to_epoch(dt: datetime) -> int:
+    return int(dt.replace(tzinfo=timezone.utc).timestamp())
+
+
+# ---------------------------------------------------------------------------
+# ÉCRITURE
+# ---------------------------------------------------------------------------
+def _room_file(room: str | None) -> str:
+    return (NO_ROOM if room is None else room.replace("/", "_")) + EXT
+
+
+def _path(table: str, month: str, room: str | None) -> str:
+    base = os.path.join(ARCHIVE_DIR, table)
+    if not TABLES[table]["by_room"]:
+        return os.path.join(base, month + EXT)
+    return os.path.join(base, month, _room_file(room))
+
+
+def _to_arrays(table: str, rows: list) -> dict:
+    cols = TABLES[table]["cols"]
+    out  = {"ts": np.fromiter((r[0] for r in rows), dtype="i8", count=len(rows))}
+    for j, (col, dt) in enumerate(cols.items(), start=1):
+        if dt == "i1":   # booléen nullable : 1/0, -1 = inconnu
+            vals = (-1 if r[j] is None else int(r[j]) for r in rows)
+        else:
+            vals = (np.nan if r[j] is None else r[j] for r in rows)
+        out[col] = np.fromiter(vals, dtype=dt, count=len(rows))
+    return out
+
+
+def _write(path: str, arrays: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    if pq:
+        pq.write_table(pa.table(arrays), tmp, compression="zstd")
+    else:
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, **arrays)
+    os.replace(tmp, path)
+
+
+def last_month(table: str) -> str | None:
+    base = os.path.join(ARCHIVE_DIR, table)
+    if not os.path.isdir(base):
+        return None
+    months = [m.removesuffix(EXT) for m in os.listdir(base) if m[:4].isdigit()]
+    return max(months) if months else None
+
+
+def archived_until(table: str) -> datetime | None:
+    """Début du dernier mois archivé (réécrit à chaque export) : les lignes
+    antérieures sont complètes dans l'archive. None si jamais archivée."""
+    month = last_month(table)
+    return datetime.strptime(month, "%Y-%m") if month else None
+
+
+def export_table(table: str, since: str | None = None) -> int:
+    """Exporte `table` à partir du mois `since` (AAAA-MM, défaut : dernier mois
+    archivé, réécrit car potentiellement partiel). Les mois antérieurs au
+    dernier archivé ne sont jamais réécrits : la rétention a pu en purger le
+    brut. Retourne le nb de lignes."""
+    spec  = TABLES[table]
+    last  = last_month(table)
+    if since and last and since < last:
+        log(f"Archive {table} : mois avant {last} déjà archivés, non réécrits")
+        since = last
+    since = since or last or "1970-01"
+    room  = "room, " if spec["by_room"] else ""
+    sql = (f"SELECT {storage.month('timestamp')}, {room}"
+           f"{storage.epoch('timestamp')}, {', '.join(spec['cols'])}"
+           f" FROM {table} WHERE timestamp >= %s ORDER BY timestamp")
+    buffers, month, total = {}, None, 0
+
+    def flush():
+        for key, rows in buffers.items():
+            _write(_path(table, month, key), _to_arrays(table, rows))
+        buffers.clear()
+
+    for chunk in storage.stream(sql, (datetime.strptime(since, "%Y-%m"),),
+                             name=f"export_{table}"):
+        for r in chunk:
+            if r[0] != month:
+                flush(); month = r[0]
+            key, rest = (r[1], r[2:]) if spec["by_room"] else (None, r[1:])
+            buffers.setdefault(key, []).append(rest)
+        total += len(chunk)
+    flush()
+    return total
+
+
+def export_all(since: str | None = None) -> dict:
+    if not storage.ENABLED:
+        return {}
+    out = {}
+    for table in TABLES:
+        t0 = time.monotonic()
+        try:
+            out[table] = export_table(table, since)
+            log(f"Archive {table} : {out[table]} lignes en {time.monotonic()-t0:.1f}s")
+        except Exception as e:
+            log(f"Archive {table} ERR: {e}")
+    return out
+
+
+# ---------------------------------------------------------------------------
+# CHARGEMENT
+# ---------------------------------------------------------------------------
+def _read(path: str) -> dict:
+    if path.endswith(".parquet"):
+        t = pq.read_table(path, memory_map=True)
+        return {c: t.column(c).to_numpy() for c in t.column_names}
+    with np.load(path) as z:
+        return {k: z[k] for k in z.files}
+
+
+def _files(table: str, room: str | None, start: datetime | None, end: datetime | None):
+    base = os.path.join(ARCHIVE_DIR, table)
+    if not os.path.isdir(base):
+        return []
+    m0 = start.strftime("%Y-%m") if start else "0000-00"
+    m1 = end.strftime("%Y-%m") if end else "9999-99"
+    paths = []
+    for entry in sorted(os.listdir(base)):
+        month = entry.removesuffix(".parquet").removesuffix(".npz")
+        if not (m0 <= month <= m1):
+            continue
+        if TABLES[table]["by_room"]:
+            p = os.path.join(base, entry, _room_file(room))
+        else:
+            p = os.path.join(base, entry)
+        if os.path.exists(p) and p.endswith(EXT):
+            paths.append(p)
+    return paths
+
+
+def _concat(parts: list, table: str) -> dict:
+    if not parts:
+        empty = {"ts": np.empty(0, "i8")}
+        empty.update({c: np.empty(0, dt) for c, dt in TABLES[table]["cols"].items()})
+        return empty
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+
+def load(table: str, room: str | None = None, start: datetime | None = None,
+         end: datetime | None = None) -> dict:
+    """Colonnes NumPy de l'archive (clé 'ts' = int64), triées par temps."""
+    data = _concat([_read(p) for p in _files(table, room, start, end)], table)
+    if start or end:
+        ts   = data["ts"]
+        mask = np.ones(len(ts), bool)
+        if start: mask &= ts >= to_epoch(start)
+        if end:   mask &= ts <  to_epoch(end)
+        data = {k: v[mask] for k, v in data.items()}
+    return data
+
+
+def history(table: str, room: str | None = None, start: datetime | None = None,
+            end: datetime | None = None) -> dict:
+    """Archive locale complétée par les lignes plus récentes lues en base."""
+    data = load(table, room, start, end)
+    if not storage.ENABLED:
+        return data
+    after = to_datetime(data["ts"][-1] + 1) if len(data["ts"]) else start
+    spec  = TABLES[table]
+    sql   = (f"SELECT {storage.epoch('timestamp')}, {', '.join(spec['cols'])}"
+             f" FROM {table} WHERE timestamp >= %s")
+    params = [after or datetime(1970, 1, 1)]
+    if spec["by_room"]:
+        sql += " AND room = %s"; params.append(room)
+    if end:
+        sql += " AND timestamp < %s"; params.append(end)
+    sql += " ORDER BY timestamp"
+    try:
+        tail = [_to_arrays(table, rows)
+                for rows in storage.stream(sql, params, name=f"history_{table}")]
+    except Exception as e:
+        log(f"Archive history {table} ERR: {e}"); tail = []
+    return _concat([data] + tail, table) if tail else data
+
+
+# ---------------------------------------------------------------------------
+# EXPORT CSV (commande /export)
+# ---------------------------------------------------------------------------
+CSV_HEADER = ["timestamp", "room", "temp_radiateur", "temp_shelly",
+              "consigne", "heure_creuse"]
+
+
+def csv_chunks(room: str | None, since: datetime, size: int = CHUNK):
+    """Paquets de lignes temp_logs (ordre chronologique) pour l'export CSV."""
+    sql = (f"SELECT {', '.join(CSV_HEADER)} FROM temp_logs WHERE timestamp >= %s")
+    params = [since]
+    if room:
+        sql += " AND room = %s"; params.append(room)
+    sql += " ORDER BY timestamp"
+    return storage.stream(sql, params, name="export_csv", size=size)
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "info"
+    if cmd == "export":
+        print(export_all(sys.argv[2] if len(sys.argv) > 2 else None))
+    else:
+        for table in TABLES:
+            print(f"{table}: dernier mois archivé {last_month(table)} ({EXT})")
@@ -0,0 +1,228 @@
+"""backtest.py — Rejeu de l'historique sous des programmations alternatives.
+
+Radiateurs : pour chaque pièce, le modèle RC de thermal.py est ajusté sur la
+période, puis les résidus historiques (écart entre la température mesurée et
+la prédiction du modèle, pas à pas) sont rejoués : météo, apports et
+ouvertures restent ceux qui ont eu lieu, seule la consigne change. Le
+thermostat chauffe (u = 1) tant que T < consigne. Inconfort = temps passé
+sous la consigne confort − COMFORT_TOL alors que le foyer demandait le
+confort (consigne historique ≥ confort − COMFORT_TOL).
+
+Ballon : bilan journalier. Énergie puisée = énergie mesurée (bec_transitions)
+− pertes statiques à la température historique ; sous un profil candidat
+(CAPS_QTITE, % par jour), besoin = puisage + pertes à la nouvelle consigne,
+capacité = volume × (T − T_froide). Le surplus au-delà de la capacité est
+chauffé en HP et compté comme manque d'eau chaude.
+
+Les candidats sont répartis par lots sur un ProcessPoolExecutor ; dans un lot
+la simulation avance pas à pas en NumPy sur la matrice candidats × pièces.
+
+    python backtest.py [jours]          # programmation historique + balayage
+"""
+import os, sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from config import (CONFORT_VALS, RAD_POWER_W, TARIFF_PRICES, COMFORT_TOL,
+                    BEC_VOLUME_L, BEC_LOSS_W_K, BEC_COLD_C, log)
+import archive, thermal, tariff, cost
+from bec import pct_to_temp
+
+STEP      = 300
+MAX_BATCH = 32          # candidats simulés ensemble (mémoire : lot × pièces × pas)
+WH_K_L    = 1.163       # Wh pour chauffer 1 L d'eau de 1 K
+
+_ctx: dict = {}         # contexte partagé par les processus (initializer)
+
+
+# ---------------------------------------------------------------------------
+# PROGRAMMATIONS CANDIDATES
+# ---------------------------------------------------------------------------
+def candidate(name: str, windows: dict[int, list[tuple[int, int]]] | None = None,
+              bec_pct: list[int] | None = None) -> dict:
+    """windows : jour (0 = lundi) → [(début, fin) en minutes] en confort ;
+    None = consigne historique. bec_pct : % par jour (Lun→Dim), None = historique."""
+    return {"name": name, "windows": windows, "bec_pct": bec_pct}
+
+
+def weekly(start_min: int, end_min: int, days=range(7)) -> dict[int, list[tuple[int, int]]]:
+    return {d: [(start_min, end_min)] for d in days}
+
+
+def _comfort_mask(windows: dict, t: np.ndarray) -> np.ndarray:
+    table = np.zeros((7, 1440), bool)
+    for d, spans in windows.items():
+        for a, b in spans:
+            table[d, a:b] = True
+    day = t // 86400
+    return table[(day + 3) % 7, (t % 86400) // 60]     # 01/01/1970 = jeudi
+
+
+# ---------------------------------------------------------------------------
+# CONTEXTE (processus parent)
+# ---------------------------------------------------------------------------
+def build_context(start: datetime, end: datetime) -> dict:
+    rooms, series, params = [], [], []
+    for v in CONFORT_VALS.values():
+        s = thermal.room_series(v["name"], start, end, STEP)
+        f = thermal.fit_arrays(s["t"], s["temp"], s["u"], STEP) if s else None
+        if not f or not f["tau_h"] or f["power"] is None:
+            log(f"Backtest : {v['name']} ignorée (modèle indisponible)")
+            continue
+        rooms.append(v); series.append(s)
+        params.append((-1 / f["tau_h"], f["t_ext"] / f["tau_h"], f["power"]))
+    t  = np.arange(archive.to_epoch(start), archive.to_epoch(end), STEP, dtype="i8")
+    dt = STEP / 3600
+    a, c, b = (np.array(p) for p in zip(*params)) if params else (np.empty(0),) * 3
+    temp  = np.array([s["temp"] for s in series]).reshape(len(rooms), len(t))
+    u     = np.nan_to_num(np.array([s["u"] for s in series]).reshape(len(rooms), len(t)))
+    cons  = np.array([s["consigne"] for s in series]).reshape(len(rooms), len(t))
+    pred  = temp[:, :-1] + (a[:, None] * temp[:, :-1] + c[:, None] + b[:, None] * u[:, :-1]) * dt
+    resid = np.nan_to_num(temp[:, 1:] - pred)
+    conf  = np.array([v["temp"] for v in rooms])
+    with np.errstate(invalid="ignore"):
+        occupied = np.nan_to_num(cons, nan=-np.inf) >= (conf - COMFORT_TOL)[:, None]
+
+    # Ballon : puisage journalier estimé à partir de l'historique
+    d0 = archive.to_epoch(start) // 86400
+    n_days = (archive.to_epoch(end) - 1) // 86400 - d0 + 1
+    ia, _, kwh, eur, _ = cost.bec_intervals(start, end)
+    bec_kwh = np.bincount(ia // 86400 - d0, kwh, n_days) if len(ia) else np.zeros(n_days)
+    bec_eur = np.bincount(ia // 86400 - d0, eur, n_days) if len(ia) else np.zeros(n_days)
+    hist_t  = _bec_hist_temp(start, end, d0, n_days)
+    loss    = BEC_LOSS_W_K * 24 / 1000                   # kWh/jour par K
+    draw    = np.maximum(0.0, bec_kwh - loss * (hist_t - 20))
+    days    = np.arange(d0, d0 + n_days)
+    return {
+        "rooms": [v["name"] for v in rooms], "t": t, "a": a, "c": c, "b": b,
+        "temp0": np.nan_to_num(temp[:, 0], nan=16.0) if len(rooms) else np.empty(0),
+        "resid": resid, "hist_sp": np.nan_to_num(cons), "occupied": occupied,
+        "comfort": conf, "eco": np.array([v["eco"] for v in rooms]),
+        "power": np.array([RAD_POWER_W.get(v["name"], RAD_POWER_W.get("*", 1000)) / 1000
+                           for v in rooms]),
+        "price": cost.PRICES[tariff.classify(t)],
+        "draw": draw, "dow": (days + 3) % 7, "bec_hist": (bec_kwh.sum(), bec_eur.sum()),
+        "p_hc": TARIFF_PRICES.get("HC", cost.PRICES.min()),
+        "p_hp": TARIFF_PRICES.get("HP", cost.PRICES.max()),
+    }
+
+
+def _bec_hist_temp(start, end, d0, n_days) -> np.ndarray:
+    data = archive.history("bec_transitions", None, start, end)
+    out  = np.full(n_days, np.nan)
+    ok   = np.isfinite(data["temp_eau"])
+    if ok.any():
+        k = data["ts"][ok] // 86400 - d0
+        n = np.bincount(k, minlength=n_days)
+        s = np.bincount(k, data["temp_eau"][ok].astype("f8"), n_days)
+        out = np.where(n > 0, s / np.maximum(n, 1), np.nan)
+    fallback = np.nanmean(out) if np.isfinite(out).any() else pct_to_temp(80)
+    return np.where(np.isfinite(out), out, fallback)
+
+
+# ---------------------------------------------------------------------------
+# SIMULATION (processus de travail)
+# ---------------------------------------------------------------------------
+def _init(ctx: dict):
+    global _ctx
+    _ctx = ctx
+
+
+def _simulate_batch(cands: list[dict]) -> list[dict]:
+    x = _ctx
+    R, K = len(x["rooms"]), len(x["t"])
+    C = len(cands)
+    # Consignes (C, R, K)
+    sp = np.empty((C, R, K), dtype="f4")
+    for i, cd in enumerate(cands):
+        if cd["windows"] is None:
+            sp[i] = x["hist_sp"]
+        else:
+            m = _comfort_mask(cd["windows"], x["t"])
+            sp[i] = np.where(m[None, :], x["comfort"][:, None], x["eco"][:, None])
+    dt = STEP / 3600
+    a, c, b = x["a"][None, :], x["c"][None, :], x["b"][None, :]
+    T  = np.repeat(x["temp0"][None, :], C, axis=0)
+    on_kwh = np.zeros((C, R)); eur = np.zeros((C, R)); miss = np.zeros((C, R))
+    lim = (x["comfort"] - COMFORT_TOL)[None, :]
+    for k in range(K - 1):
+        u = T < sp[:, :, k]
+        kwh = u * x["power"][None, :] * dt
+        on_kwh += kwh
+        eur    += kwh * x["price"][k]
+        miss   += (T < lim) & x["occupied"][None, :, k]
+        T = T + (a * T + c + b * u) * dt + x["resid"][None, :, k]
+
+    out = []
+    for i, cd in enumerate(cands):
+        res = {"name": cd["name"], "rad_kwh": float(on_kwh[i].sum()),
+               "rad_eur": float(eur[i].sum()), "miss_h": float(miss[i].sum() * dt),
+               "miss_rooms": {r: round(float(miss[i, j] * dt), 1)
+                              for j, r in enumerate(x["rooms"])}}
+        res.update(_bec(cd["bec_pct"]))
+        out.append(res)
+    return out
+
+
+def _bec(pct: list[int] | None) -> dict:
+    x = _ctx
+    if pct is None:
+        kwh, eur = x["bec_hist"]
+        return {"bec_kwh": float(kwh), "bec_eur": float(eur), "bec_miss_days": 0}
+    t_target = np.array([pct_to_temp(p) for p in pct])[x["dow"]]
+    need = x["draw"] + BEC_LOSS_W_K * 24 / 1000 * (t_target - 20)
+    cap  = BEC_VOLUME_L * WH_K_L * (t_target - BEC_COLD_C) / 1000
+    hc   = np.minimum(need, cap)
+    hp   = need - hc
+    return {"bec_kwh": float(need.sum()),
+            "bec_eur": float((hc * x["p_hc"] + hp * x["p_hp"]).sum()),
+            "bec_miss_days": int((hp > 0.05).sum())}
+
+
+def run(cands: list[dict], start: datetime, end: datetime,
+        workers: int | None = None) -> list[dict]:
+    """Évalue les candidats sur [start, end) ; résultats dans le même ordre."""
+    ctx = build_context(start, end)
+    workers = workers or os.cpu_count() or 1
+    size = min(MAX_BATCH, max(1, -(-len(cands) // workers)))
+    batches = [cands[i:i + size] for i in range(0, len(cands), size)]
+    if workers == 1 or len(batches) == 1:
+        _init(ctx)
+        return [r for bt in batches for r in _simulate_batch(bt)]
+    with ProcessPoolExecutor(workers, initializer=_init, initargs=(ctx,)) as pool:
+        return [r for res in pool.map(_simulate_batch, batches) for r in res]
+
+
+def sweep_candidates() -> list[dict]:
+    """Balayage par défaut : horaires confort × profils de quantité ballon."""
+    out = [candidate("historique")]
+    profiles = {"60%": [60] * 7, "80/100%": [80] * 5 + [100] * 2, "100%": [100] * 7}
+    for start in range(5 * 60, 8 * 60 + 1, 30):
+        for end in range(21 * 60, 23 * 60 + 1, 30):
+            for pname, pct in profiles.items():
+                out.append(candidate(f"{start // 60:02d}h{start % 60:02d}-{end // 60:02d}h{end % 60:02d} {pname}",
+                                     weekly(start, end), pct))
+    return out
+
+
+def format_results(results: list[dict], top: int = 10) -> str:
+    lines = [f"{'programme':<24}{'rad kWh':>9}{'rad €':>8}{'inconf h':>9}"
+             f"{'bec kWh':>9}{'bec €':>8}{'manques':>8}{'total €':>9}"]
+    ranked = sorted(results, key=lambda r: (r["miss_h"] > results[0]["miss_h"] + 1,
+                                            r["rad_eur"] + r["bec_eur"]))
+    for r in [results[0]] + [r for r in ranked if r is not results[0]][:top]:
+        lines.append(f"{r['name']:<24}{r['rad_kwh']:9.0f}{r['rad_eur']:8.2f}{r['miss_h']:9.1f}"
+                     f"{r['bec_kwh']:9.0f}{r['bec_eur']:8.2f}{r['bec_miss_days']:8d}"
+                     f"{r['rad_eur'] + r['bec_eur']:9.2f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import time
+    days  = int(sys.argv[1]) if len(sys.argv) > 1 else 90
+    end   = datetime.now().replace(minute=0, second=0, microsecond=0)
+    cands = sweep_candidates()
+    t0    = time.monotonic()
+    res   = run(cands, end - timedelta(days=days), end)
+    print(format_results(res))
+    print(f"\n{len(cands)} programmes × {days} jours en {time.monotonic() - t0:.1f}s")
@@ -1,13 +1,17 @@
 """Module BEC — Ballon eau chaude Atlantic/Sauter via API Magellan."""
-import asyncio, json, httpx, psycopg2
-from datetime import datetime
-from config import ATLANTIC_API, CLIENT_BASIC, BEC_USER, BEC_PASS, DB_URL, HC_TRANSITIONS, log
+import asyncio, json, httpx
+from datetime import datetime, timedelta
+from config import ATLANTIC_API, CLIENT_BASIC, BEC_USER, BEC_PASS, log
+import storage, tariff, cost, singleflight, ratelimit, breaker
 
 # cap237-243 = consigne quantité par jour (Lun→Dim)
 # Formule confirmée : % affiché app = 3×T − 90  ↔  T = (%+90)/3
 # Exemple : 60% → 50°C, 80% → 56.7°C, 100% → 63.3°C
 CAPS_QTITE = [237, 238, 239, 240, 241, 242, 243]
 
+# Dernier état lu (servi tant que le disjoncteur "magellan" est ouvert)
+_cache = {"caps": None, "name": "Chauffe-eau", "at": None}
+
 def pct_to_temp(pct: int) -> float:
     return round((pct + 90) / 3, 1)
 
@@ -15,41 +19,26 @@ def pct_to_temp(pct: int) -> float:
 # ---------------------------------------------------------------------------
 # HEURES CREUSES
 # ---------------------------------------------------------------------------
+# Définition unique dans tariff.py (tables compilées) ; noms conservés
 def is_heure_creuse(dt: datetime = None) -> bool:
-    if dt is None:
-        dt = datetime.now()
-    m = dt.hour * 60 + dt.minute
-    return (0*60+56 <= m < 6*60+26) or (14*60+26 <= m < 16*60+56)
+    return tariff.is_hc(dt)
 
 def get_hc_label() -> str:
-    now = datetime.now()
-    m   = now.hour * 60 + now.minute
-    if is_heure_creuse(now):
-        ends = [6*60+26, 16*60+56]
-        fin  = min((e for e in ends if e > m), default=6*60+26)
-        return f"🟢 HC jusqu'à {fin//60:02d}h{fin%60:02d}"
-    starts    = [0*60+56, 14*60+26]
-    prochains = [s for s in starts if s > m]
-    nxt = min(prochains) if prochains else min(starts)
-    return f"🔴 HP — prochain HC à {nxt//60:02d}h{nxt%60:02d}"
+    return tariff.label()
 
 def minutes_until_next_transition() -> int:
-    now = datetime.now()
-    m   = now.hour * 60 + now.minute
-    all_t   = sorted(t for t, _ in HC_TRANSITIONS)
-    futures = [t for t in all_t if t > m]
-    nxt = min(futures) if futures else (min(all_t) + 24 * 60)
-    return (nxt - m) * 60 - now.second
+    """Secondes (malgré le nom historique) avant le prochain changement de période."""
+    return tariff.seconds_until_change()
 
 
 # ---------------------------------------------------------------------------
 # DB — transitions HC/HP
 # ---------------------------------------------------------------------------
 def save_transition(index_kwh: float, heure_creuse: bool, temp_eau: float | None = None):
-    if not DB_URL:
+    if not storage.ENABLED:
         return
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = storage.connect()
         cur  = conn.cursor()
         cur.execute(
             "INSERT INTO bec_transitions (index_kwh, heure_creuse, temp_eau) VALUES (%s,%s,%s)",
@@ -60,16 +49,30 @@ def save_transition(index_kwh: float, heure_creuse: bool, temp_eau: float | None
     except Exception as e:
         log(f"Transition save ERR: {e}")
 
+def reset_transitions() -> bool:
+    """Vide la table des relevés BEC (bouton RESET RELEVÉS)."""
+    if not storage.ENABLED:
+        return False
+    try:
+        conn = storage.connect()
+        cur  = conn.cursor()
+        cur.execute("DELETE FROM bec_transitions")
+        conn.commit(); cur.close(); conn.close()
+        log("Transitions BEC supprimées")
+        return True
+    except Exception as e:
+        log(f"Transition reset ERR: {e}"); return False
+
 def get_conso_stats(jours: int = 7):
     """Retourne (conso_hc, conso_hp, nb_periodes, chute_temp_hp_moy)."""
-    if not DB_URL:
+    if not storage.ENABLED:
         return None
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = storage.connect()
         cur  = conn.cursor()
         cur.execute("""SELECT timestamp, index_kwh, heure_creuse, temp_eau
-            FROM bec_transitions WHERE timestamp > NOW() - INTERVAL '%s days'
-            ORDER BY timestamp ASC""", (jours,))
+            FROM bec_transitions WHERE timestamp > %s
+            ORDER BY timestamp ASC""", (datetime.now() - timedelta(days=jours),))
         rows = cur.fetchall(); cur.close(); conn.close()
         if len(rows) < 2:
             return None
@@ -128,8 +131,12 @@ def decode_quantite_semaine(caps: dict) -> list[str]:
 # ---------------------------------------------------------------------------
 # AUTH
 # ---------------------------------------------------------------------------
+class BecAuthError(Exception):
+    pass
+
+
 async def bec_authenticate():
-    async with httpx.AsyncClient() as c:
+    async with httpx.AsyncClient(event_hooks=ratelimit.hooks("magellan")) as c:
         r = await c.post(f"{ATLANTIC_API}/users/token",
             headers={"Authorization": f"Basic {CLIENT_BASIC}",
                      "Content-Type": "application/x-www-form-urlencoded"},
@@ -141,23 +148,65 @@ async def bec_authenticate():
         log(f"BEC Auth {r.status_code}: {r.text[:100]}")
         return None
 
-async def bec_get_index() -> tuple[float | None, float | None]:
-    """Relevé à chaque transition : retourne (index_kWh, temp_haut_ballon)."""
+async def bec_get_caps() -> dict | None:
+    """Toutes les capabilities du ballon ({id: valeur}), None si échec."""
+    try:
+        return await breaker.call("magellan", _get_caps)
+    except breaker.CircuitOpen:
+        return None
+    except Exception as e:
+        log(f"BEC caps ERR: {e!r}"); return None
+
+
+async def _get_caps() -> dict | None:
     token = await bec_authenticate()
-    if not token: return None, None
+    if not token: raise BecAuthError("auth Magellan échouée")
     h = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    async with httpx.AsyncClient(timeout=15) as c:
+    async with httpx.AsyncClient(timeout=15, event_hooks=ratelimit.hooks("magellan")) as c:
         r = await c.get(f"{ATLANTIC_API}/magellan/cozytouch/setupviewv2", headers=h)
-        if r.status_code != 200: return None, None
+        r.raise_for_status()
         dev = find_water_heater(r.json()[0].get("devices", []))
-        if not dev: return None, None
+        if not dev: return None
         r2 = await c.get(f"{ATLANTIC_API}/magellan/capabilities/?deviceId={dev['deviceId']}", headers=h)
-        if r2.status_code != 200: return None, None
+        r2.raise_for_status()
         caps = {x["capabilityId"]: x["value"] for x in r2.json()}
-        idx  = float(caps.get(59, 0)) / 1000
-        t_raw = caps.get(266, caps.get(265))
-        temp  = float(t_raw) if t_raw is not None else None
-        return idx, temp
+        _cache.update(caps=caps, name=dev.get("name", "Chauffe-eau"), at=datetime.now())
+        return caps
+
+
+async def bec_get_index() -> tuple[float | None, float | None]:
+    """Relevé à chaque transition : retourne (index_kWh, temp_haut_ballon)."""
+    caps = await bec_get_caps()
+    if caps is None: return None, None
+    idx  = float(caps.get(59, 0)) / 1000
+    t_raw = caps.get(266, caps.get(265))
+    temp  = float(t_raw) if t_raw is not None else None
+    return idx, temp
+
+
+def _num(v) -> float | None:
+    try:
+        return float(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def save_sample(caps: dict):
+    """Relevé périodique : index, V40 (268/270/271), températures cuve (266/265/267)."""
+    if not storage.ENABLED:
+        return
+    idx = _num(caps.get(59))
+    row = (idx / 1000 if idx is not None else None,
+           _num(caps.get(268)), _num(caps.get(270)), _num(caps.get(271)),
+           _num(caps.get(266)), _num(caps.get(265)), _num(caps.get(267)))
+    try:
+        conn = storage.connect()
+        cur  = conn.cursor()
+        cur.execute("INSERT INTO bec_samples (index_kwh, v40, v40_total, v40_pct,"
+                    " t_haut, t_milieu, t_bas) VALUES (%s,%s,%s,%s,%s,%s,%s)", row)
+        conn.commit(); cur.close(); conn.close()
+    except Exception as e:
+        log(f"BEC sample ERR: {e}")
 
 
 # ---------------------------------------------------------------------------
@@ -184,15 +233,88 @@ async def write_capability(c: httpx.AsyncClient, h: dict, dev_id: int,
 # ---------------------------------------------------------------------------
 # ACTION PRINCIPALE
 # ---------------------------------------------------------------------------
+def format_caps(caps: dict, name: str) -> str:
+    """Rapport ÉTAT du ballon depuis ses capabilities."""
+    nom_w  = int(float(caps.get(164, 0)))
+    res99  = str(caps.get(99, "0"))
+    temp_c = float(caps.get(22, 0))
+    idx    = float(caps.get(59, 0)) / 1000
+    hc     = is_heure_creuse()
+    mode   = {0:"Manuel",3:"Eco+",4:"Prog HC/HP"}.get(int(float(caps.get(87,0))), "?")
+    boost  = "🟢 ON" if str(caps.get(165,"0")) not in ("0","false") else "OFF"
+
+    chauffe = (f"🔥 CHAUFFE ({nom_w}W) — {'✅ HC' if hc else '⚠️ HP'}"
+               if res99 != "0" else "💤 En veille")
+    resist  = ("🟢 ON — chauffe active" if res99 != "0"
+               else f"🔴 OFF  (nominale : {nom_w}W)")
+
+    def ft(v): return f"{float(v):.1f}°C" if v is not None else "—"
+    def fv(v): return f"{float(v):.0f}L"  if v is not None else "—"
+
+    t_haut = caps.get(266); t_mil = caps.get(265); t_bas = caps.get(267)
+    v40    = caps.get(268); v40tot = caps.get(270); pct_v = caps.get(271)
+
+    absent = {0:"🏡 Normal",1:"✈️ Activé",2:"⏳ En attente"}.get(
+        int(float(caps.get(227, 0))), "?")
+    try:
+        ts  = caps.get(222, "[0,0]")
+        tsl = json.loads(str(ts)) if isinstance(ts, str) else ts
+        dates = (f"{datetime.fromtimestamp(int(tsl[0])).strftime('%d/%m %Hh%M')}"
+                 f"→{datetime.fromtimestamp(int(tsl[1])).strftime('%d/%m %Hh%M')}"
+                 ) if tsl and int(tsl[0]) > 0 else "aucune"
+    except: dates = "?"
+
+    hc_sched = decode_hc_schedule(caps.get(245))
+    qtite_lines = decode_quantite_semaine(caps)
+
+    return "\n".join([
+        f"💧 <b>{name}</b>",
+        "", "⚡ <b>ÉTAT</b>",
+        f"  {chauffe}",
+        f"  Consigne : <b>{temp_c:.0f}°C</b>  Mode : <b>{mode}</b>",
+        f"  Résistance : {resist}  |  Boost : {boost}",
+        f"  {get_hc_label()}",
+        "", "🌡️ <b>TEMPÉRATURES EAU</b>",
+        f"  Haut:{ft(t_haut)}  Mil:{ft(t_mil)}  Bas:{ft(t_bas)}",
+        "", "💦 <b>DISPONIBILITÉ</b>",
+        f"  V40 : <b>{fv(v40)}</b> / {fv(v40tot)}  →  <b>{float(pct_v or 0):.0f}%</b>",
+        "", "📅 <b>PLAGES HC</b>",
+        f"  {hc_sched}",
+        "", "💧 <b>QUANTITÉ PAR JOUR</b>",
+    ] + qtite_lines + [
+        "", "📊 <b>CONSO</b>",
+        f"  Index : <b>{idx:.3f} kWh</b>",
+        "", "✈️ <b>ABSENCE</b>",
+        f"  {absent}  |  {dates}",
+    ])
+
+
+@singleflight.coalesce
 async def manage_bec(action="GET"):
+    """Action ballon ; disjoncteur "magellan" ouvert → dernier état connu."""
+    try:
+        async with breaker.guard("magellan"):
+            return await _manage_bec(action)
+    except BecAuthError as e:
+        return f"❌ {e}"
+    except breaker.CircuitOpen as e:
+        if action == "GET" and _cache["caps"]:
+            return (f"⚠️ {e} — état du {_cache['at']:%d/%m %Hh%M}\n\n"
+                    + format_caps(_cache["caps"], _cache["name"]))
+        return f"⚠️ {e}"
+    except Exception as e:
+        log(f"BEC ERR: {e!r}"); return f"⚠️ {e!r}"
+
+
+async def _manage_bec(action: str) -> str:
     if not BEC_USER or not BEC_PASS:
         return "❌ BEC_EMAIL ou BEC_PASSWORD manquants"
     token = await bec_authenticate()
     if not token:
-        return "❌ Auth Magellan échouée"
+        raise BecAuthError("Auth Magellan échouée")     # compte pour le disjoncteur
     h = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
 
-    async with httpx.AsyncClient(timeout=30) as c:
+    async with httpx.AsyncClient(timeout=30, event_hooks=ratelimit.hooks("magellan")) as c:
         try:
             r = await c.get(f"{ATLANTIC_API}/magellan/cozytouch/setupviewv2", headers=h)
             if r.status_code != 200:
@@ -209,59 +331,10 @@ async def manage_bec(action="GET"):
                 r2   = await c.get(f"{ATLANTIC_API}/magellan/capabilities/?deviceId={dev_id}", headers=h)
                 caps = {x["capabilityId"]: x["value"] for x in r2.json()}
                 log(f"BEC caps: {caps}")
+                save_sample(caps)
 
-                nom_w  = int(float(caps.get(164, 0)))
-                res99  = str(caps.get(99, "0"))
-                temp_c = float(caps.get(22, 0))
-                idx    = float(caps.get(59, 0)) / 1000
-                hc     = is_heure_creuse()
-                mode   = {0:"Manuel",3:"Eco+",4:"Prog HC/HP"}.get(int(float(caps.get(87,0))), "?")
-                boost  = "🟢 ON" if str(caps.get(165,"0")) not in ("0","false") else "OFF"
-
-                chauffe = (f"🔥 CHAUFFE ({nom_w}W) — {'✅ HC' if hc else '⚠️ HP'}"
-                           if res99 != "0" else "💤 En veille")
-                resist  = ("🟢 ON — chauffe active" if res99 != "0"
-                           else f"🔴 OFF  (nominale : {nom_w}W)")
-
-                def ft(v): return f"{float(v):.1f}°C" if v is not None else "—"
-                def fv(v): return f"{float(v):.0f}L"  if v is not None else "—"
-
-                t_haut = caps.get(266); t_mil = caps.get(265); t_bas = caps.get(267)
-                v40    = caps.get(268); v40tot = caps.get(270); pct_v = caps.get(271)
-
-                absent = {0:"🏡 Normal",1:"✈️ Activé",2:"⏳ En attente"}.get(
-                    int(float(caps.get(227, 0))), "?")
-                try:
-                    ts  = caps.get(222, "[0,0]")
-                    tsl = json.loads(str(ts)) if isinstance(ts, str) else ts
-                    dates = (f"{datetime.fromtimestamp(int(tsl[0])).strftime('%d/%m %Hh%M')}"
-                             f"→{datetime.fromtimestamp(int(tsl[1])).strftime('%d/%m %Hh%M')}"
-                             ) if tsl and int(tsl[0]) > 0 else "aucune"
-                except: dates = "?"
-
-                hc_sched = decode_hc_schedule(caps.get(245))
-                qtite_lines = decode_quantite_semaine(caps)
-
-                return "\n".join([
-                    f"💧 <b>{dev.get('name','Chauffe-eau')}</b>",
-                    "", "⚡ <b>ÉTAT</b>",
-                    f"  {chauffe}",
-                    f"  Consigne : <b>{temp_c:.0f}°C</b>  Mode : <b>{mode}</b>",
-                    f"  Résistance : {resist}  |  Boost : {boost}",
-                    f"  {get_hc_label()}",
-                    "", "🌡️ <b>TEMPÉRATURES EAU</b>",
-                    f"  Haut:{ft(t_haut)}  Mil:{ft(t_mil)}  Bas:{ft(t_bas)}",
-                    "", "💦 <b>DISPONIBILITÉ</b>",
-                    f"  V40 : <b>{fv(v40)}</b> / {fv(v40tot)}  →  <b>{float(pct_v or 0):.0f}%</b>",
-                    "", "📅 <b>PLAGES HC</b>",
-                    f"  {hc_sched}",
-                    "", "💧 <b>QUANTITÉ PAR JOUR</b>",
-                ] + qtite_lines + [
-                    "", "📊 <b>CONSO</b>",
-                    f"  Index : <b>{idx:.3f} kWh</b>",
-                    "", "✈️ <b>ABSENCE</b>",
-                    f"  {absent}  |  {dates}",
-                ])
+                _cache.update(caps=caps, name=dev.get("name", "Chauffe-eau"), at=datetime.now())
+                return format_caps(caps, _cache["name"])
 
             # ── STATS ────────────────────────────────────────────────────────
             if action == "STATS":
@@ -279,6 +352,12 @@ async def manage_bec(action="GET"):
                 ]
                 if chute is not None:
                     lines.append(f"🌡️ Chute temp. HP : <b>−{chute:.1f}°C</b> en moyenne")
+                try:
+                    _, _, _, eur, _ = cost.bec_intervals(datetime.now() - timedelta(days=7),
+                                                         datetime.now())
+                    lines.append(f"💶 Coût : <b>{eur.sum():.2f} €</b>")
+                except Exception as e:
+                    log(f"Coût BEC ERR: {e}")
                 return "\n".join(lines)
 
             # ── ABSENCE / HOME ───────────────────────────────────────────────
@@ -317,5 +396,7 @@ async def manage_bec(action="GET"):
                 "", "💧 <b>QUANTITÉ PAR JOUR (valeurs lues)</b>",
             ] + qtite_lines)
 
+        except (httpx.HTTPError, OSError):
+            raise           # compté par le disjoncteur (manage_bec)
         except Exception as e:
             log(f"BEC ERR: {e}"); return f"⚠️ {e}"
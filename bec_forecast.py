@@ -0,0 +1,129 @@
+"""bec_forecast.py — Prévision de la demande d'eau chaude par jour de semaine.
+
+Source : bec_samples (relevés périodiques du ballon). Pour chaque journée
+complète, en colonnes NumPy :
+  - puisage horaire (L V40) = baisses successives de la V40 disponible ;
+  - énergie de chauffe en heures creuses (kWh) = hausses de l'index réparties
+    par tariff.integral sur chaque intervalle de relevés.
+
+Le modèle est une moyenne exponentielle (BEC_FORECAST_ALPHA) par jour de
+semaine (profil horaire de puisage + énergie HC), mise à jour uniquement avec
+les jours terminés depuis le dernier passage. L'état est sauvegardé en JSON et
+la prévision servie depuis ce cache (forecast()) sans recalcul.
+"""
+import json, os
+import numpy as np
+from datetime import datetime, timedelta
+from config import BEC_FORECAST_ALPHA, BEC_FORECAST_STATE, log
+import archive, tariff
+
+JOURS = ["Lun", "Mar", "Mer", "Jeu", "Ven", "Sam", "Dim"]
+WARMUP_DAYS = 56
+
+_state = {"last_day": None,                      # dernier jour intégré (AAAA-MM-JJ)
+          "draw": [[0.0] * 24 for _ in range(7)],  # L V40 par heure, par jour de semaine
+          "hc_kwh": [0.0] * 7, "kwh": [0.0] * 7, "n": [0] * 7}
+
+
+def day_features(data: dict, d0: int, n_days: int) -> dict:
+    """Puisage horaire (n_days, 24), kWh total et kWh HC (n_days,) — vectorisé."""
+    ts   = data["ts"]
+    draw = np.zeros((n_days, 24)); kwh = np.zeros(n_days); hc = np.zeros(n_days)
+    if len(ts) < 2:
+        return {"draw": draw, "kwh": kwh, "hc_kwh": hc}
+    a, b = ts[:-1], ts[1:]
+    day  = a // 86400 - d0
+    ok   = (day >= 0) & (day < n_days)
+
+    v40 = data["v40"].astype("f8")
+    dv  = -np.diff(v40)
+    use = ok & np.isfinite(dv) & (dv > 0)
+    np.add.at(draw, (day[use], (a[use] % 86400) // 3600), dv[use])
+
+    di  = np.diff(data["index_kwh"].astype("f8"))
+    use = ok & np.isfinite(di) & (di >= 0) & (b > a)
+    hc_w  = tariff.IS_HC.astype("f8")
+    share = (tariff.integral(hc_w, b[use]) - tariff.integral(hc_w, a[use])) / (b[use] - a[use])
+    kwh += np.bincount(day[use], di[use], n_days)
+    hc  += np.bincount(day[use], di[use] * share, n_days)
+    return {"draw": draw, "kwh": kwh, "hc_kwh": hc}
+
+
+def update(now: datetime | None = None) -> int:
+    """Intègre les jours terminés non encore vus ; retourne leur nombre."""
+    today = (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    last  = _state["last_day"]
+    start = (datetime.fromisoformat(last) + timedelta(days=1) if last
+             else today - timedelta(days=WARMUP_DAYS))
+    if start >= today:
+        return 0
+    n_days = (today - start).days
+    try:
+        data = archive.history("bec_samples", None, start - timedelta(hours=1), today)
+    except Exception as e:
+        log(f"Prévision BEC ERR: {e}"); return 0
+    if not len(data["ts"]):
+        return 0
+    f  = day_features(data, archive.to_epoch(start) // 86400, n_days)
+    al = BEC_FORECAST_ALPHA
+    seen = 0
+    for i in range(n_days):
+        if not f["kwh"][i] and not f["draw"][i].any():
+            continue            # journée sans relevés (sampler arrêté)
+        dow = (start + timedelta(days=i)).weekday()
+        w   = al if _state["n"][dow] else 1.0
+        _state["draw"][dow] = list((1 - w) * np.array(_state["draw"][dow]) + w * f["draw"][i])
+        for key in ("kwh", "hc_kwh"):
+            _state[key][dow] = (1 - w) * _state[key][dow] + w * float(f[key][i])
+        _state["n"][dow] += 1
+        seen += 1
+    _state["last_day"] = (today - timedelta(days=1)).date().isoformat()
+    save()
+    return seen
+
+
+def forecast(day: datetime | None = None) -> dict | None:
+    """Prévision en cache pour un jour : litres V40, pic horaire, kWh, part HC."""
+    dow = (day or datetime.now()).weekday()
+    if not _state["n"][dow]:
+        return None
+    draw = _state["draw"][dow]
+    peak = max(range(24), key=lambda h: draw[h])
+    return {"dow": dow, "litres": sum(draw), "peak_hour": peak,
+            "kwh": _state["kwh"][dow], "hc_kwh": _state["hc_kwh"][dow],
+            "n": _state["n"][dow]}
+
+
+def format_forecast() -> str:
+    lines = []
+    for label, day in (("Aujourd'hui", datetime.now()),
+                       ("Demain", datetime.now() + timedelta(days=1))):
+        f = forecast(day)
+        if f:
+            lines.append(f"  {label} ({JOURS[f['dow']]}) : ~{f['litres']:.0f} L V40,"
+                         f" pic {f['peak_hour']:02d}h — {f['kwh']:.1f} kWh"
+                         f" dont {f['hc_kwh']:.1f} en HC")
+    return "\n".join(["🔮 <b>PRÉVISION</b>"] + lines) if lines else ""
+
+
+# ---------------------------------------------------------------------------
+# PERSISTANCE
+# ---------------------------------------------------------------------------
+def save(path: str = BEC_FORECAST_STATE):
+    try:
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(_state, f)
+        os.replace(tmp, path)
+    except Exception as e:
+        log(f"Prévision BEC save ERR: {e}")
+
+
+def load(path: str = BEC_FORECAST_STATE):
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path) as f:
+            _state.update(json.load(f))
+    except Exception as e:
+        log(f"Prévision BEC load ERR: {e}")
@@ -0,0 +1,119 @@
+"""bec_watch.py — Surveillance du ballon par différences de capabilities.
+
+Chaque lecture de /magellan/capabilities est comparée à la précédente : seuls
+les identifiants modifiés sont écrits dans bec_capability_changes (une ligne
+par capability changée) et diffusés aux abonnés (@bec_watch.subscribe,
+fn(ts, {cap_id: (ancienne, nouvelle)})). Le stockage croît avec les
+changements, pas avec le nombre de lectures.
+
+Cadence adaptative : BEC_WATCH_MIN_S après un changement significatif, puis
+doublée à chaque lecture sans changement significatif jusqu'à
+BEC_WATCH_MAX_S. Les capabilities de BEC_WATCH_IGNORE sont journalisées mais
+n'accélèrent pas la cadence ; les mesures (MEASURES : index, températures
+cuve, V40) bougent à presque chaque lecture et ne comptent qu'au-delà d'un
+écart à leur valeur lors du dernier changement significatif.
+"""
+import asyncio
+from datetime import datetime
+from config import BEC_WATCH_MIN_S, BEC_WATCH_MAX_S, BEC_WATCH_IGNORE, BEC_SAMPLE_S, log
+import storage, bec, bec_forecast, health
+
+# Mesures : capability → écart significatif (unités Magellan)
+MEASURES = {59: 500,                           # index, Wh
+            265: 3, 266: 3, 267: 3,            # températures cuve, °C
+            268: 20, 270: 20, 271: 10}         # V40 (L) et V40 (%)
+
+_subscribers = []
+_last: dict[int, str] | None = None
+_ref: dict[int, float] = {}                    # mesures au dernier changement significatif
+interval = BEC_WATCH_MIN_S
+
+
+def subscribe(fn):
+    """Enregistre un abonné (utilisable en décorateur)."""
+    _subscribers.append(fn)
+    return fn
+
+
+def state() -> dict[int, str | None]:
+    """Dernières valeurs connues des capabilities."""
+    return dict(_last or {})
+
+
+def diff(old: dict, new: dict) -> dict[int, tuple[str | None, str | None]]:
+    keys = old.keys() | new.keys()
+    return {k: (old.get(k), new.get(k)) for k in keys if old.get(k) != new.get(k)}
+
+
+def _store(ts: datetime, changes: dict):
+    if not storage.ENABLED or not changes:
+        return
+    try:
+        conn = storage.connect()
+        cur  = conn.cursor()
+        for cap, (old, new) in changes.items():
+            cur.execute("INSERT INTO bec_capability_changes (timestamp, cap_id, old_value,"
+                        " new_value) VALUES (%s,%s,%s,%s)", (ts, cap, old, new))
+        conn.commit(); cur.close(); conn.close()
+    except Exception as e:
+        log(f"BEC changes ERR: {e}")
+
+
+def _significant(cap: int, value: str | None) -> bool:
+    """Changement de `cap` qui justifie d'accélérer la cadence."""
+    if cap not in MEASURES:
+        return True
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return True
+    if cap in _ref and abs(v - _ref[cap]) < MEASURES[cap]:
+        return False
+    _ref[cap] = v
+    return True
+
+
+def ingest(caps: dict, ts: datetime | None = None) -> dict:
+    """Traite une lecture ; retourne les changements (vide à la première)."""
+    global _last, interval
+    ts   = ts or datetime.now()
+    caps = {int(k): None if v is None else str(v) for k, v in caps.items()}
+    if _last is None:
+        _last = caps
+        for k in MEASURES.keys() & caps.keys():
+            _significant(k, caps[k])           # valeurs de référence
+        log(f"BEC surveillance : état initial ({len(caps)} capabilities)")
+        return {}
+    changes = diff(_last, caps)
+    _last = caps
+    significant = [k for k in changes.keys() - BEC_WATCH_IGNORE
+                   if _significant(k, caps.get(k))]
+    interval = BEC_WATCH_MIN_S if significant else min(BEC_WATCH_MAX_S, interval * 2)
+    if changes:
+        _store(ts, changes)
+        for fn in _subscribers:
+            try:
+                fn(ts, changes)
+            except Exception as e:
+                log(f"BEC abonné {getattr(fn, '__name__', fn)} ERR: {e}")
+    return changes
+
+
+async def run():
+    """Boucle de surveillance ; alimente aussi bec_samples (toutes les
+    BEC_SAMPLE_S) et la prévision de demande."""
+    last_sample = 0.0
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            caps = await bec.bec_get_caps()
+            if caps:
+                ingest(caps)
+                health.ok("bec_watch")
+                if loop.time() - last_sample >= BEC_SAMPLE_S:
+                    last_sample = loop.time()
+                    bec.save_sample(caps)
+                    await asyncio.to_thread(bec_forecast.update)
+        except Exception as e:
+            log(f"BEC surveillance ERR: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,160 @@
+"""breaker.py — Disjoncteurs et délais adaptatifs par API amont.
+
+Chaque API (overkiz, magellan, shelly) a un disjoncteur :
+  - fermé     : appels normaux ; BREAKER_FAILS échecs consécutifs → ouvert
+  - ouvert    : échec immédiat (CircuitOpen) pendant open_s secondes
+  - semi-ouvert : un seul appel d'essai ; succès → fermé, échec → ouvert
+                  avec open_s doublé (jusqu'à BREAKER_OPEN_MAX_S)
+
+Les lectures (call(..., read=True)) ont un délai adaptatif — p95 des latences
+récentes × BREAKER_TIMEOUT_FACTOR, borné à [BREAKER_TIMEOUT_MIN,
+BREAKER_TIMEOUT_MAX] — et sont rejouées BREAKER_RETRIES fois avec un
+backoff exponentiel à gigue ; un appel dont tous les essais échouent compte
+pour un seul échec. L'attente des jetons de ratelimit.py pendant l'appel
+n'entre ni dans le délai ni dans les latences. Les écritures passent par
+guard() : pas de délai imposé ni de rejeu, mais elles comptent pour le
+disjoncteur.
+"""
+import asyncio, random, time
+from collections import deque
+from contextlib import asynccontextmanager
+from config import (BREAKER_FAILS, BREAKER_OPEN_S, BREAKER_OPEN_MAX_S, BREAKER_RETRIES,
+                    BREAKER_TIMEOUT_MIN, BREAKER_TIMEOUT_MAX, BREAKER_TIMEOUT_FACTOR, log)
+import ratelimit
+
+CLOSED, OPEN, HALF_OPEN = "fermé", "ouvert", "semi-ouvert"
+STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+BACKOFF_BASE = 0.5
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class Breaker:
+    def __init__(self, name: str):
+        self.name     = name
+        self.state    = CLOSED
+        self.fails    = 0
+        self.open_s   = BREAKER_OPEN_S
+        self.opened   = 0.0
+        self.probing  = False
+        self.latency  = deque(maxlen=100)
+        self.failures = 0
+        self.rejected = 0
+        self.last_ok  = None             # epoch du dernier succès (health.py)
+
+    def retry_in(self) -> int:
+        return max(0, int(self.opened + self.open_s - time.monotonic()))
+
+    def allow(self) -> bool:
+        if self.state == OPEN and time.monotonic() - self.opened >= self.open_s:
+            self.state, self.probing = HALF_OPEN, False
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def check(self):
+        if not self.allow():
+            raise CircuitOpen(f"{self.name} indisponible (nouvel essai dans {self.retry_in()}s)")
+
+    def success(self, latency: float | None = None):
+        if latency is not None:
+            self.latency.append(latency)
+        self.last_ok = time.time()
+        if self.state != CLOSED:
+            log(f"Disjoncteur {self.name} : fermé")
+        self.state, self.fails, self.probing, self.open_s = CLOSED, 0, False, BREAKER_OPEN_S
+
+    def failure(self):
+        self.fails += 1; self.failures += 1
+        if self.state == HALF_OPEN:
+            self.open_s = min(BREAKER_OPEN_MAX_S, self.open_s * 2)
+        elif self.fails < BREAKER_FAILS:
+            return
+        self.state, self.opened, self.probing = OPEN, time.monotonic(), False
+        log(f"Disjoncteur {self.name} : ouvert pour {self.open_s:.0f}s")
+
+    def timeout(self) -> float:
+        if len(self.latency) < 10:
+            return BREAKER_TIMEOUT_MAX
+        p95 = sorted(self.latency)[int(len(self.latency) * 0.95) - 1]
+        return min(BREAKER_TIMEOUT_MAX, max(BREAKER_TIMEOUT_MIN, p95 * BREAKER_TIMEOUT_FACTOR))
+
+
+BREAKERS = {name: Breaker(name) for name in ("overkiz", "magellan", "shelly")}
+
+
+async def _run(coro, timeout: float | None) -> tuple[object, float]:
+    """(résultat, latence) de coro, hors attente de jetons ; le délai est
+    prolongé d'autant (asyncio.TimeoutError au-delà)."""
+    ctx, meter = ratelimit.metered()
+    task = asyncio.get_running_loop().create_task(coro, context=ctx)
+    t0 = time.monotonic()
+    try:
+        while True:
+            left = None if timeout is None else t0 + timeout + meter.total() - time.monotonic()
+            if left is not None and left <= 0:
+                task.cancel()
+                await asyncio.wait({task})
+                raise asyncio.TimeoutError()
+            done, _ = await asyncio.wait({task}, timeout=left)
+            if done:
+                return task.result(), time.monotonic() - t0 - meter.total()
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+
+async def call(api: str, fn, *args, read: bool = True, **kwargs):
+    """Lecture protégée : délai adaptatif et rejeux à gigue (read=True)."""
+    b = BREAKERS[api]
+    retries = BREAKER_RETRIES if read else 0
+    b.check()                              # un appel logique = une issue comptée
+    for attempt in range(retries + 1):
+        try:
+            res, latency = await _run(fn(*args, **kwargs), b.timeout() if read else None)
+        except asyncio.CancelledError:
+            b.probing = False
+            raise
+        except Exception as e:
+            if attempt == retries:
+                b.failure()
+                raise
+            delay = BACKOFF_BASE * 2 ** attempt * random.uniform(0.5, 1.5)
+            log(f"{api} ERR: {e!r} — nouvel essai dans {delay:.1f}s")
+            await asyncio.sleep(delay)
+        else:
+            b.success(latency)
+            return res
+
+
+@asynccontextmanager
+async def guard(api: str):
+    """Écriture / opération composite : échec immédiat si ouvert, issue comptée."""
+    b = BREAKERS[api]
+    b.check()
+    try:
+        yield b
+    except asyncio.CancelledError:
+        b.probing = False
+        raise
+    except Exception:
+        b.failure()
+        raise
+    b.success()
+
+
+def metrics() -> list[tuple[str, dict, float]]:
+    out = []
+    for name, b in BREAKERS.items():
+        lbl = {"api": name}
+        out += [("breaker_state", lbl, STATES[b.state]),
+                ("breaker_failures_total", lbl, b.failures),
+                ("breaker_rejected_total", lbl, b.rejected),
+                ("breaker_timeout_seconds", lbl, b.timeout())]
+    return out
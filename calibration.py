@@ -0,0 +1,93 @@
+"""calibration.py — Correction automatique des consignes (biais des sondes).
+
+La sonde d'un radiateur, proche du corps de chauffe, ne mesure pas la
+température de la pièce. Pour chaque pièce disposant d'une Shelly, chaque
+relevé met à jour une moyenne exponentielle (CALIB_ALPHA) du delta
+Shelly − radiateur :
+
+  all          : toutes heures confondues
+  <h>:<hc>     : par heure de la journée et période tarifaire (0 = HP, 1 = HC)
+
+Un relevé Shelly seul (push) est apparié au dernier relevé radiateur de
+moins de RING_FRESH_S secondes du ring buffer, et inversement.
+
+Le radiateur régule sur sa propre sonde : pour obtenir T dans la pièce il faut
+lui demander T − delta. setpoint() utilise le seau de l'heure courante s'il a
+au moins CALIB_MIN_N relevés, sinon la moyenne globale ; la correction est
+bornée à ±CALIB_MAX °C et la consigne arrondie au 0,5 °C. Aucune requête SQL :
+tout est en mémoire et sauvegardé en JSON (CALIB_STATE).
+"""
+import json, os
+from datetime import datetime
+from config import CALIB_ALPHA, CALIB_MIN_N, CALIB_MAX, CALIB_STATE, RING_FRESH_S, log
+import samples, ringbuffer, tariff
+
+# {pièce: {clé: [delta lissé, n]}}
+_state: dict[str, dict[str, list]] = {}
+
+
+def _update(room: str, key: str, x: float):
+    ew = _state.setdefault(room, {}).setdefault(key, [x, 0])
+    ew[0] += CALIB_ALPHA * (x - ew[0])
+    ew[1] += 1
+
+
+@samples.subscribe
+def on_sample(s: dict):
+    room, shelly, rad = s["room"], s["temp_shelly"], s["temp_radiateur"]
+    if shelly is None and rad is None:
+        return
+    shelly = shelly if shelly is not None else ringbuffer.latest(room, "temp_shelly", RING_FRESH_S)
+    rad    = rad if rad is not None else ringbuffer.latest(room, "temp_radiateur", RING_FRESH_S)
+    if shelly is None or rad is None:
+        return
+    d  = shelly - rad
+    hc = s["heure_creuse"] if s["heure_creuse"] is not None else tariff.is_hc(s["ts"])
+    _update(room, "all", d)
+    _update(room, f"{s['ts'].hour}:{int(hc)}", d)
+
+
+def delta(room: str, at: datetime | None = None) -> tuple[float, int] | None:
+    """(delta lissé, n) de la pièce pour l'heure et la période de `at`."""
+    keys = _state.get(room)
+    if not keys:
+        return None
+    at = at or datetime.now()
+    ew = keys.get(f"{at.hour}:{int(tariff.is_hc(at))}")
+    if ew and ew[1] >= CALIB_MIN_N:
+        return ew[0], ew[1]
+    ew = keys.get("all")
+    return (ew[0], ew[1]) if ew and ew[1] >= CALIB_MIN_N else None
+
+
+def setpoint(room: str, target: float, at: datetime | None = None) -> float:
+    """Consigne à envoyer au radiateur pour obtenir `target` dans la pièce."""
+    d = delta(room, at)
+    if d is None:
+        return target
+    corr = max(-CALIB_MAX, min(CALIB_MAX, d[0]))
+    return round((target - corr) * 2) / 2
+
+
+# ---------------------------------------------------------------------------
+# PERSISTANCE
+# ---------------------------------------------------------------------------
+def save(path: str = CALIB_STATE):
+    try:
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(_state, f)
+        os.replace(tmp, path)
+    except Exception as e:
+        log(f"Calibration save ERR: {e}")
+
+
+def load(path: str = CALIB_STATE):
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path) as f:
+            _state.update(json.load(f))
+        log(f"Calibration restaurée ({', '.join(_state) or 'aucune pièce'})")
+    except Exception as e:
+        log(f"Calibration load ERR: {e}")
@@ -1,5 +1,5 @@
 """Configuration partagée entre tous les modules."""
-import os, time
+import os, time, json
 from pyoverkiz.const import SUPPORTED_SERVERS
 
 VERSION = "15.5"
@@ -26,6 +26,25 @@ HC_TRANSITIONS = [
     (16*60+56, False),  # 16:56 → HP commence
 ]
 
+# Moteur tarifaire (tariff.py) : "hchp" (HC_TRANSITIONS) ou "tempo"
+TARIFF    = os.getenv("TARIFF", "hchp").lower()
+TARIFF_TZ = os.getenv("TARIFF_TZ", "Europe/Paris")
+# Plannings saisonniers optionnels : {"MM-JJ": [[minute, hc], ...]} en JSON
+TARIFF_SEASONS = {k: [tuple(t) for t in v]
+                  for k, v in json.loads(os.getenv("TARIFF_SEASONS", "{}")).items()}
+TEMPO_FILE = os.getenv("TEMPO_FILE", "tempo.json")   # {"AAAA-MM-JJ": "bleu|blanc|rouge"}
+
+# Prix TTC par période tarifaire (€/kWh, JSON pour surcharger) — cost.py
+_DEFAULT_PRICES = {
+    "hchp":  {"HC": 0.2068, "HP": 0.2700},
+    "tempo": {"HC_BLEU": 0.1288, "HP_BLEU": 0.1552, "HC_BLANC": 0.1447,
+              "HP_BLANC": 0.1792, "HC_ROUGE": 0.1518, "HP_ROUGE": 0.6586},
+}
+TARIFF_PRICES = json.loads(os.getenv("TARIFF_PRICES", "null")) or _DEFAULT_PRICES.get(TARIFF, {})
+# Puissance des radiateurs par pièce (W, "*" = défaut) pour l'estimation de conso
+RAD_POWER_W = json.loads(os.getenv("RAD_POWER_W", "null")) or {
+    "Salon": 1500, "Chambre": 1000, "Bureau": 1000, "Sèche-Serviette": 750, "*": 1000}
+
 # Radiateurs
 CONFORT_VALS = {
     "14253355#1": {"name": "Salon",          "temp": 19.5, "eco": 16.0},
@@ -41,3 +60,106 @@ def log(msg):
 # Récupérer avec @userinfobot sur Telegram
 _admin_raw = os.getenv("ADMIN_CHAT_ID", "").strip()
 ADMIN_CHAT_ID = int(_admin_raw) if _admin_raw.isdigit() else None
+
+# Règles d'alerte (alerts.py) : JSON, vide = règles par défaut
+ALERT_RULES        = json.loads(os.getenv("ALERT_RULES", "") or "null")
+ALERT_REPEAT_S     = int(os.getenv("ALERT_REPEAT_S", "3600"))   # même alerte au plus 1×/…
+ALERT_MAX_PER_HOUR = int(os.getenv("ALERT_MAX_PER_HOUR", "10"))
+ALERT_TICK_S       = int(os.getenv("ALERT_TICK_S", "60"))
+
+# Serveur HTTP (santé, métriques, /shelly/rpc) et mode webhook Telegram :
+# WEBHOOK_URL = URL publique du service (https://…), vide = long polling
+HTTP_PORT      = int(os.getenv("HTTP_PORT", "8000"))
+WEBHOOK_URL    = os.getenv("WEBHOOK_URL", "").strip()
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+HEALTH_TICK_S    = float(os.getenv("HEALTH_TICK_S", "1"))     # heartbeat de la boucle
+HEALTH_MAX_LAG_S = float(os.getenv("HEALTH_MAX_LAG_S", "5"))  # au-delà : /healthz en 503
+
+# Ingestion locale Shelly (push) : "" = cloud seul, "mqtt" = broker local,
+# "http" = notifications RPC POSTées sur /shelly/rpc (port 8000)
+# Le mode mqtt nécessite le paquet optionnel aiomqtt
+SHELLY_PUSH         = os.getenv("SHELLY_PUSH", "").strip().lower()
+SHELLY_ROOM         = os.getenv("SHELLY_ROOM", "Salon")
+SHELLY_PUSH_TOKEN   = os.getenv("SHELLY_PUSH_TOKEN")
+SHELLY_PUSH_MAX_AGE = int(os.getenv("SHELLY_PUSH_MAX_AGE", "900"))  # secondes
+MQTT_HOST           = os.getenv("MQTT_HOST", "localhost")
+MQTT_PORT           = int(os.getenv("MQTT_PORT", "1883"))
+MQTT_TOPIC          = os.getenv("MQTT_TOPIC", "+/events/rpc")
+
+# Passerelle Cozytouch locale (mode développeur Overkiz) — repli cloud si injoignable
+# ex: OVERKIZ_LOCAL_URL=https://gateway-1234-5678-9012.local:8443
+OVERKIZ_LOCAL_URL   = os.getenv("OVERKIZ_LOCAL_URL", "").rstrip("/")
+OVERKIZ_LOCAL_TOKEN = os.getenv("OVERKIZ_LOCAL_TOKEN")
+
+# Archives colonnaires locales (archive.py)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archives")
+
+# Rétention historique températures (retention.py)
+RAW_RETENTION_DAYS    = int(os.getenv("RAW_RETENTION_DAYS", "90"))
+HOURLY_RETENTION_DAYS = int(os.getenv("HOURLY_RETENTION_DAYS", "730"))
+PARTITIONS_AHEAD      = int(os.getenv("PARTITIONS_AHEAD", "2"))  # mois créés d'avance
+
+# Base embarquée SQLite utilisée quand DATABASE_URL est absente ("" = désactivée)
+SQLITE_PATH = os.getenv("SQLITE_PATH", "cozybot.db")
+
+# Compression deadband des écritures temp_logs (deadband.py)
+DEADBAND_TEMP    = float(os.getenv("DEADBAND_TEMP", "0.2"))     # °C
+DEADBAND_MAX_GAP = int(os.getenv("DEADBAND_MAX_GAP", "3600"))   # secondes
+
+# Ring buffer mémoire des relevés récents (ringbuffer.py)
+RAD_SAMPLE_S  = int(os.getenv("RAD_SAMPLE_S", "3600"))   # période du logger radiateurs
+RING_DAYS     = int(os.getenv("RING_DAYS", "3"))
+RING_FRESH_S  = int(os.getenv("RING_FRESH_S", "900"))    # âge max servi par LIST
+RING_SNAPSHOT = os.getenv("RING_SNAPSHOT", "ring.snapshot")
+
+# Agrégats thermiques incrémentaux (aggregates.py)
+AGG_STATE  = os.getenv("AGG_STATE", "aggregates.json")
+AGG_SAVE_S = int(os.getenv("AGG_SAVE_S", "600"))
+
+# Préchauffe (preheat.py)
+PREHEAT_DEFAULT_RATE = float(os.getenv("PREHEAT_DEFAULT_RATE", "1.0"))  # °C/h sans modèle
+PREHEAT_HC_ADVANCE   = int(os.getenv("PREHEAT_HC_ADVANCE", "90"))       # min d'avance max pour partir en HC
+
+# Backtest (backtest.py)
+COMFORT_TOL  = float(os.getenv("COMFORT_TOL", "0.5"))    # °C sous la consigne confort
+BEC_VOLUME_L = int(os.getenv("BEC_VOLUME_L", "200"))
+BEC_LOSS_W_K = float(os.getenv("BEC_LOSS_W_K", "1.8"))   # pertes statiques du ballon
+BEC_COLD_C   = float(os.getenv("BEC_COLD_C", "12"))      # eau froide du réseau
+
+# Relevés ballon + prévision de demande (bec_forecast.py)
+BEC_SAMPLE_S       = int(os.getenv("BEC_SAMPLE_S", "900"))
+BEC_FORECAST_ALPHA = float(os.getenv("BEC_FORECAST_ALPHA", "0.3"))
+BEC_FORECAST_STATE = os.getenv("BEC_FORECAST_STATE", "bec_forecast.json")
+
+# Surveillance des capabilities ballon (bec_watch.py)
+BEC_WATCH_MIN_S  = int(os.getenv("BEC_WATCH_MIN_S", "120"))
+BEC_WATCH_MAX_S  = int(os.getenv("BEC_WATCH_MAX_S", "900"))
+BEC_WATCH_IGNORE = {int(c) for c in os.getenv("BEC_WATCH_IGNORE", "").split(",") if c.strip()}
+
+# Détection de fenêtre ouverte (window.py)
+WINDOW_MINUTES     = int(os.getenv("WINDOW_MINUTES", "15"))      # fenêtre de régression
+WINDOW_DROP_C_H    = float(os.getenv("WINDOW_DROP_C_H", "3.0"))  # chute en °C/h
+WINDOW_MIN_SAMPLES = int(os.getenv("WINDOW_MIN_SAMPLES", "3"))
+WINDOW_HOLD_MIN    = int(os.getenv("WINDOW_HOLD_MIN", "15"))     # éco minimal
+WINDOW_SETTLE_MIN  = int(os.getenv("WINDOW_SETTLE_MIN", "30"))   # radiateur ignoré après un changement de consigne
+WINDOW_ECO         = os.getenv("WINDOW_ECO", "").strip().lower() in ("1", "true", "oui")
+
+# Calibration des consignes par le delta Shelly − radiateur (calibration.py)
+CALIB_ALPHA = float(os.getenv("CALIB_ALPHA", "0.05"))
+CALIB_MIN_N = int(os.getenv("CALIB_MIN_N", "12"))       # relevés avant correction
+CALIB_MAX   = float(os.getenv("CALIB_MAX", "2.0"))      # correction maximale (°C)
+CALIB_STATE = os.getenv("CALIB_STATE", "calibration.json")
+
+# Budgets de requêtes par API amont (ratelimit.py) : {api: [jetons/s, rafale]}
+RATE_LIMITS = json.loads(os.getenv("RATE_LIMITS", "null")) or {
+    "overkiz": [0.2, 4], "magellan": [1.0, 10], "shelly": [1.0, 1]}
+RATE_BG_RESERVE = float(os.getenv("RATE_BG_RESERVE", "0.5"))   # part de rafale réservée
+
+# Disjoncteurs et délais adaptatifs par API amont (breaker.py)
+BREAKER_FAILS          = int(os.getenv("BREAKER_FAILS", "3"))         # échecs consécutifs
+BREAKER_OPEN_S         = int(os.getenv("BREAKER_OPEN_S", "30"))
+BREAKER_OPEN_MAX_S     = int(os.getenv("BREAKER_OPEN_MAX_S", "600"))
+BREAKER_RETRIES        = int(os.getenv("BREAKER_RETRIES", "2"))       # lectures seulement
+BREAKER_TIMEOUT_MIN    = float(os.getenv("BREAKER_TIMEOUT_MIN", "3"))
+BREAKER_TIMEOUT_MAX    = float(os.getenv("BREAKER_TIMEOUT_MAX", "30"))
+BREAKER_TIMEOUT_FACTOR = float(os.getenv("BREAKER_TIMEOUT_FACTOR", "3"))  # × p95
@@ -0,0 +1,123 @@
+"""cost.py — Coût de l'énergie (ballon mesuré + radiateurs estimés).
+
+Ballon : intervalles entre relevés successifs de bec_transitions (index kWh).
+L'énergie d'un intervalle est répartie uniformément dans le temps et valorisée
+par l'intégrale du prix tarifaire sur [début, fin) (tariff.integral) : un
+intervalle à cheval sur plusieurs périodes (relevé manqué) est donc ventilé
+correctement, sans boucle par ligne.
+
+Radiateurs : estimation. Sur une grille de RAD_STEP secondes, un radiateur est
+compté en chauffe (puissance RAD_POWER_W de la pièce) quand sa consigne dépasse
+sa température ; le prix vient de la période tarifaire de chaque pas.
+
+Tout est lu en colonnes NumPy (archive.history : archive locale + base) puis
+agrégé par jour / mois avec np.bincount.
+"""
+import numpy as np
+from datetime import datetime, timedelta
+from config import CONFORT_VALS, TARIFF_PRICES, RAD_POWER_W, DEADBAND_MAX_GAP, log
+import archive, tariff
+from deadband import reconstruct
+
+RAD_STEP = 600
+JOURS    = ["Lu", "Ma", "Me", "Je", "Ve", "Sa", "Di"]
+
+PRICES = np.array([TARIFF_PRICES.get(p, 0.0) for p in tariff.PERIODS])
+
+
+def _days(ts: np.ndarray) -> np.ndarray:
+    return ts // 86400
+
+
+def bec_intervals(start: datetime, end: datetime):
+    """(débuts, fins, kWh, €, kWh HC) des intervalles de relevés ballon."""
+    data = archive.history("bec_transitions", None, start, end)
+    ts, idx = data["ts"], data["index_kwh"].astype("f8")
+    ok = np.isfinite(idx)
+    ts, idx = ts[ok], idx[ok]
+    if len(ts) < 2:
+        e = np.empty(0)
+        return np.empty(0, "i8"), np.empty(0, "i8"), e, e, e
+    a, b, kwh = ts[:-1], ts[1:], np.diff(idx)
+    keep = (kwh >= 0) & (b > a)          # remise à zéro du compteur
+    a, b, kwh = a[keep], b[keep], kwh[keep]
+    dur  = (b - a).astype("f8")
+    eur  = kwh / dur * (tariff.integral(PRICES, b) - tariff.integral(PRICES, a))
+    hc_w = tariff.IS_HC.astype("f8")
+    kwh_hc = kwh / dur * (tariff.integral(hc_w, b) - tariff.integral(hc_w, a))
+    return a, b, kwh, eur, kwh_hc
+
+
+def rad_energy(room: str, start: datetime, end: datetime, step: int = RAD_STEP):
+    """(instants, kWh, €) par pas de grille pour un radiateur (estimation)."""
+    power = RAD_POWER_W.get(room, RAD_POWER_W.get("*", 1000)) / 1000
+    data  = archive.history("temp_logs", room, start - timedelta(seconds=DEADBAND_MAX_GAP), end)
+    at    = np.arange(archive.to_epoch(start), archive.to_epoch(end), step, dtype="i8")
+    if not len(data["ts"]):
+        return at, np.zeros(len(at)), np.zeros(len(at))
+    cons = reconstruct(data["ts"], data["consigne"].astype("f8"), at, "step")
+    temp = reconstruct(data["ts"], data["temp_radiateur"].astype("f8"), at, "step")
+    on   = np.nan_to_num(cons) > np.nan_to_num(temp, nan=np.inf)   # inconnu = arrêt
+    kwh = on * power * step / 3600
+    return at, kwh, kwh * PRICES[tariff.classify(at)]
+
+
+def breakdown(start: datetime, end: datetime, by: str = "day") -> dict:
+    """Totaux par jour ('day') ou par mois ('month') : clés, kWh et € du
+    ballon et des radiateurs."""
+    d0 = archive.to_epoch(start) // 86400
+
+    def bucket(ts):
+        if by == "day":
+            return _days(ts) - d0
+        months = ts.astype("datetime64[s]").astype("datetime64[M]").astype("i8")
+        return months - np.datetime64(start, "M").astype("i8")
+
+    n = int(bucket(np.array([archive.to_epoch(end) - 1]))[0]) + 1
+    out = {k: np.zeros(n) for k in ("bec_kwh", "bec_eur", "bec_hc", "rad_kwh", "rad_eur")}
+    a, _, kwh, eur, kwh_hc = bec_intervals(start, end)
+    if len(a):
+        k = bucket(a)
+        out["bec_kwh"] += np.bincount(k, kwh, n)
+        out["bec_eur"] += np.bincount(k, eur, n)
+        out["bec_hc"]  += np.bincount(k, kwh_hc, n)
+    for v in CONFORT_VALS.values():
+        at, kwh, eur = rad_energy(v["name"], start, end)
+        if len(at):
+            k = bucket(at)
+            out["rad_kwh"] += np.bincount(k, kwh, n)
+            out["rad_eur"] += np.bincount(k, eur, n)
+    if by == "day":
+        out["keys"] = [start.date() + timedelta(days=i) for i in range(n)]
+    else:
+        m0 = np.datetime64(start, "M")
+        out["keys"] = [str(m0 + i) for i in range(n)]
+    return out
+
+
+def report(days: int = 7, months: int = 12) -> str:
+    now   = datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    lines = ["💶 <b>COÛT ÉNERGIE</b>  <code>ballon mesuré / radiateurs estimés</code>", ""]
+    try:
+        d = breakdown(today - timedelta(days=days - 1), now, "day")
+        for i, day in enumerate(d["keys"]):
+            lines.append(f"<code>{JOURS[day.weekday()]} {day:%d/%m} 💧{d['bec_eur'][i]:5.2f}€"
+                         f" 🌡️{d['rad_eur'][i]:5.2f}€</code>")
+        first = datetime(today.year, today.month, 1)
+        for _ in range(months - 1):
+            first = (first - timedelta(days=1)).replace(day=1)
+        m = breakdown(first, now, "month")
+        lines += ["", "<b>Par mois</b>"]
+        for i, key in enumerate(m["keys"]):
+            if m["bec_kwh"][i] or m["rad_kwh"][i]:
+                tot = m["bec_eur"][i] + m["rad_eur"][i]
+                lines.append(f"<code>{key} 💧{m['bec_kwh'][i]:5.0f}kWh {m['bec_eur'][i]:6.2f}€"
+                             f" 🌡️{m['rad_kwh'][i]:5.0f}kWh {m['rad_eur'][i]:6.2f}€"
+                             f" = {tot:6.2f}€</code>")
+        total = m["bec_eur"].sum() + m["rad_eur"].sum()
+        lines += ["", f"Σ {months} mois : <b>{total:.2f} €</b>"]
+    except Exception as e:
+        log(f"Coût ERR: {e}")
+        lines.append(f"⚠️ {e}")
+    return "\n".join(lines)
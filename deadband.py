@@ -0,0 +1,91 @@
+"""deadband.py — Compression « deadband » des relevés avant écriture en base.
+
+Série = (pièce, mesure). Un relevé n'est stocké que si l'une de ses mesures
+s'écarte de la dernière valeur stockée de sa série de plus que son seuil, ou
+le relevé suivant (période observée de la série) tomberait à plus de
+DEADBAND_MAX_GAP secondes du dernier point stocké (battement de cœur) : un
+point stocké couvre ainsi toujours l'intervalle jusqu'au suivant. Au rythme horaire par défaut tout est conservé ; un échantillonnage
+plus fin ne coûte que les variations réelles.
+
+Relecture : reconstruct() / series() recalculent des valeurs en escalier ou
+interpolées entre les points stockés.
+"""
+import numpy as np
+from datetime import datetime, timedelta
+from config import DEADBAND_TEMP, DEADBAND_MAX_GAP
+import archive
+
+THRESHOLDS = {"temp_radiateur": DEADBAND_TEMP, "temp_shelly": DEADBAND_TEMP,
+              "consigne": 0.0}
+GAP_TOLERANCE = 60   # secondes : gigue du logger horaire
+
+
+class Deadband:
+    def __init__(self, thresholds: dict = THRESHOLDS, max_gap: int = DEADBAND_MAX_GAP):
+        self.thresholds = thresholds
+        self.max_gap    = max_gap
+        self._last      = {}    # (pièce, mesure) → (ts, valeur stockée)
+        self._seen      = {}    # (pièce, mesure) → (ts du dernier relevé, période)
+
+    def keep(self, sample: dict) -> bool:
+        """True si le relevé doit être stocké. Ne modifie pas les séries
+        stockées : appeler stored() une fois l'écriture réussie."""
+        ts, room, keep = sample["ts"], sample["room"], False
+        for metric, thr in self.thresholds.items():
+            v = sample.get(metric)
+            if v is None:
+                continue
+            seen = self._seen.get((room, metric))
+            period = (ts - seen[0]).total_seconds() if seen else 0.0
+            if period <= 0 and seen:
+                period = seen[1]                  # doublon : période précédente
+            self._seen[(room, metric)] = (ts, period)
+            last = self._last.get((room, metric))
+            if (last is None or abs(v - last[1]) > thr
+                    or (ts - last[0]).total_seconds() + period
+                       >= self.max_gap - GAP_TOLERANCE):
+                keep = True
+        return keep
+
+    def stored(self, sample: dict):
+        """Le relevé est en base : il devient la référence de ses séries."""
+        for metric in self.thresholds:
+            if sample.get(metric) is not None:
+                self._last[(sample["room"], metric)] = (sample["ts"], sample[metric])
+
+
+# ---------------------------------------------------------------------------
+# RECONSTRUCTION
+# ---------------------------------------------------------------------------
+def reconstruct(ts: np.ndarray, vals: np.ndarray, at: np.ndarray,
+                mode: str = "step", max_gap: int = DEADBAND_MAX_GAP) -> np.ndarray:
+    """Valeurs aux instants `at` (int64 s) à partir des points stockés.
+
+    step   : dernière valeur stockée (sémantique exacte du deadband)
+    linear : interpolation entre points encadrants
+    NaN avant le premier point ou au-delà de max_gap (+ gigue GAP_TOLERANCE)
+    après le dernier.
+    """
+    ok = ~np.isnan(vals)
+    ts, vals = ts[ok], vals[ok]
+    out = np.full(len(at), np.nan)
+    if not len(ts):
+        return out
+    idx   = np.searchsorted(ts, at, side="right") - 1
+    valid = (idx >= 0) & (at - ts[np.clip(idx, 0, None)] <= max_gap + GAP_TOLERANCE)
+    if mode == "linear":
+        out[valid] = np.interp(at[valid], ts, vals)
+    else:
+        out[valid] = vals[idx[valid]]
+    return out
+
+
+def series(room: str, metric: str, start: datetime, end: datetime,
+           step: int = 300, mode: str = "step") -> tuple[np.ndarray, np.ndarray]:
+    """Grille régulière (pas `step` s) d'une série de temp_logs, reconstruite
+    depuis l'archive locale + la base (archive.history)."""
+    # Marge max_gap : dernier point stocké avant `start`
+    data = archive.history("temp_logs", room,
+                           start - timedelta(seconds=DEADBAND_MAX_GAP), end)
+    at   = np.arange(archive.to_epoch(start), archive.to_epoch(end), step, dtype="i8")
+    return at, reconstruct(data["ts"], data[metric].astype("f8"), at, mode)
@@ -0,0 +1,144 @@
+"""health.py — Santé du processus, mesurée depuis la boucle asyncio.
+
+  - heartbeat() : tâche qui dort HEALTH_TICK_S et mesure son retard de réveil
+    (lag de la boucle : appel bloquant, psycopg2 synchrone…) ;
+  - supervise(nom, coro, max_age) : lance une tâche de fond, note sa mort ;
+    la tâche signale chaque itération réussie par ok(nom). Une tâche qui
+    retourne normalement (fonction désactivée) sort du suivi ;
+  - les disjoncteurs (breaker.py) datent le dernier succès de chaque API.
+
+Routes (httpserver) :
+  /healthz  vivacité : la boucle répond, le heartbeat bat et le lag est
+            sous HEALTH_MAX_LAG_S — sinon 503 et Koyeb redémarre
+  /readyz   toutes les tâches supervisées vivantes et à jour (dernier succès,
+            ou démarrage, de moins de max_age secondes)
+  /metrics  format Prometheus : lag, tâches, API amont, ratelimit, breaker
+"""
+import asyncio, json, time
+from collections import deque
+from config import HEALTH_TICK_S, HEALTH_MAX_LAG_S, log
+import httpserver, ratelimit, breaker, singleflight
+
+STARTED = time.time()
+_lags   = deque(maxlen=60)
+_beat   = {"at": None, "lag": 0.0}
+TASKS: dict[str, dict] = {}     # nom → {max_age, started, last_ok, ok_total, dead}
+
+
+# ---------------------------------------------------------------------------
+# SONDES
+# ---------------------------------------------------------------------------
+async def heartbeat():
+    loop = asyncio.get_running_loop()
+    while True:
+        t0 = loop.time()
+        await asyncio.sleep(HEALTH_TICK_S)
+        lag = max(0.0, loop.time() - t0 - HEALTH_TICK_S)
+        if lag > HEALTH_MAX_LAG_S:
+            log(f"Boucle asyncio bloquée {lag:.1f}s")
+        _lags.append(lag)
+        _beat.update(at=time.time(), lag=lag)
+
+
+def ok(name: str):
+    """Itération réussie d'une tâche de fond."""
+    t = TASKS.get(name)
+    if t:
+        t["last_ok"] = time.time(); t["ok_total"] += 1
+
+
+def supervise(name: str, coro, max_age: float) -> asyncio.Task:
+    """Lance coro comme tâche de fond suivie par /readyz."""
+    TASKS[name] = {"max_age": max_age, "started": time.time(), "last_ok": None,
+                   "ok_total": 0, "dead": None}
+
+    def done(task: asyncio.Task):
+        err = None if task.cancelled() else task.exception()
+        if not task.cancelled() and err is None:
+            TASKS.pop(name, None)          # sortie volontaire : rien à surveiller
+            log(f"Tâche {name} terminée")
+            return
+        TASKS[name]["dead"] = "annulée" if task.cancelled() else repr(err)
+        log(f"Tâche {name} arrêtée : {TASKS[name]['dead']}")
+
+    task = asyncio.get_running_loop().create_task(coro, name=name)
+    task.add_done_callback(done)
+    return task
+
+
+def _task_status(now: float) -> dict[str, str]:
+    out = {}
+    for name, t in TASKS.items():
+        age = now - (t["last_ok"] or t["started"])
+        out[name] = (f"morte ({t['dead']})" if t["dead"]
+                     else f"en retard ({age:.0f}s)" if age > t["max_age"] else "ok")
+    return out
+
+
+def live() -> tuple[bool, str]:
+    if _beat["at"] is None:
+        return time.time() - STARTED < 10 * HEALTH_TICK_S, "heartbeat non démarré"
+    silent = time.time() - _beat["at"]
+    if silent > HEALTH_MAX_LAG_S + HEALTH_TICK_S:
+        return False, f"heartbeat muet depuis {silent:.0f}s"
+    if _beat["lag"] > HEALTH_MAX_LAG_S:
+        return False, f"lag {_beat['lag']:.1f}s"
+    return True, f"lag {_beat['lag'] * 1000:.0f}ms"
+
+
+# ---------------------------------------------------------------------------
+# ROUTES
+# ---------------------------------------------------------------------------
+@httpserver.route("GET", "/")
+@httpserver.route("GET", "/healthz")
+async def http_healthz(req):
+    alive, detail = live()
+    return httpserver.text(200 if alive else 503, f"{'OK' if alive else 'KO'} {detail}")
+
+
+@httpserver.route("GET", "/readyz")
+async def http_readyz(req):
+    now    = time.time()
+    tasks  = _task_status(now)
+    ready  = live()[0] and all(v == "ok" for v in tasks.values())
+    upstreams = {name: {"état": b.state,
+                        "dernier_succès_s": round(now - b.last_ok) if b.last_ok else None}
+                 for name, b in breaker.BREAKERS.items()}
+    body = {"ready": ready, "tâches": tasks, "amont": upstreams}
+    return (200 if ready else 503, json.dumps(body, ensure_ascii=False).encode(),
+            "application/json")
+
+
+def metrics() -> list[tuple[str, dict, float]]:
+    now = time.time()
+    out = [("event_loop_lag_seconds", {}, _beat["lag"]),
+           ("event_loop_lag_seconds_max", {}, max(_lags, default=0.0)),
+           ("process_uptime_seconds", {}, now - STARTED),
+           ("singleflight_calls_total", {}, singleflight.stats["calls"]),
+           ("singleflight_shared_total", {}, singleflight.stats["shared"]),
+           ("singleflight_inflight", {}, singleflight.pending())]
+    for name, t in TASKS.items():
+        lbl = {"task": name}
+        out += [("task_up", lbl, 0 if t["dead"] else 1),
+                ("task_success_total", lbl, t["ok_total"]),
+                ("task_last_success_age_seconds", lbl,
+                 now - (t["last_ok"] or t["started"]))]
+    for name, b in breaker.BREAKERS.items():
+        if b.last_ok:
+            out.append(("upstream_last_success_timestamp_seconds", {"api": name}, b.last_ok))
+    return out
+
+
+def prometheus(rows: list[tuple[str, dict, float]]) -> str:
+    """Format texte Prometheus."""
+    lines = []
+    for name, labels, v in rows:
+        lbl = ",".join(f'{k}="{val}"' for k, val in labels.items())
+        lines.append(f"{name}{{{lbl}}} {v:g}" if lbl else f"{name} {v:g}")
+    return "\n".join(lines) + "\n"
+
+
+@httpserver.route("GET", "/metrics")
+async def http_metrics(req):
+    rows = metrics() + ratelimit.metrics() + breaker.metrics()
+    return httpserver.text(200, prometheus(rows), "text/plain; version=0.0.4")
@@ -1,10 +1,13 @@
 """Module radiateurs — Overkiz, Shelly, PostgreSQL."""
-import httpx, psycopg2
+import asyncio, httpx
+import numpy as np
 from datetime import datetime, timedelta
-from pyoverkiz.client import OverkizClient
 from pyoverkiz.models import Command
-from config import (OVERKIZ_EMAIL, OVERKIZ_PASSWORD, MY_SERVER, DB_URL,
-                    SHELLY_TOKEN, SHELLY_ID, SHELLY_SERVER, CONFORT_VALS, log)
+from config import (SHELLY_TOKEN, SHELLY_ID, SHELLY_SERVER, SHELLY_PUSH,
+                    CONFORT_VALS, log)
+import samples, shelly_push, overkiz_transport, storage, ringbuffer, aggregates, tariff
+import archive, deadband
+import calibration, singleflight, ratelimit, breaker, window
 
 # Pièces à monitorer spécifiquement (avec Shelly)
 SALON_ROOM = "Salon"
@@ -13,15 +16,15 @@ TELETRAVAIL_JOURS = {3, 4}  # Jeudi=3, Vendredi=4
 
 
 def init_db():
-    if not DB_URL:
+    if not storage.ENABLED:
         return
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = storage.connect()
         cur  = conn.cursor()
-        cur.execute("""
+        cur.execute(f"""
             CREATE TABLE IF NOT EXISTS temp_logs (
-                id SERIAL PRIMARY KEY,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                id {storage.ID_PK},
+                timestamp TIMESTAMP DEFAULT {storage.TS_DEFAULT},
                 room TEXT,
                 temp_radiateur FLOAT,
                 temp_shelly FLOAT,
@@ -29,20 +32,35 @@ def init_db():
                 heure_creuse BOOLEAN
             );
             CREATE TABLE IF NOT EXISTS bec_transitions (
-                id SERIAL PRIMARY KEY,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                id {storage.ID_PK},
+                timestamp TIMESTAMP DEFAULT {storage.TS_DEFAULT},
                 index_kwh FLOAT NOT NULL,
                 heure_creuse BOOLEAN NOT NULL,
                 temp_eau FLOAT
             );
+            CREATE TABLE IF NOT EXISTS bec_samples (
+                id {storage.ID_PK},
+                timestamp TIMESTAMP DEFAULT {storage.TS_DEFAULT},
+                index_kwh FLOAT,
+                v40 FLOAT, v40_total FLOAT, v40_pct FLOAT,
+                t_haut FLOAT, t_milieu FLOAT, t_bas FLOAT
+            );
+            CREATE TABLE IF NOT EXISTS bec_capability_changes (
+                id {storage.ID_PK},
+                timestamp TIMESTAMP DEFAULT {storage.TS_DEFAULT},
+                cap_id INTEGER NOT NULL,
+                old_value TEXT,
+                new_value TEXT
+            );
         """)
         conn.commit()
-        # Migrations douces
-        for col, typ in [("temp_eau", "FLOAT"), ("heure_creuse", "BOOLEAN")]:
-            cur.execute(f"ALTER TABLE bec_transitions ADD COLUMN IF NOT EXISTS {col} {typ}")
-            cur.execute(f"ALTER TABLE temp_logs ADD COLUMN IF NOT EXISTS heure_creuse BOOLEAN")
+        # Migrations douces (bases PostgreSQL antérieures)
+        if storage.IS_PG:
+            for col, typ in [("temp_eau", "FLOAT"), ("heure_creuse", "BOOLEAN")]:
+                cur.execute(f"ALTER TABLE bec_transitions ADD COLUMN IF NOT EXISTS {col} {typ}")
+                cur.execute(f"ALTER TABLE temp_logs ADD COLUMN IF NOT EXISTS heure_creuse BOOLEAN")
         conn.commit(); cur.close(); conn.close()
-        log("DB initialisée")
+        log(f"DB initialisée ({storage.BACKEND})")
     except Exception as e:
         log(f"DB init ERR: {e}")
 
@@ -52,105 +70,92 @@ def init_db():
 # ---------------------------------------------------------------------------
 def get_rad_stats():
     """Delta moyen Shelly-Radiateur 7 jours pour Bureau."""
-    if not DB_URL:
+    if aggregates.warm(7):
+        return aggregates.rad_delta("Bureau", 7)
+    if not storage.ENABLED:
         return None
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = storage.connect()
         cur  = conn.cursor()
-        cur.execute("""SELECT AVG(temp_shelly - temp_radiateur), COUNT(*)
-                       FROM temp_logs WHERE room='Bureau'
-                       AND timestamp > NOW() - INTERVAL '7 days'
-                       AND temp_shelly IS NOT NULL""")
+        cur.execute("""SELECT SUM(delta * delta_n) / NULLIF(SUM(delta_n), 0), SUM(delta_n)
+                       FROM temp_history WHERE room='Bureau'
+                       AND timestamp > %s
+                       AND delta IS NOT NULL""", (datetime.now() - timedelta(days=7),))
         row = cur.fetchone(); cur.close(); conn.close()
         return row
     except Exception as e:
         log(f"Stats ERR: {e}"); return None
 
 
+def _salon_rows_series():
+    """(hourly, hc_hp, by_day, inertie) depuis temp_logs reconstruit sur une
+    grille de 5 min (deadband.series) : chaque instant pèse autant, qu'il ait
+    été stocké ou non — temp_logs compressé sur-représente les périodes
+    agitées dans une moyenne par ligne."""
+    end   = datetime.now()
+    at, amb = deadband.series(SALON_ROOM, "temp_shelly", end - timedelta(days=14), end)
+    _,  rad = deadband.series(SALON_ROOM, "temp_radiateur", end - timedelta(days=14), end)
+    hour  = at // 3600 % 24
+    day   = at // 86400
+    dow   = (day + 4) % 7                         # 0 = dimanche (1970-01-01 : jeudi)
+    ok    = ~np.isnan(amb)
+    ok7   = ok & (at >= archive.to_epoch(end - timedelta(days=7)))
+
+    hourly = []
+    for h in range(24):
+        m = ok7 & (hour == h)
+        if m.any():
+            r = rad[m][~np.isnan(rad[m])]
+            hourly.append((h, float(amb[m].mean()), float(r.mean()) if len(r) else None,
+                           int(m.sum())))
+    hc = tariff.hc_mask(at)
+    hc_hp = {flag: (flag, float(amb[m].mean()), int(m.sum()))
+             for flag in (True, False) if (m := ok7 & (hc == flag)).any()}
+    by_day = [(d, float(amb[m].mean()), int(m.sum()))
+              for d in range(7) if (m := ok & (dow == d)).any()]
+
+    # Inertie : jours ayant les deux créneaux 06h20-06h40 et 07h20-07h40
+    minute = at // 60 % 60
+    fin, reveil = [], []
+    for d in np.unique(day[ok7]):
+        md = ok7 & (day == d) & (minute >= 20) & (minute <= 40)
+        a, b = md & (hour == 6), md & (hour == 7)
+        if a.any() and b.any():
+            fin.append(amb[a].mean()); reveil.append(amb[b].mean())
+    inertie = (float(np.mean(fin)), float(np.mean(reveil)), len(fin)) if fin \
+        else (None, None, 0)
+    return hourly, hc_hp, by_day, inertie
+
+
 def get_salon_stats() -> str:
     """Analyse thermique salon sur 7 jours :
     - Évolution horaire moyenne (pour trouver le meilleur moment de chauffe)
     - Comparaison HC vs HP
     - Détection Jeudi/Vendredi (télétravail)
+    Agrégats incrémentaux en mémoire (aggregates.py) si la fenêtre est couverte,
+    sinon temp_logs (archive + base) reconstruit sur une grille régulière.
     """
-    if not DB_URL:
+    if aggregates.warm(7):
+        hourly, hc_hp, by_day, inertie = aggregates.salon_rows(SALON_ROOM)
+    elif not storage.ENABLED:
         return "❌ DB non configurée"
+    else:
+        try:
+            hourly, hc_hp, by_day, inertie = _salon_rows_series()
+        except Exception as e:
+            log(f"Salon stats ERR: {e}")
+            return f"⚠️ {e}"
     try:
-        conn = psycopg2.connect(DB_URL)
-        cur  = conn.cursor()
-
-        # 1. Température moyenne par heure de la journée
-        cur.execute("""
-            SELECT EXTRACT(HOUR FROM timestamp)::int AS heure,
-                   AVG(temp_shelly) AS t_amb,
-                   AVG(temp_radiateur) AS t_rad,
-                   COUNT(*) AS n
-            FROM temp_logs
-            WHERE room = %s
-              AND timestamp > NOW() - INTERVAL '7 days'
-              AND temp_shelly IS NOT NULL
-            GROUP BY heure ORDER BY heure
-        """, (SALON_ROOM,))
-        hourly = cur.fetchall()
-
-        # 2. Écart HC vs HP
-        cur.execute("""
-            SELECT heure_creuse,
-                   AVG(temp_shelly) AS t_amb,
-                   COUNT(*) AS n
-            FROM temp_logs
-            WHERE room = %s
-              AND timestamp > NOW() - INTERVAL '7 days'
-              AND temp_shelly IS NOT NULL
-              AND heure_creuse IS NOT NULL
-            GROUP BY heure_creuse
-        """, (SALON_ROOM,))
-        hc_hp = {row[0]: row for row in cur.fetchall()}
-
-        # 3. Télétravail Jeu/Ven vs reste
-        cur.execute("""
-            SELECT EXTRACT(DOW FROM timestamp)::int AS dow,
-                   AVG(temp_shelly) AS t_amb,
-                   COUNT(*) AS n
-            FROM temp_logs
-            WHERE room = %s
-              AND timestamp > NOW() - INTERVAL '14 days'
-              AND temp_shelly IS NOT NULL
-            GROUP BY dow ORDER BY dow
-        """, (SALON_ROOM,))
-        by_day = cur.fetchall()
-
-        # 4. Chute température 06h26→07h30 (fin HC → réveil)
-        cur.execute("""
-            SELECT
-                AVG(t_0626.temp_shelly) AS t_fin_hc,
-                AVG(t_0730.temp_shelly) AS t_reveil,
-                COUNT(*) AS n
-            FROM (
-                SELECT DATE(timestamp) AS jour, AVG(temp_shelly) AS temp_shelly
-                FROM temp_logs WHERE room=%s AND temp_shelly IS NOT NULL
-                AND EXTRACT(HOUR FROM timestamp) = 6
-                AND EXTRACT(MINUTE FROM timestamp) BETWEEN 20 AND 40
-                GROUP BY jour
-            ) t_0626
-            JOIN (
-                SELECT DATE(timestamp) AS jour, AVG(temp_shelly) AS temp_shelly
-                FROM temp_logs WHERE room=%s AND temp_shelly IS NOT NULL
-                AND EXTRACT(HOUR FROM timestamp) = 7
-                AND EXTRACT(MINUTE FROM timestamp) BETWEEN 20 AND 40
-                GROUP BY jour
-            ) t_0730 ON t_0626.jour = t_0730.jour
-        """, (SALON_ROOM, SALON_ROOM))
-        inertie = cur.fetchone()
-
-        cur.close(); conn.close()
-
         if not hourly:
             return "📊 <b>SALON</b> — pas encore assez de données (reviens dans quelques jours)"
 
         # Courbe horaire compacte : grouper par blocs de 3h
         lines = ["📊 <b>SALON 7J</b>  <code>H=heure T=ambiance R=radiateur</code>", ""]
-        hc_zones = set(range(1, 7)) | set(range(14, 17))
+        spark = (ringbuffer.sparkline(SALON_ROOM, "temp_shelly")
+                 or ringbuffer.sparkline(SALON_ROOM, "temp_radiateur"))
+        if spark:
+            lines += [f"🕐 24h <code>{spark}</code>", ""]
+        hc_zones = tariff.hc_hours()
         for h, t_amb, t_rad, n in hourly:
             hc = "🟢" if h in hc_zones else "🔴"
             t_r = f"{t_rad:.0f}" if t_rad else "—"
@@ -192,41 +197,53 @@ def get_salon_stats() -> str:
 # SHELLY + OVERKIZ
 # ---------------------------------------------------------------------------
 async def get_shelly_temp():
+    if SHELLY_PUSH:
+        t = shelly_push.latest()
+        if t is not None:
+            return t
     if not SHELLY_TOKEN:
         return None
     try:
-        async with httpx.AsyncClient() as c:
-            r = await c.post(f"https://{SHELLY_SERVER}/device/status",
-                             data={"id": SHELLY_ID, "auth_key": SHELLY_TOKEN}, timeout=10)
-            return r.json()["data"]["device_status"]["temperature:0"]["tC"]
-    except:
+        return await breaker.call("shelly", _shelly_cloud)
+    except breaker.CircuitOpen:
+        return None
+    except Exception as e:
+        log(f"Shelly ERR: {e!r}")
         return None
 
 
+async def _shelly_cloud():
+    async with httpx.AsyncClient(event_hooks=ratelimit.hooks("shelly")) as c:
+        r = await c.post(f"https://{SHELLY_SERVER}/device/status",
+                         data={"id": SHELLY_ID, "auth_key": SHELLY_TOKEN}, timeout=10)
+        r.raise_for_status()
+        return r.json()["data"]["device_status"]["temperature:0"]["tC"]
+
+
+@singleflight.coalesce
 async def get_current_data():
-    async with OverkizClient(OVERKIZ_EMAIL, OVERKIZ_PASSWORD, server=MY_SERVER) as c:
-        await c.login()
-        devices  = await c.get_devices()
-        shelly_t = await get_shelly_temp()
-        data = {}
-        for d in devices:
-            fid = d.device_url.split("#")[0].split("/")[-1] + "#1"
-            if fid in CONFORT_VALS:
-                name = CONFORT_VALS[fid]["name"]
-                if name not in data:
-                    data[name] = {"temp": None, "target": None}
-                st = {s.name: s.value for s in d.states}
-                t  = st.get("core:TemperatureState")
-                tg = (st.get("io:EffectiveTemperatureSetpointState")
-                      or st.get("core:TargetTemperatureState"))
-                if t  is not None: data[name]["temp"]   = t
-                if tg is not None: data[name]["target"] = tg
-        return data, shelly_t
+    devices  = await overkiz_transport.run(lambda c: c.get_devices(), read=True)
+    shelly_t = await get_shelly_temp()
+    data = {}
+    for d in devices:
+        fid = d.device_url.split("#")[0].split("/")[-1] + "#1"
+        if fid in CONFORT_VALS:
+            name = CONFORT_VALS[fid]["name"]
+            if name not in data:
+                data[name] = {"temp": None, "target": None}
+            st = {s.name: s.value for s in d.states}
+            t  = st.get("core:TemperatureState")
+            tg = (st.get("io:EffectiveTemperatureSetpointState")
+                  or st.get("core:TargetTemperatureState"))
+            if t  is not None: data[name]["temp"]   = t
+            if tg is not None: data[name]["target"] = tg
+    return data, shelly_t
 
 
-async def apply_heating_mode(target_mode: str) -> str:
-    async with OverkizClient(OVERKIZ_EMAIL, OVERKIZ_PASSWORD, server=MY_SERVER) as c:
-        await c.login()
+@singleflight.coalesce
+async def apply_heating_mode(target_mode: str, rooms: list[str] | None = None) -> str:
+    """HOME / ABSENCE sur tous les radiateurs, ou seulement ceux de `rooms`."""
+    async def write(c):
         devices = await c.get_devices()
         results = []
         for d in devices:
@@ -234,7 +251,10 @@ async def apply_heating_mode(target_mode: str) -> str:
             if sid not in CONFORT_VALS:
                 continue
             info  = CONFORT_VALS[sid]
-            t_val = info["temp"] if target_mode == "HOME" else info["eco"]
+            if rooms and info["name"] not in rooms:
+                continue
+            target = info["temp"] if target_mode == "HOME" else info["eco"]
+            t_val  = calibration.setpoint(info["name"], target)
             is_h  = "Heater" in d.widget
             m_cmd = "setOperatingMode" if is_h else "setTowelDryerOperatingMode"
             m_val = "internal" if target_mode == "HOME" else ("basic" if is_h else "external")
@@ -243,28 +263,32 @@ async def apply_heating_mode(target_mode: str) -> str:
                     Command("setTargetTemperature", [t_val]),
                     Command(m_cmd, [m_val])
                 ])
-                results.append(f"✅ <b>{info['name']}</b> : {t_val}°C")
+                window.mode_changed(info["name"])
+                results.append(f"✅ <b>{info['name']}</b> : {t_val}°C"
+                               + (f" (pour {target}°C réels)" if t_val != target else ""))
+            except (OSError, asyncio.TimeoutError) as e:
+                if overkiz_transport.is_local():
+                    raise   # passerelle locale : overkiz_transport.run rejoue via le cloud
+                log(f"Rad {info['name']} ERR: {e!r}")
+                results.append(f"❌ <b>{info['name']}</b>")
             except Exception as e:
                 log(f"Rad {info['name']} ERR: {e}")
                 results.append(f"❌ <b>{info['name']}</b>")
         return "\n".join(results)
+    return await overkiz_transport.run(write)
 
 
 async def perform_record(heure_creuse: bool = False):
-    """Enregistrement horaire températures radiateurs + Shelly."""
+    """Enregistrement horaire températures radiateurs + Shelly ; True si réussi."""
     try:
         data, shelly_t = await get_current_data()
-        conn = psycopg2.connect(DB_URL)
-        cur  = conn.cursor()
-        for name, v in data.items():
-            if v["temp"] is not None:
-                cur.execute(
-                    "INSERT INTO temp_logs (room, temp_radiateur, temp_shelly, consigne, heure_creuse)"
-                    " VALUES (%s,%s,%s,%s,%s)",
-                    (name, v["temp"],
-                     shelly_t if name == SALON_ROOM else None,
-                     v["target"], heure_creuse)
-                )
-        conn.commit(); cur.close(); conn.close()
+        samples.publish([
+            samples.make_sample(name, v["temp"],
+                                shelly_t if name == SALON_ROOM else None,
+                                v["target"], heure_creuse)
+            for name, v in data.items() if v["temp"] is not None
+        ])
+        return True
     except Exception as e:
         log(f"RECORD ERR: {e}")
+        return False
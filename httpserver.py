@@ -0,0 +1,106 @@
+"""httpserver.py — Serveur HTTP minimal dans la boucle asyncio du bot (port 8000).
+
+Un seul serveur (asyncio.start_server) pour la santé, les métriques, les
+notifications Shelly (/shelly/rpc) et, en mode webhook, les mises à jour
+Telegram. Les routes sont des coroutines enregistrées par @route(méthode,
+chemin) : handler(req) → (statut, corps, content-type), req étant un dict
+{method, path, query, headers, body}. Une requête par connexion (les clients
+sont des sondes et des webhooks, pas des navigateurs).
+"""
+import asyncio
+from urllib.parse import urlsplit, parse_qs
+from config import log
+
+MAX_HEADER = 16 * 1024
+MAX_BODY   = 1024 * 1024
+READ_TIMEOUT = 10
+REASONS = {200: "OK", 202: "Accepted", 204: "No Content", 400: "Bad Request",
+           403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+ROUTES: dict[tuple[str, str], object] = {}
+_server: asyncio.AbstractServer | None = None
+
+
+def route(method: str, path: str):
+    """Décorateur : enregistre handler(req) pour (méthode, chemin)."""
+    def deco(fn):
+        ROUTES[(method, path)] = fn
+        return fn
+    return deco
+
+
+def text(status: int, body: str = "", ctype: str = "text/plain; charset=utf-8"):
+    return status, body.encode(), ctype
+
+
+async def _read_request(reader: asyncio.StreamReader) -> dict | int:
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), READ_TIMEOUT)
+    except asyncio.LimitOverrunError:
+        return 413
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+        return 400
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        return 400
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            k, v = line.split(":", 1)
+            headers[k.strip().lower()] = v.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        return 400
+    if length < 0:
+        return 400
+    if length > MAX_BODY:
+        return 413
+    try:
+        body = await asyncio.wait_for(reader.readexactly(length), READ_TIMEOUT) if length else b""
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+        return 400
+    url = urlsplit(target)
+    return {"method": method.upper(), "path": url.path, "query": parse_qs(url.query),
+            "headers": headers, "body": body}
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        req = await _read_request(reader)
+        ctype, body = "text/plain; charset=utf-8", b""
+        if isinstance(req, int):
+            status = req
+        else:
+            handler = ROUTES.get((req["method"], req["path"]))
+            if handler is None:
+                status = 405 if any(p == req["path"] for _, p in ROUTES) else 404
+            else:
+                try:
+                    status, body, ctype = await handler(req)
+                except Exception as e:
+                    log(f"HTTP {req['method']} {req['path']} ERR: {e!r}")
+                    status = 500
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: {ctype}\r\nContent-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n")
+        writer.write(head.encode() + body)
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass                               # client parti (ConnectionResetError…)
+    except Exception as e:
+        log(f"HTTP ERR: {e!r}")
+    finally:
+        writer.close()
+
+
+async def start(port: int, host: str = "0.0.0.0"):
+    """Démarre le serveur (idempotent)."""
+    global _server
+    if _server is None:
+        _server = await asyncio.start_server(_handle, host, port, limit=MAX_HEADER)
+        log(f"HTTP : écoute sur {host}:{port} ({', '.join(f'{m} {p}' for m, p in ROUTES)})")
+    return _server
@@ -1,36 +1,43 @@
 """main.py — Bot Telegram chauffage + ballon eau chaude. v15.7"""
-import asyncio, threading, re, json, httpx, sys, os
-import psycopg2
+import asyncio, re, json, httpx, sys, os, time, csv, gzip, tempfile, hmac, signal
 from datetime import datetime, timedelta
-from http.server import BaseHTTPRequestHandler, HTTPServer
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (Application, CommandHandler, CallbackQueryHandler,
                            MessageHandler, filters, ContextTypes)
 from telegram.error import Conflict, NetworkError
 
-from config import TOKEN, DB_URL, VERSION, log, ADMIN_CHAT_ID, ATLANTIC_API
+from config import (TOKEN, VERSION, log, ADMIN_CHAT_ID, ATLANTIC_API,
+                    SHELLY_PUSH, CONFORT_VALS, RAD_SAMPLE_S, RING_FRESH_S,
+                    AGG_SAVE_S, BEC_USER, HTTP_PORT, WEBHOOK_URL, WEBHOOK_SECRET,
+                    BEC_WATCH_MAX_S, ALERT_TICK_S)
 from bec import (manage_bec, bec_get_index, is_heure_creuse,
                  get_hc_label, minutes_until_next_transition, save_transition,
+                 reset_transitions,
                  pct_to_temp, write_capability, bec_authenticate,
                  find_water_heater, CAPS_QTITE)
 from heating import (get_current_data, apply_heating_mode, perform_record,
-                     init_db, get_salon_stats)
+                     init_db, get_salon_stats, SALON_ROOM)
+from archive import csv_chunks, CSV_HEADER
+import archive
+import shelly_push, overkiz_transport, retention, partitions, storage
+import ringbuffer, aggregates, thermal, preheat, cost, bec_forecast, bec_watch, alerts
+import calibration, singleflight, ratelimit, httpserver, health
 
 
 # ---------------------------------------------------------------------------
 # SCHEDULER (inline)
 # ---------------------------------------------------------------------------
 def init_scheduler_db():
-    if not DB_URL:
+    if not storage.ENABLED:
         return
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = storage.connect()
         cur  = conn.cursor()
-        cur.execute("""
+        cur.execute(f"""
             CREATE TABLE IF NOT EXISTS scheduled_actions (
-                id SERIAL PRIMARY KEY,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                id {storage.ID_PK},
+                created_at TIMESTAMP DEFAULT {storage.TS_DEFAULT},
                 target_dt  TIMESTAMP NOT NULL,
                 action     TEXT NOT NULL,
                 label      TEXT,
@@ -39,8 +46,8 @@ def init_scheduler_db():
                 done_at    TIMESTAMP
             );
             CREATE TABLE IF NOT EXISTS bec_mode_log (
-                id SERIAL PRIMARY KEY,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                id {storage.ID_PK},
+                timestamp TIMESTAMP DEFAULT {storage.TS_DEFAULT},
                 mode TEXT NOT NULL
             );
         """)
@@ -50,10 +57,10 @@ def init_scheduler_db():
 
 
 def save_scheduled(target_dt, action, label, chat_id):
-    if not DB_URL:
+    if not storage.ENABLED:
         return None
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = storage.connect()
         cur  = conn.cursor()
         cur.execute(
             "INSERT INTO scheduled_actions (target_dt,action,label,chat_id)"
@@ -67,12 +74,12 @@ def save_scheduled(target_dt, action, label, chat_id):
 
 
 def mark_done(sched_id):
-    if not DB_URL:
+    if not storage.ENABLED:
         return
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = storage.connect()
         cur  = conn.cursor()
-        cur.execute("UPDATE scheduled_actions SET done=TRUE,done_at=NOW()"
+        cur.execute(f"UPDATE scheduled_actions SET done=TRUE,done_at={storage.NOW}"
                     " WHERE id=%s", (sched_id,))
         conn.commit(); cur.close(); conn.close()
     except Exception as e:
@@ -80,10 +87,10 @@ def mark_done(sched_id):
 
 
 def cancel_scheduled(sched_id, chat_id):
-    if not DB_URL:
+    if not storage.ENABLED:
         return False
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = storage.connect()
         cur  = conn.cursor()
         cur.execute("DELETE FROM scheduled_actions"
                     " WHERE id=%s AND chat_id=%s AND done=FALSE",
@@ -96,14 +103,14 @@ def cancel_scheduled(sched_id, chat_id):
 
 
 def get_pending(chat_id=None):
-    if not DB_URL:
+    if not storage.ENABLED:
         return []
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = storage.connect()
         cur  = conn.cursor()
         q = ("SELECT id,target_dt,action,label,chat_id"
              " FROM scheduled_actions"
-             " WHERE done=FALSE AND target_dt > NOW()")
+             f" WHERE done=FALSE AND target_dt > {storage.NOW}")
         params = []
         if chat_id:
             q += " AND chat_id=%s"
@@ -126,7 +133,7 @@ def get_pending_summary(chat_id=None):
     lines = []
     for it in items[:3]:
         dt  = it["target_dt"].strftime("%d/%m %Hh%M")
-        ico = icons.get(it["action"], "⏰")
+        ico = icons.get(it["action"].split("@")[0], "⏰")
         lbl = f" — {it['label']}" if it["label"] else ""
         lines.append(f"  {ico} {dt}{lbl} [/annuler{it['id']}]")
     return "\n".join(lines)
@@ -145,7 +152,8 @@ def get_keyboard():
          InlineKeyboardButton("📈 CONSO HC/HP",    callback_data="BEC_STATS")],
         [InlineKeyboardButton("🏡 BALLON MAISON",  callback_data="BEC_HOME"),
          InlineKeyboardButton("✈️ BALLON ABSENCE", callback_data="BEC_ABSENCE")],
-        [InlineKeyboardButton("🗑️ RESET RELEVÉS",  callback_data="BEC_RESET")],
+        [InlineKeyboardButton("🗑️ RESET RELEVÉS",  callback_data="BEC_RESET"),
+         InlineKeyboardButton("💶 COÛTS",          callback_data="COST")],
     ])
 
 
@@ -244,7 +252,7 @@ async def _schedule_action(update, context, action):
             _execute_action(action, chat_id, context, label or "maintenant"))
         return
 
-    sched_id = save_scheduled(target_dt, action, label, chat_id)
+    sched_id = _arm(context, chat_id, action, target_dt, label)
     h_disp   = target_dt.strftime("%d/%m à %Hh%M")
     lbl_disp = f" — <i>{label}</i>" if label else ""
     hrs, mins = int(delay // 3600), int((delay % 3600) // 60)
@@ -255,16 +263,27 @@ async def _schedule_action(update, context, action):
     await update.message.reply_text(msg, parse_mode="HTML",
                                     reply_markup=get_keyboard())
 
+
+def _arm(context, chat_id, action, target_dt, label):
+    """Enregistre la programmation et lance son attente ; retourne son ID."""
+    sched_id = save_scheduled(target_dt, action, label, chat_id)
+
     async def delayed():
-        await asyncio.sleep(delay)
+        await asyncio.sleep(max(0, (target_dt - datetime.now()).total_seconds()))
         if sched_id:
             mark_done(sched_id)
-        await _execute_action(action, chat_id, context, label or h_disp)
+        await _execute_action(action, chat_id, context,
+                              label or target_dt.strftime("%d/%m à %Hh%M"))
 
     asyncio.create_task(delayed())
+    return sched_id
 
 
 async def _execute_action(action, chat_id, context, label):
+    # "RADS_HOME@Salon" : action limitée à une pièce (préchauffe)
+    action, _, room = action.partition("@")
+    rooms  = [room] if room else None
+    where  = f" — {room}" if room else ""
     titles = {
         "BEC_HOME":     "🏡💧 BALLON MAISON",
         "BEC_ABSENCE":  "✈️💧 BALLON ABSENCE",
@@ -274,12 +293,12 @@ async def _execute_action(action, chat_id, context, label):
     try:
         if   action == "BEC_HOME":     res = await manage_bec("HOME")
         elif action == "BEC_ABSENCE":  res = await manage_bec("ABSENCE")
-        elif action == "RADS_HOME":    res = await apply_heating_mode("HOME")
-        elif action == "RADS_ABSENCE": res = await apply_heating_mode("ABSENCE")
+        elif action == "RADS_HOME":    res = await apply_heating_mode("HOME", rooms)
+        elif action == "RADS_ABSENCE": res = await apply_heating_mode("ABSENCE", rooms)
         else:                          res = f"Action inconnue : {action}"
         await context.bot.send_message(
             chat_id,
-            f"<b>{titles.get(action, action)}</b> ({label})\n\n{res}",
+            f"<b>{titles.get(action, action)}</b>{where} ({label})\n\n{res}",
             parse_mode="HTML", reply_markup=get_keyboard())
     except Exception as e:
         log(f"execute_action {action} ERR: {e}")
@@ -320,7 +339,7 @@ async def cmd_prog(update: Update, context: ContextTypes.DEFAULT_TYPE):
         delay = (it["target_dt"] - datetime.now()).total_seconds()
         hrs, mins = int(delay // 3600), int((delay % 3600) // 60)
         lines.append(
-            f"{icons.get(it['action'], '⏰')} <b>{dt}</b>{lbl}\n"
+            f"{icons.get(it['action'].split('@')[0], '⏰')} <b>{dt}</b>{lbl}\n"
             f"   <i>dans {hrs}h{mins:02d}min</i>  /annuler{it['id']}")
     await update.message.reply_text(
         "\n\n".join(lines), parse_mode="HTML", reply_markup=get_keyboard())
@@ -340,6 +359,120 @@ async def cmd_annuler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"❌ #{sched_id} introuvable ou déjà exécutée.")
 
 
+def _parse_period(txt):
+    """'7j', '3m', '1a' → timedelta (None si invalide)."""
+    m = re.fullmatch(r"(\d+)\s*(j|d|s|m|a|y)?", txt.lower())
+    if not m:
+        return None
+    n, unit = int(m.group(1)), m.group(2) or "j"
+    return timedelta(days=n * {"j": 1, "d": 1, "s": 7, "m": 30, "a": 365, "y": 365}[unit])
+
+
+async def cmd_prechauffe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/prechauffe [pièce] [jour] 18h [label] — relance calculée pour être
+    en confort à l'heure dite (RADS_HOME par pièce)."""
+    chat_id = update.effective_chat.id
+    rooms   = {v["name"].lower(): v["name"] for v in CONFORT_VALS.values()}
+    args    = list(context.args or [])
+    room    = rooms.get(args.pop(0).lower()) if args and args[0].lower() in rooms else None
+    deadline, label, err = parse_datetime_arg(args)
+    if err:
+        await update.message.reply_text(
+            "🔥 <b>/prechauffe [pièce] [jour] 18h [label]</b>\n"
+            f"Pièces : {', '.join(rooms.values())}", parse_mode="HTML")
+        return
+    items = await asyncio.to_thread(preheat.plan, deadline, [room] if room else None)
+    for it in items:
+        action = f"RADS_HOME@{it['room']}"
+        if it["start"] <= datetime.now():
+            asyncio.create_task(_execute_action(action, chat_id, context, "préchauffe"))
+        else:
+            _arm(context, chat_id, action, it["start"],
+                 label or f"préchauffe {deadline:%Hh%M}")
+    await update.message.reply_text(preheat.format_plan(deadline, items),
+                                    parse_mode="HTML", reply_markup=get_keyboard())
+
+
+async def cmd_modele(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/modele [pièce] [période] — constante de temps et vitesse de chauffe."""
+    rooms = {v["name"].lower(): v["name"] for v in CONFORT_VALS.values()}
+    room, period = None, timedelta(days=30)
+    for arg in context.args or []:
+        if arg.lower() in rooms:
+            room = rooms[arg.lower()]
+        elif _parse_period(arg):
+            period = _parse_period(arg)
+        else:
+            await update.message.reply_text(
+                "Usage : /modele [pièce] [30j|3m]\n"
+                f"Pièces : {', '.join(rooms.values())}")
+            return
+    msg = await update.message.reply_text("🧪 Ajustement du modèle thermique...")
+    try:
+        txt = await asyncio.to_thread(thermal.report, [room] if room else None, period.days)
+    except Exception as e:
+        log(f"Modèle ERR: {e}"); txt = f"⚠️ {e}"
+    await msg.edit_text(txt, parse_mode="HTML")
+
+
+async def cmd_export(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/export [pièce|tout] [période] — historique temp_logs en CSV gzip."""
+    chat_id = update.effective_chat.id
+    if not storage.ENABLED:
+        await update.message.reply_text("❌ DB non configurée")
+        return
+    rooms  = {v["name"].lower(): v["name"] for v in CONFORT_VALS.values()}
+    room, period = None, timedelta(days=30)
+    for arg in context.args or []:
+        if arg.lower() in rooms:
+            room = rooms[arg.lower()]
+        elif arg.lower() in ("tout", "all"):
+            room = None
+        elif _parse_period(arg):
+            period = _parse_period(arg)
+        else:
+            await update.message.reply_text(
+                "Usage : /export [pièce|tout] [7j|3m|1a]\n"
+                f"Pièces : {', '.join(rooms.values())}")
+            return
+
+    since = datetime.now() - period
+    label = f"{room or 'toutes pièces'} — {period.days}j"
+    msg   = await update.message.reply_text(f"📤 Export {label}...")
+    fd, path = tempfile.mkstemp(suffix=".csv.gz"); os.close(fd)
+    total, last_edit = 0, 0.0
+    chunks = csv_chunks(room, since)
+    try:
+        with gzip.open(path, "wt", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(CSV_HEADER)
+            while True:
+                # Lecture DB bloquante hors boucle, un paquet à la fois
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                w.writerows(chunk)
+                total += len(chunk)
+                if time.monotonic() - last_edit > 2:
+                    last_edit = time.monotonic()
+                    try:
+                        await msg.edit_text(f"📤 Export {label}... {total} lignes")
+                    except Exception:
+                        pass
+        await msg.edit_text(f"📤 Export {label} : {total} lignes ✅")
+        fname = f"temp_logs_{(room or 'tout').lower()}_{datetime.now():%Y%m%d}.csv.gz"
+        with open(path, "rb") as f:
+            await context.bot.send_document(chat_id, document=f, filename=fname,
+                                            reply_markup=get_keyboard())
+    except Exception as e:
+        log(f"Export ERR: {e}")
+        await context.bot.send_message(chat_id, f"⚠️ Export : {e}",
+                                       reply_markup=get_keyboard())
+    finally:
+        chunks.close()
+        os.remove(path)
+
+
 # ---------------------------------------------------------------------------
 # BOUTONS
 # ---------------------------------------------------------------------------
@@ -373,8 +506,18 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         except Exception:
             pass
         try:
-            data, shelly_t = await get_current_data()
-            lines = []
+            rooms  = [v["name"] for v in CONFORT_VALS.values()]
+            cached = ringbuffer.current(rooms, SALON_ROOM, RING_FRESH_S)
+            lines  = []
+            try:
+                data, shelly_t = cached or await get_current_data()
+            except Exception as e:
+                # Cloud en panne / disjoncteur ouvert : derniers relevés connus
+                stale = ringbuffer.current(rooms, SALON_ROOM, None)
+                if not stale:
+                    raise
+                data, shelly_t = stale
+                lines.append(f"⚠️ <i>{e} — derniers relevés connus</i>")
             for n, v in data.items():
                 lines.append(f"📍 <b>{n}</b>: {v['temp']}°C"
                              f" (Cible: {v['target']}°C)")
@@ -382,6 +525,9 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     lines.append(
                         f"   └ 🌡️ <i>Shelly cuisine : {shelly_t}°C</i>")
             lines.append(f"\n{get_hc_label()}")
+            lat = overkiz_transport.latency_label()
+            if lat:
+                lines.append(f"<i>{lat}</i>")
             prog = get_pending_summary(chat_id)
             if prog:
                 lines.append(f"\n⏰ <b>Programmations</b>\n{prog}")
@@ -403,6 +549,16 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=get_keyboard())
         return
 
+    if action == "COST":
+        try:
+            await query.edit_message_text("💶 Calcul des coûts...")
+        except Exception:
+            pass
+        txt = await singleflight.do(("cost.report",), asyncio.to_thread, cost.report)
+        await context.bot.send_message(chat_id, txt, parse_mode="HTML",
+                                       reply_markup=get_keyboard())
+        return
+
     if action.startswith("BEC_"):
         bec_action = action[4:]
 
@@ -431,6 +587,9 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             try:
                 res = await manage_bec(bec_action)
                 if bec_action == "GET":
+                    prevision = bec_forecast.format_forecast()
+                    if prevision:
+                        res += f"\n\n{prevision}"
                     prog = get_pending_summary(chat_id)
                     if prog:
                         res += f"\n\n⏰ <b>Programmations BEC</b>\n{prog}"
@@ -453,11 +612,16 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # SURVEILLANCE BALLON
 # ---------------------------------------------------------------------------
 async def background_bec_surveillance(app):
-    # Surveillance désactivée dans cette version
-    return
+    """Lecture adaptative des capabilities ballon (bec_watch) : journal des
+    changements, relevés V40 et prévision de demande."""
+    if not BEC_USER:
+        return
+    ratelimit.background()
+    await bec_watch.run()
 
 
 async def background_transition_logger():
+    ratelimit.background()
     while True:
         wait = minutes_until_next_transition()
         log(f"Prochain relevé BEC dans {wait//60}min {wait%60}s")
@@ -465,15 +629,56 @@ async def background_transition_logger():
         idx, temp_eau = await bec_get_index()
         if idx is not None:
             save_transition(idx, is_heure_creuse(), temp_eau)
+            health.ok("transition_logger")
         else:
             log("BEC transition : échec lecture index")
 
 
 async def background_rad_logger():
+    # Alimente aussi le ring buffer : RAD_SAMPLE_S < 3600 rend LIST instantané
+    ratelimit.background()
     while True:
-        await asyncio.sleep(3600)
-        if DB_URL:
-            await perform_record(heure_creuse=is_heure_creuse())
+        await asyncio.sleep(RAD_SAMPLE_S)
+        if await perform_record(heure_creuse=is_heure_creuse()):
+            health.ok("rad_logger")
+
+
+async def background_aggregates():
+    while True:
+        await asyncio.sleep(AGG_SAVE_S)
+        aggregates.save()
+        calibration.save()
+        health.ok("aggregates")
+
+
+async def background_retention():
+    """Migration en ligne vers temp_logs partitionnée au démarrage, puis chaque
+    nuit à 03h40 : partitions à venir + sous-échantillonnage par lots espacés
+    pour ne pas monopoliser la base."""
+    await asyncio.to_thread(partitions.migrate)
+    await asyncio.to_thread(partitions.ensure_partitions)
+    health.ok("retention")
+    while True:
+        now    = datetime.now()
+        target = now.replace(hour=3, minute=40, second=0, microsecond=0)
+        if target <= now:
+            target += timedelta(days=1)
+        await asyncio.sleep((target - now).total_seconds())
+        await asyncio.to_thread(partitions.ensure_partitions)
+        await asyncio.to_thread(archive.export_all)     # avant toute purge du brut
+        done = 0
+        while True:
+            try:
+                res = await asyncio.to_thread(retention.run_batch)
+            except Exception as e:
+                log(f"Retention ERR: {e}"); break
+            if res is None:
+                break
+            done += 1
+            await asyncio.sleep(2)
+        if done:
+            log(f"Retention : {done} lot(s) traité(s)")
+        health.ok("retention")
 
 
 # ---------------------------------------------------------------------------
@@ -492,25 +697,67 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
 # ---------------------------------------------------------------------------
 # HEALTH CHECK + MAIN
 # ---------------------------------------------------------------------------
-class Health(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200); self.end_headers(); self.wfile.write(b"OK")
-    def log_message(self, *a):
-        pass
+@httpserver.route("POST", "/shelly/rpc")
+async def http_shelly(req):
+    if SHELLY_PUSH != "http":
+        return httpserver.text(404)
+    token = req["headers"].get("x-shelly-token") or req["query"].get("token", [None])[0]
+    return httpserver.text(shelly_push.handle_http(req["body"], token))
+
+
+async def run_webhook(app: Application):
+    """Mises à jour Telegram reçues sur POST /telegram (jeton secret vérifié).
+    Repli en polling si l'enregistrement du webhook échoue. Le webhook n'est
+    pas supprimé à l'arrêt : l'instance suivante l'a déjà repris."""
+    @httpserver.route("POST", "/telegram")
+    async def http_telegram(req):
+        token = req["headers"].get("x-telegram-bot-api-secret-token", "")
+        if not hmac.compare_digest(token, WEBHOOK_SECRET):
+            return httpserver.text(403)
+        await app.update_queue.put(Update.de_json(json.loads(req["body"]), app.bot))
+        return httpserver.text(200)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    async with app:
+        await app.post_init(app)
+        await app.start()
+        try:
+            await app.bot.set_webhook(f"{WEBHOOK_URL.rstrip('/')}/telegram",
+                                      secret_token=WEBHOOK_SECRET,
+                                      allowed_updates=Update.ALL_TYPES,
+                                      drop_pending_updates=True)
+            log(f"Webhook Telegram : {WEBHOOK_URL.rstrip('/')}/telegram")
+        except Exception as e:
+            log(f"Webhook ERR: {e} — repli polling")
+            await app.updater.start_polling(drop_pending_updates=True,
+                                            allowed_updates=Update.ALL_TYPES)
+        await stop.wait()
+        if app.updater.running:
+            await app.updater.stop()
+        await app.stop()
+        await app.post_shutdown(app)
 
 
 def main():
     init_db()
     init_scheduler_db()
-    threading.Thread(
-        target=lambda: HTTPServer(("0.0.0.0", 8000), Health).serve_forever(),
-        daemon=True
-    ).start()
+    retention.init_retention_db()
+    ringbuffer.restore()
+    if not aggregates.load():
+        aggregates.warmup()
+    bec_forecast.load()
+    calibration.load()
     app = Application.builder().token(TOKEN).build()
     app.add_handler(CommandHandler("start",  cmd_start))
     app.add_handler(CommandHandler("bec",    cmd_bec))
     app.add_handler(CommandHandler("rads",   cmd_rads))
     app.add_handler(CommandHandler("prog",   cmd_prog))
+    app.add_handler(CommandHandler("export", cmd_export))
+    app.add_handler(CommandHandler("modele", cmd_modele))
+    app.add_handler(CommandHandler("prechauffe", cmd_prechauffe))
     app.add_handler(MessageHandler(
         filters.Regex(r"^/annuler\d+"), cmd_annuler))
     app.add_handler(CallbackQueryHandler(button_handler))
@@ -518,14 +765,36 @@ def main():
 
     async def post_init(application):
         loop = asyncio.get_event_loop()
-        loop.create_task(background_transition_logger())
-        loop.create_task(background_rad_logger())
-        loop.create_task(background_bec_surveillance(application))
+        shelly_push.bind_loop(loop)
+        loop.create_task(health.heartbeat())
+        await httpserver.start(HTTP_PORT)
+        if SHELLY_PUSH == "mqtt" and shelly_push.aiomqtt is None:
+            log("Shelly push MQTT : paquet aiomqtt absent, mode désactivé")
+        elif SHELLY_PUSH == "mqtt":
+            health.supervise("shelly_mqtt", shelly_push.run_mqtt(), float("inf"))
+        health.supervise("transition_logger", background_transition_logger(), 12 * 3600)
+        health.supervise("rad_logger", background_rad_logger(), 3 * RAD_SAMPLE_S)
+        health.supervise("aggregates", background_aggregates(), 3 * AGG_SAVE_S)
+        if storage.ENABLED:
+            health.supervise("retention", background_retention(), 26 * 3600)
+        if BEC_USER:
+            health.supervise("bec_watch", background_bec_surveillance(application),
+                             3 * BEC_WATCH_MAX_S)
+        health.supervise("alerts", alerts.run(application.bot), 3 * ALERT_TICK_S)
+
+    async def post_shutdown(application):
+        ringbuffer.snapshot()
+        aggregates.save()
+        calibration.save()
 
     app.post_init = post_init
+    app.post_shutdown = post_shutdown
     log(f"DÉMARRAGE v{VERSION}")
-    app.run_polling(drop_pending_updates=True,
-                    allowed_updates=Update.ALL_TYPES)
+    if WEBHOOK_URL and WEBHOOK_SECRET:
+        asyncio.run(run_webhook(app))
+    else:
+        app.run_polling(drop_pending_updates=True,
+                        allowed_updates=Update.ALL_TYPES)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,116 @@
+"""overkiz_stub.py — Fausse passerelle Cozytouch locale (API développeur Overkiz).
+
+Sert les radiateurs de CONFORT_VALS en HTTP simple pour tester le transport
+local hors ligne :
+    python overkiz_stub.py [port] [latence_ms]
+    OVERKIZ_LOCAL_URL=http://127.0.0.1:8443 OVERKIZ_LOCAL_TOKEN=stub python main.py
+"""
+import json, sys, time, uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import CONFORT_VALS, OVERKIZ_LOCAL_TOKEN
+from overkiz_transport import LOCAL_API_PATH
+
+GATEWAY_ID = "0000-1111-2222"
+TOKEN      = OVERKIZ_LOCAL_TOKEN or "stub"
+DELAY      = 0.0
+
+HEATER_WIDGET = "AtlanticElectricalHeaterWithAdjustableTemperatureSetpoint"
+TOWEL_WIDGET  = "AtlanticElectricalTowelDryer"
+
+# États simulés par radiateur : deviceURL → {état: valeur}
+_states = {
+    f"io://{GATEWAY_ID}/{sid}": {
+        "core:TemperatureState": info["temp"] - 0.5,
+        "core:TargetTemperatureState": info["temp"],
+        "io:EffectiveTemperatureSetpointState": info["temp"],
+        "core:OperatingModeState": "internal",
+    }
+    for sid, info in CONFORT_VALS.items()
+}
+
+
+def _device(url: str, st: dict) -> dict:
+    sid    = url.split("/")[-1]
+    widget = TOWEL_WIDGET if "Serviette" in CONFORT_VALS[sid]["name"] else HEATER_WIDGET
+    states = [{"name": k, "type": 3 if isinstance(v, str) else 2, "value": v}
+              for k, v in st.items()]
+    return {
+        "deviceURL": url, "label": CONFORT_VALS[sid]["name"],
+        "controllableName": "io:AtlanticElectricalHeaterWithAdjustableTemperatureSetpointIOComponent",
+        "available": True, "enabled": True, "type": 1, "widget": widget,
+        "uiClass": "HeatingSystem", "placeOID": "stub", "oid": sid,
+        "definition": {"commands": [], "states": [], "widgetName": widget,
+                       "uiClass": "HeatingSystem", "type": "ACTUATOR",
+                       "qualifiedName": "io:StubHeater"},
+        "states": states, "attributes": [],
+    }
+
+
+def _apply(actions: list):
+    for a in actions:
+        st = _states.get(a.get("deviceURL"))
+        if st is None:
+            continue
+        for cmd in a.get("commands", []):
+            p = cmd.get("parameters") or [None]
+            if cmd["name"] == "setTargetTemperature":
+                st["core:TargetTemperatureState"] = p[0]
+                st["io:EffectiveTemperatureSetpointState"] = p[0]
+            elif cmd["name"] in ("setOperatingMode", "setTowelDryerOperatingMode"):
+                st["core:OperatingModeState"] = p[0]
+
+
+class Gateway(BaseHTTPRequestHandler):
+    def _reply(self, code: int, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers(); self.wfile.write(body)
+
+    def _route(self) -> str | None:
+        if self.headers.get("Authorization") != f"Bearer {TOKEN}":
+            self._reply(401, {"errorCode": "RESOURCE_ACCESS_DENIED",
+                              "error": "Not authenticated"})
+            return None
+        if DELAY:
+            time.sleep(DELAY)
+        return self.path.split("?")[0].removeprefix(LOCAL_API_PATH).strip("/")
+
+    def do_GET(self):
+        route = self._route()
+        if route is None:
+            return
+        if route == "apiVersion":
+            self._reply(200, {"protocolVersion": "2024.1.1"})
+        elif route == "setup/devices":
+            self._reply(200, [_device(u, st) for u, st in _states.items()])
+        elif route == "setup/gateways":
+            self._reply(200, [{"gatewayId": GATEWAY_ID, "alive": True,
+                               "connectivity": {"status": "OK",
+                                                "protocolVersion": "2024.1.1"}}])
+        else:
+            self._reply(404, {"error": route})
+
+    def do_POST(self):
+        route = self._route()
+        if route is None:
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if route == "exec/apply":
+            _apply(body.get("actions", []))
+            self._reply(200, {"execId": str(uuid.uuid4())})
+        elif route == "events/register":
+            self._reply(200, {"id": str(uuid.uuid4())})
+        else:
+            self._reply(404, {"error": route})
+
+    def log_message(self, fmt, *a):
+        print(f"[stub] {self.command} {self.path}", flush=True)
+
+
+if __name__ == "__main__":
+    port  = int(sys.argv[1]) if len(sys.argv) > 1 else 8443
+    DELAY = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.0
+    print(f"Passerelle simulée sur http://127.0.0.1:{port} (token {TOKEN})")
+    ThreadingHTTPServer(("127.0.0.1", port), Gateway).serve_forever()
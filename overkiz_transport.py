@@ -0,0 +1,112 @@
+"""overkiz_transport.py — Transport Overkiz : passerelle locale (mode développeur) ou cloud.
+
+Si OVERKIZ_LOCAL_URL/OVERKIZ_LOCAL_TOKEN sont définis et que la passerelle répond,
+les lectures/écritures passent par l'API locale (token Bearer), sinon par le cloud
+Cozytouch. La latence de chaque opération est mesurée par transport.
+"""
+import asyncio, contextvars, time, httpx
+from collections import deque
+from pyoverkiz.client import OverkizClient
+from pyoverkiz.models import OverkizServer
+from config import (OVERKIZ_EMAIL, OVERKIZ_PASSWORD, MY_SERVER,
+                    OVERKIZ_LOCAL_URL, OVERKIZ_LOCAL_TOKEN, log)
+import ratelimit, breaker
+
+LOCAL_API_PATH = "/enduser-mobile-web/1/enduserAPI/"
+PROBE_TTL      = 60     # secondes entre deux tests de joignabilité
+PROBE_TIMEOUT  = 1.5
+
+_probe   = {"ok": False, "at": 0.0}
+_local   = contextvars.ContextVar("overkiz_local", default=False)
+LATENCY  = {"local": deque(maxlen=200), "cloud": deque(maxlen=200)}
+
+
+def local_server() -> OverkizServer:
+    return OverkizServer(name="Cozytouch (local)",
+                         endpoint=OVERKIZ_LOCAL_URL + LOCAL_API_PATH,
+                         manufacturer="Atlantic", configuration_url=None)
+
+
+async def local_reachable() -> bool:
+    """Test (mis en cache PROBE_TTL s) de la passerelle locale."""
+    if not (OVERKIZ_LOCAL_URL and OVERKIZ_LOCAL_TOKEN):
+        return False
+    if time.monotonic() - _probe["at"] < PROBE_TTL:
+        return _probe["ok"]
+    try:
+        async with httpx.AsyncClient(verify=False, timeout=PROBE_TIMEOUT) as c:
+            r = await c.get(OVERKIZ_LOCAL_URL + LOCAL_API_PATH + "apiVersion",
+                            headers={"Authorization": f"Bearer {OVERKIZ_LOCAL_TOKEN}"})
+            ok = r.status_code == 200
+    except Exception:
+        ok = False
+    if ok != _probe["ok"]:
+        log(f"Overkiz local {'joignable' if ok else 'injoignable'} → transport "
+            f"{'local' if ok else 'cloud'}")
+    _probe.update(ok=ok, at=time.monotonic())
+    return ok
+
+
+def is_local() -> bool:
+    """True pendant une opération sur la passerelle locale (rejouable via le cloud)."""
+    return _local.get()
+
+
+def _mark_local_down():
+    _probe.update(ok=False, at=time.monotonic())
+
+
+async def _run_local(op):
+    # Pas de login en local : le token Bearer suffit (vérifié par la sonde)
+    token = _local.set(True)
+    try:
+        async with OverkizClient("", "", server=local_server(),
+                                 token=OVERKIZ_LOCAL_TOKEN, verify_ssl=False) as c:
+            return await op(c)
+    finally:
+        _local.reset(token)
+
+
+async def _run_cloud(op):
+    async with OverkizClient(OVERKIZ_EMAIL, OVERKIZ_PASSWORD, server=MY_SERVER) as c:
+        await c.login()
+        return await op(c)
+
+
+async def run(op, read: bool = False):
+    """Exécute op(client) sur le meilleur transport disponible.
+
+    Les commandes radiateurs (consigne + mode) sont idempotentes : une opération
+    interrompue par une erreur réseau locale est rejouée via le cloud. Le cloud
+    passe par le disjoncteur "overkiz" (délai adaptatif et rejeux si read).
+    """
+    if await local_reachable():
+        t0 = time.monotonic()
+        try:
+            res = await _run_local(op)
+            LATENCY["local"].append(time.monotonic() - t0)
+            return res
+        except (OSError, asyncio.TimeoutError) as e:
+            log(f"Overkiz local ERR: {e} — repli cloud")
+            _mark_local_down()
+    await ratelimit.acquire("overkiz")     # une opération = un login + ses requêtes
+    t0  = time.monotonic()
+    res = await breaker.call("overkiz", _run_cloud, op, read=read)
+    LATENCY["cloud"].append(time.monotonic() - t0)
+    return res
+
+
+def latency_stats() -> dict:
+    """{transport: (n, médiane_s, max_s)} sur les dernières opérations."""
+    out = {}
+    for name, d in LATENCY.items():
+        if d:
+            vals = sorted(d)
+            out[name] = (len(vals), vals[len(vals) // 2], vals[-1])
+    return out
+
+
+def latency_label() -> str:
+    parts = [f"{name} {med:.2f}s (n={n})"
+             for name, (n, med, _) in latency_stats().items()]
+    return "⚡ " + "  ".join(parts) if parts else ""
@@ -0,0 +1,161 @@
+"""partitions.py — Partitionnement mensuel de temp_logs (RANGE sur timestamp, PostgreSQL).
+
+  - migrate()            : conversion en ligne de l'ancienne table (copie par lots,
+                           bascule finale sous verrou EXCLUSIVE : lectures permises)
+  - ensure_partitions()  : crée les partitions des mois à venir (PARTITIONS_AHEAD)
+  - expired_partitions() : partitions entièrement antérieures à une date,
+                           supprimées par retention.py via DROP TABLE
+
+Partitions nommées temp_logs_yAAAAmMM + temp_logs_default (horodatages hors plage).
+"""
+import re
+from datetime import datetime
+from config import PARTITIONS_AHEAD, log
+import storage
+
+COLS      = "id, timestamp, room, temp_radiateur, temp_shelly, consigne, heure_creuse"
+COPY_STEP = 20000
+_NAME_RE  = re.compile(r"^temp_logs_y(\d{4})m(\d{2})$")
+
+
+def _month_add(dt: datetime, n: int) -> datetime:
+    y, m = divmod(dt.month - 1 + n, 12)
+    return datetime(dt.year + y, m + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"temp_logs_y{month.year}m{month.month:02d}"
+
+
+def is_partitioned(cur, table: str = "temp_logs") -> bool:
+    cur.execute("SELECT relkind FROM pg_class WHERE relname = %s "
+                "AND relnamespace = 'public'::regnamespace", (table,))
+    row = cur.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def _create_partitions(cur, parent: str, first: datetime, last: datetime):
+    m = datetime(first.year, first.month, 1)
+    while m <= last:
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {partition_name(m)} PARTITION OF {parent}"
+                    " FOR VALUES FROM (%s) TO (%s)", (m, _month_add(m, 1)))
+        m = _month_add(m, 1)
+    cur.execute(f"CREATE TABLE IF NOT EXISTS temp_logs_default PARTITION OF {parent} DEFAULT")
+
+
+def ensure_partitions():
+    """Partitions du mois courant + PARTITIONS_AHEAD mois (idempotent)."""
+    if not storage.IS_PG:
+        return
+    try:
+        conn = storage.connect()
+        cur  = conn.cursor()
+        if is_partitioned(cur):
+            now = datetime.now()
+            _create_partitions(cur, "temp_logs", now, _month_add(now, PARTITIONS_AHEAD))
+            conn.commit()
+        cur.close(); conn.close()
+    except Exception as e:
+        log(f"Partitions ERR: {e}")
+
+
+def list_partitions(cur) -> list[tuple[str, datetime, datetime]]:
+    """[(nom, début, fin)] des partitions mensuelles, par ordre chronologique."""
+    cur.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+                " WHERE i.inhparent = 'temp_logs'::regclass")
+    out = []
+    for (name,) in cur.fetchall():
+        m = _NAME_RE.match(name)
+        if m:
+            start = datetime(int(m.group(1)), int(m.group(2)), 1)
+            out.append((name, start, _month_add(start, 1)))
+    return sorted(out, key=lambda p: p[1])
+
+
+def expired_partitions(cur, cutoff: datetime) -> list[tuple[str, datetime, datetime]]:
+    return [p for p in list_partitions(cur) if p[2] <= cutoff]
+
+
+# ---------------------------------------------------------------------------
+# MIGRATION EN LIGNE
+# ---------------------------------------------------------------------------
+def _free_index_names(cur):
+    """L'ancienne table garde ses index (temp_logs_ts, …) : on les renomme pour
+    que init_retention_db puisse créer les homonymes sur la nouvelle."""
+    cur.execute("SELECT indexname FROM pg_indexes WHERE schemaname = 'public'"
+                " AND tablename = 'temp_logs_old'")
+    for (name,) in cur.fetchall():
+        if not name.startswith("temp_logs_") or name.startswith("temp_logs_old_"):
+            continue
+        cur.execute(f"ALTER INDEX {name} RENAME TO temp_logs_old_{name[len('temp_logs_'):]}")
+
+
+def migrate() -> bool:
+    """Convertit temp_logs en table partitionnée. Retourne True si la table
+    est partitionnée à la sortie. L'ancienne table est gardée (temp_logs_old)."""
+    from retention import VIEW_SQL
+    if not storage.IS_PG:
+        return False
+    try:
+        conn = storage.connect()
+    except Exception as e:
+        log(f"Partitions migration ERR: {e}"); return False
+    try:
+        cur = conn.cursor()
+        if is_partitioned(cur):
+            _free_index_names(cur)       # bases migrées avant ce renommage
+            cur.execute("CREATE INDEX IF NOT EXISTS temp_logs_ts ON temp_logs (timestamp)")
+            conn.commit()
+            return True
+        cur.execute("SELECT pg_get_serial_sequence('temp_logs', 'id'),"
+                    " MIN(timestamp), MAX(id) FROM temp_logs")
+        seq, first, hi = cur.fetchone()
+        first, hi = first or datetime.now(), hi or 0
+        log(f"Partitions : migration temp_logs ({hi} ids) démarrée")
+
+        cur.execute("DROP TABLE IF EXISTS temp_logs_part CASCADE")
+        cur.execute(f"""
+            CREATE TABLE temp_logs_part (
+                id INTEGER NOT NULL DEFAULT nextval('{seq}'),
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                room TEXT,
+                temp_radiateur FLOAT,
+                temp_shelly FLOAT,
+                consigne FLOAT,
+                heure_creuse BOOLEAN
+            ) PARTITION BY RANGE (timestamp);
+            CREATE INDEX temp_logs_part_room_ts ON temp_logs_part (room, timestamp);
+            CREATE INDEX temp_logs_part_ts ON temp_logs_part (timestamp);
+        """)
+        _create_partitions(cur, "temp_logs_part", first,
+                           _month_add(datetime.now(), PARTITIONS_AHEAD))
+        conn.commit()
+
+        # Copie par lots d'ids : les écritures continuent sur l'ancienne table
+        lo = 0
+        while lo < hi:
+            cur.execute(f"INSERT INTO temp_logs_part ({COLS}) SELECT {COLS} FROM temp_logs"
+                        " WHERE id > %s AND id <= %s", (lo, lo + COPY_STEP))
+            conn.commit()
+            lo += COPY_STEP
+
+        # Bascule : reliquat + renommages dans une transaction courte
+        cur.execute("LOCK TABLE temp_logs IN EXCLUSIVE MODE")
+        cur.execute(f"INSERT INTO temp_logs_part ({COLS}) SELECT {COLS} FROM temp_logs"
+                    " WHERE id > %s", (hi,))
+        cur.execute("DROP VIEW IF EXISTS temp_history")
+        cur.execute("ALTER TABLE temp_logs RENAME TO temp_logs_old")
+        cur.execute("ALTER TABLE temp_logs_part RENAME TO temp_logs")
+        _free_index_names(cur)
+        cur.execute("ALTER INDEX temp_logs_part_ts RENAME TO temp_logs_ts")
+        cur.execute(f"ALTER SEQUENCE {seq} OWNED BY temp_logs.id")
+        cur.execute(VIEW_SQL)
+        conn.commit()
+        log("Partitions : temp_logs partitionnée ✅ (ancienne table : temp_logs_old)")
+        return True
+    except Exception as e:
+        conn.rollback()
+        log(f"Partitions migration ERR: {e}")
+        return False
+    finally:
+        conn.close()
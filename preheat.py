@@ -0,0 +1,114 @@
+"""preheat.py — Planification de la relance des radiateurs (« chaud à 18h00 »).
+
+Pour chaque pièce, le modèle RC de thermal.py donne l'évolution de la
+température : refroidissement libre (plancher = consigne éco) jusqu'au départ,
+puis montée vers T∞ = T_ext + b·τ une fois le radiateur en confort. Tous les
+départs candidats (pas STEP) de toutes les pièces sont évalués d'un bloc en
+NumPy ; on retient le plus tardif qui atteint la consigne à l'heure, ou un
+départ en heures creuses s'il en existe un au plus PREHEAT_HC_ADVANCE minutes
+plus tôt.
+"""
+import time
+import numpy as np
+from datetime import datetime, timedelta
+from config import CONFORT_VALS, PREHEAT_DEFAULT_RATE, PREHEAT_HC_ADVANCE, log
+from archive import to_epoch
+import thermal, ringbuffer, tariff
+
+STEP      = 300                    # pas des départs candidats (s)
+FIT_TTL   = 6 * 3600               # rafraîchissement des modèles (s)
+DEF_TAU_H = 12.0                   # modèle par défaut si l'ajustement échoue
+
+_fits: dict[str, tuple[float, dict | None]] = {}   # pièce → (monotonic, fit)
+
+
+def room_model(room: str) -> dict:
+    """(tau_h, rate, t_ext) appris sur 30 jours, ou valeurs par défaut."""
+    ts, f = _fits.get(room, (0.0, None))
+    if time.monotonic() - ts > FIT_TTL:
+        try:
+            f = thermal.fit_room(room)
+        except Exception as e:
+            log(f"Préchauffe modèle {room} ERR: {e}"); f = None
+        _fits[room] = (time.monotonic(), f)
+    if f and f["tau_h"] and f["power"] and f["power"] > 0:
+        return {"tau_h": f["tau_h"], "rate": f["power"], "t_ext": f["t_ext"], "fitted": True}
+    return {"tau_h": DEF_TAU_H, "rate": PREHEAT_DEFAULT_RATE, "t_ext": None, "fitted": False}
+
+
+def plan_arrays(t_now, target, eco, tau_h, rate, t_ext, horizon_s: int,
+                step: int = STEP):
+    """Offsets de départ (s depuis maintenant) pour R pièces, arrays (R,).
+
+    Retourne (latest, candidates, feasible) : latest = -1 si même un départ
+    immédiat n'atteint pas la consigne (chauffer tout de suite).
+    """
+    t_now, target, eco = map(np.asarray, (t_now, target, eco))
+    tau_s  = np.asarray(tau_h) * 3600
+    t_ext  = np.where(np.isnan(t_ext), eco, t_ext)
+    t_inf  = t_ext + np.asarray(rate) * np.asarray(tau_h)
+    starts = np.arange(0, horizon_s + 1, step)[None, :]            # (1, K)
+    # Refroidissement libre jusqu'au départ, plancher éco
+    t0 = np.maximum(eco[:, None], t_ext[:, None] + (t_now - t_ext)[:, None]
+                    * np.exp(-starts / tau_s[:, None]))
+    # Durée de montée t0 → target (inf si T∞ ne dépasse pas la consigne)
+    ti, tg = t_inf[:, None], target[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        need = tau_s[:, None] * np.log((ti - t0) / (ti - tg))
+    need = np.where(ti > tg, need, np.inf)
+    need = np.where(t0 >= tg, 0.0, need)
+    feasible = starts + need <= horizon_s
+    k = np.where(feasible.any(axis=1),
+                 feasible.shape[1] - 1 - np.argmax(feasible[:, ::-1], axis=1), -1)
+    latest = np.where(k >= 0, starts[0, np.clip(k, 0, None)], -1)
+    return latest, starts[0], feasible
+
+
+def plan(deadline: datetime, rooms: list[str] | None = None,
+         now: datetime | None = None) -> list[dict]:
+    """Départ conseillé par pièce pour être en confort à `deadline`."""
+    now   = now or datetime.now()
+    infos = [v for v in CONFORT_VALS.values() if not rooms or v["name"] in rooms]
+    if not infos or deadline <= now:
+        return []
+    models = [room_model(v["name"]) for v in infos]
+    t_now  = []
+    for v in infos:
+        t = (ringbuffer.latest(v["name"], "temp_shelly", 3600)
+             or ringbuffer.latest(v["name"], "temp_radiateur", 3600))
+        t_now.append(v["eco"] if t is None else t)
+    horizon = int((deadline - now).total_seconds())
+    latest, starts, feasible = plan_arrays(
+        np.array(t_now), np.array([v["temp"] for v in infos]),
+        np.array([v["eco"] for v in infos]),
+        np.array([m["tau_h"] for m in models]), np.array([m["rate"] for m in models]),
+        np.array([np.nan if m["t_ext"] is None else m["t_ext"] for m in models]),
+        horizon)
+
+    # Préférence HC : départ faisable en heures creuses, pas trop en avance
+    hc = tariff.hc_mask(to_epoch(now) + starts)
+    out = []
+    for i, v in enumerate(infos):
+        off, in_hc = int(latest[i]), False
+        if off > 0 and not hc[starts == off][0]:
+            ok = feasible[i] & hc & (starts >= off - PREHEAT_HC_ADVANCE * 60)
+            if ok.any():
+                off, in_hc = int(starts[ok].max()), True
+        elif off >= 0:
+            in_hc = bool(hc[starts == off][0])
+        start = now + timedelta(seconds=max(off, 0))
+        out.append({"room": v["name"], "start": start.replace(second=0, microsecond=0),
+                    "late": off < 0, "hc": in_hc, "t_now": t_now[i],
+                    "target": v["temp"], **models[i]})
+    return out
+
+
+def format_plan(deadline: datetime, items: list[dict]) -> str:
+    lines = [f"🔥 <b>PRÉCHAUFFE</b> — confort à {deadline:%d/%m %Hh%M}", ""]
+    for it in items:
+        src  = f"{it['rate']:.1f}°/h" + ("" if it["fitted"] else " (défaut)")
+        when = "maintenant ⚠️ en retard" if it["late"] else f"{it['start']:%Hh%M}"
+        hc   = " 🟢HC" if it["hc"] else ""
+        lines.append(f"<b>{it['room']}</b> : départ {when}{hc}\n"
+                     f"<code>  {it['t_now']:.1f}°→{it['target']:.1f}°  {src}</code>")
+    return "\n".join(lines)
@@ -0,0 +1,190 @@
+"""ratelimit.py — Budget de requêtes partagé par API amont (Overkiz, Magellan, Shelly).
+
+Un seau à jetons par API (RATE_LIMITS : {api: [jetons/s, rafale]}) et une
+file de priorité : les demandes interactives (boutons, commandes) passent
+avant les tâches de fond. Une tâche de fond ne prend un jeton que s'il en
+reste au-delà de la réserve RATE_BG_RESERVE (fraction de la rafale) : sous
+pression, elle attend et laisse la place aux utilisateurs.
+
+La priorité suit le contexte asyncio : une boucle de fond appelle
+background() au démarrage, ses sous-tâches héritent du contexte. Une
+opération partagée (singleflight) tourne dans le contexte de shared() :
+escalate() la passe en interactive, demandes déjà en file comprises, quand
+un appelant interactif la rejoint.
+
+metered() mesure le temps passé en file d'attente par une opération (et ses
+sous-tâches) : breaker.py l'exclut de ses délais et de ses latences.
+
+Usage : await acquire("overkiz"), ou hooks("magellan") en event_hooks d'un
+httpx.AsyncClient (un jeton par requête HTTP).
+"""
+import asyncio, contextvars, heapq, itertools, time
+from config import RATE_LIMITS, RATE_BG_RESERVE
+
+INTERACTIVE, BACKGROUND = 0, 1
+PRIORITIES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+priority = contextvars.ContextVar("priority", default=INTERACTIVE)
+_shared  = contextvars.ContextVar("shared_priority", default=None)   # [priorité] mutable
+_meter   = contextvars.ContextVar("ratelimit_meter", default=None)
+_seq = itertools.count()
+
+
+def background():
+    """Marque la tâche courante (et ses sous-tâches) comme tâche de fond."""
+    priority.set(BACKGROUND)
+
+
+def current() -> int:
+    cell = _shared.get()
+    return min(priority.get(), cell[0]) if cell else priority.get()
+
+
+def shared() -> tuple[contextvars.Context, list]:
+    """Contexte (copie du courant) d'une opération partagée et sa priorité
+    mutable, commune à ses sous-tâches."""
+    cell = [current()]
+    ctx  = contextvars.copy_context()
+    ctx.run(_shared.set, cell)
+    return ctx, cell
+
+
+class Meter:
+    """Temps cumulé passé à attendre des jetons (attentes en cours comprises)."""
+    def __init__(self):
+        self.waited, self.since, self.n = 0.0, 0.0, 0
+
+    def enter(self):
+        if not self.n:
+            self.since = time.monotonic()
+        self.n += 1
+
+    def leave(self):
+        self.n -= 1
+        if not self.n:
+            self.waited += time.monotonic() - self.since
+
+    def total(self) -> float:
+        return self.waited + (time.monotonic() - self.since if self.n else 0.0)
+
+
+def metered() -> tuple[contextvars.Context, Meter]:
+    """Contexte (copie du courant) dont les attentes de jetons sont mesurées."""
+    meter = Meter()
+    ctx   = contextvars.copy_context()
+    ctx.run(_meter.set, meter)
+    return ctx, meter
+
+
+def escalate(cell: list):
+    """Passe une opération partagée en priorité interactive."""
+    if cell[0] != INTERACTIVE:
+        cell[0] = INTERACTIVE
+        for b in BUCKETS.values():
+            b.escalate(cell)
+
+
+class Bucket:
+    def __init__(self, name: str, rate: float, burst: float):
+        self.name, self.rate, self.burst = name, rate, burst
+        self.tokens  = burst
+        self.at      = time.monotonic()
+        self.waiters = []                  # tas (priorité, ordre, future, cellule partagée)
+        self.timer   = None
+        self.granted = {p: 0 for p in PRIORITIES}
+        self.wait_s  = {p: 0.0 for p in PRIORITIES}
+        self.wait_max = {p: 0.0 for p in PRIORITIES}
+
+    def _need(self, prio: int) -> float:
+        return 1 + (RATE_BG_RESERVE * (self.burst - 1) if prio == BACKGROUND else 0)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.at) * self.rate)
+        self.at = now
+
+    def depth(self, prio: int) -> int:
+        return sum(1 for p, _, f, _ in self.waiters if p == prio and not f.done())
+
+    def _dispatch(self):
+        self.timer = None
+        self._refill()
+        while self.waiters:
+            prio, _, fut, _ = self.waiters[0]
+            if fut.done():                 # appelant annulé
+                heapq.heappop(self.waiters); continue
+            need = self._need(prio)
+            if self.tokens < need:
+                self.timer = asyncio.get_running_loop().call_later(
+                    (need - self.tokens) / self.rate, self._dispatch)
+                return
+            heapq.heappop(self.waiters)
+            self.tokens -= 1
+            fut.set_result(prio)
+
+    def _redispatch(self):
+        if self.timer:                     # la tête de file a pu changer
+            self.timer.cancel()
+        self._dispatch()
+
+    def escalate(self, cell: list):
+        """Remonte en interactive les demandes en file de l'opération `cell`."""
+        hit = False
+        for i, (p, seq, fut, c) in enumerate(self.waiters):
+            if c is cell and p != INTERACTIVE:
+                self.waiters[i] = (INTERACTIVE, seq, fut, c); hit = True
+        if hit:
+            heapq.heapify(self.waiters)
+            self._redispatch()
+
+    async def acquire(self, prio: int, cell: list | None = None):
+        t0 = time.monotonic()
+        self._refill()
+        if not self.waiters and self.tokens >= self._need(prio):
+            self.tokens -= 1
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            heapq.heappush(self.waiters, (prio, next(_seq), fut, cell))
+            self._redispatch()
+            prio = await fut
+        wait = time.monotonic() - t0
+        self.granted[prio] += 1
+        self.wait_s[prio]  += wait
+        self.wait_max[prio] = max(self.wait_max[prio], wait)
+
+
+BUCKETS = {name: Bucket(name, rate, burst) for name, (rate, burst) in RATE_LIMITS.items()}
+
+
+async def acquire(api: str):
+    """Attend un jeton de l'API (priorité du contexte courant)."""
+    b = BUCKETS.get(api)
+    if not b:
+        return
+    meter = _meter.get()
+    if meter:
+        meter.enter()
+    try:
+        await b.acquire(current(), _shared.get())
+    finally:
+        if meter:
+            meter.leave()
+
+
+def hooks(api: str) -> dict:
+    async def on_request(request):
+        await acquire(api)
+    return {"request": [on_request]}
+
+
+def metrics() -> list[tuple[str, dict, float]]:
+    """(nom, labels, valeur) : profondeur des files, jetons, attentes."""
+    out = []
+    for name, b in BUCKETS.items():
+        out.append(("ratelimit_tokens", {"api": name}, b.tokens))
+        for p, label in PRIORITIES.items():
+            lbl = {"api": name, "priority": label}
+            out += [("ratelimit_queue_depth", lbl, b.depth(p)),
+                    ("ratelimit_granted_total", lbl, b.granted[p]),
+                    ("ratelimit_wait_seconds_total", lbl, b.wait_s[p]),
+                    ("ratelimit_wait_seconds_max", lbl, b.wait_max[p])]
+    return out
@@ -0,0 +1,211 @@
+"""retention.py — Rétention et sous-échantillonnage de l'historique temp_logs.
+
+  brut (temp_logs)            conservé RAW_RETENTION_DAYS jours
+  → horaire (temp_logs_hourly) conservé HOURLY_RETENTION_DAYS jours
+  → journalier (temp_logs_daily) conservé indéfiniment
+
+Le brut n'est agrégé/supprimé qu'une fois archivé (archive.py) : la limite
+est bornée au début du dernier mois exporté.
+
+Chaque lot traite une journée dans sa propre transaction (INSERT agrégé +
+DELETE du niveau inférieur) : jamais de doublon, verrous courts.
+Si temp_logs est partitionnée (partitions.py), le brut est agrégé journée par
+journée depuis chaque partition expirée (avancement dans retention_state) puis
+la partition entière est supprimée par DROP TABLE, sans DELETE ; les lignes
+de temp_logs_default (hors partitions mensuelles) passent par le chemin
+classique agrégat + DELETE.
+La vue temp_history unifie les trois niveaux pour les statistiques
+(moyennes pondérées par les compteurs *_n).
+"""
+from datetime import datetime, timedelta
+from config import RAW_RETENTION_DAYS, HOURLY_RETENTION_DAYS, log
+import archive, partitions, storage
+
+_AGG_COLS = """
+    n INTEGER NOT NULL,
+    rad_avg FLOAT, rad_min FLOAT, rad_max FLOAT, rad_n INTEGER,
+    shelly_avg FLOAT, shelly_min FLOAT, shelly_max FLOAT, shelly_n INTEGER,
+    delta_avg FLOAT, delta_n INTEGER,
+    consigne_avg FLOAT
+"""
+
+# Vue unifiée brut + agrégats (recréée après la migration de partitions.py)
+VIEW_SQL = """
+    CREATE VIEW temp_history AS
+      SELECT timestamp, room, heure_creuse, 'raw' AS grain,
+             temp_radiateur AS rad, temp_shelly AS shelly, consigne,
+             1 AS n,
+             CAST(temp_radiateur IS NOT NULL AS INTEGER) AS rad_n,
+             CAST(temp_shelly IS NOT NULL AS INTEGER) AS shelly_n,
+             temp_shelly - temp_radiateur AS delta,
+             CAST(temp_shelly - temp_radiateur IS NOT NULL AS INTEGER) AS delta_n
+      FROM temp_logs
+      UNION ALL
+      SELECT bucket, room, heure_creuse, 'hour', rad_avg, shelly_avg,
+             consigne_avg, n, rad_n, shelly_n, delta_avg, delta_n
+      FROM temp_logs_hourly
+      UNION ALL
+      SELECT bucket, room, heure_creuse, 'day', rad_avg, shelly_avg,
+             consigne_avg, n, rad_n, shelly_n, delta_avg, delta_n
+      FROM temp_logs_daily
+"""
+
+
+def init_retention_db():
+    if not storage.ENABLED:
+        return
+    try:
+        conn = storage.connect()
+        cur  = conn.cursor()
+        cur.execute("CREATE INDEX IF NOT EXISTS temp_logs_ts ON temp_logs (timestamp)")
+        for table in ("temp_logs_hourly", "temp_logs_daily"):
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    bucket TIMESTAMP NOT NULL,
+                    room TEXT NOT NULL,
+                    heure_creuse BOOLEAN,
+                    {_AGG_COLS}
+                );
+                CREATE INDEX IF NOT EXISTS {table}_room_bucket ON {table} (room, bucket);
+            """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS retention_state (
+                level TEXT PRIMARY KEY,
+                done_until TIMESTAMP NOT NULL
+            );
+        """)
+        cur.execute("DROP VIEW IF EXISTS temp_history")
+        cur.execute(VIEW_SQL)
+        conn.commit(); cur.close(); conn.close()
+    except Exception as e:
+        log(f"Retention DB init ERR: {e}")
+
+
+# ---------------------------------------------------------------------------
+# LOTS
+# ---------------------------------------------------------------------------
+_RAW_TO_HOURLY = """
+    INSERT INTO temp_logs_hourly
+    SELECT {bucket}, room, heure_creuse, COUNT(*),
+           AVG(temp_radiateur), MIN(temp_radiateur), MAX(temp_radiateur), COUNT(temp_radiateur),
+           AVG(temp_shelly), MIN(temp_shelly), MAX(temp_shelly), COUNT(temp_shelly),
+           AVG(temp_shelly - temp_radiateur), COUNT(temp_shelly - temp_radiateur),
+           AVG(consigne)
+    FROM {source} WHERE timestamp >= %s AND timestamp < %s AND room IS NOT NULL
+    GROUP BY 1, 2, 3
+"""
+
+_HOURLY_TO_DAILY = """
+    INSERT INTO temp_logs_daily
+    SELECT {bucket}, room, heure_creuse, SUM(n),
+           SUM(rad_avg * rad_n) / NULLIF(SUM(rad_n), 0), MIN(rad_min), MAX(rad_max), SUM(rad_n),
+           SUM(shelly_avg * shelly_n) / NULLIF(SUM(shelly_n), 0), MIN(shelly_min),
+           MAX(shelly_max), SUM(shelly_n),
+           SUM(delta_avg * delta_n) / NULLIF(SUM(delta_n), 0), SUM(delta_n),
+           AVG(consigne_avg)
+    FROM temp_logs_hourly WHERE bucket >= %s AND bucket < %s
+    GROUP BY 1, 2, 3
+"""
+
+LEVELS = [
+    # (source, colonne temps, requête d'agrégation, rétention jours)
+    ("temp_logs",        "timestamp",
+     _RAW_TO_HOURLY.replace("{bucket}", storage.trunc_hour("timestamp")), RAW_RETENTION_DAYS),
+    ("temp_logs_hourly", "bucket",
+     _HOURLY_TO_DAILY.replace("{bucket}", storage.trunc_day("bucket")), HOURLY_RETENTION_DAYS),
+]
+
+
+def _oldest_day(cur, table: str, col: str) -> datetime | None:
+    cur.execute(f"SELECT MIN({col}) FROM {table}")
+    row = cur.fetchone()
+    if not row or row[0] is None:
+        return None
+    return storage.as_datetime(row[0]).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _raw_partition_batch(cur, cutoff: datetime) -> str | None:
+    expired = partitions.expired_partitions(cur, cutoff)
+    if not expired:
+        return None
+    name, start, end = expired[0]
+    cur.execute("SELECT done_until FROM retention_state WHERE level = 'raw'")
+    row = cur.fetchone()
+    day = max(row[0], start) if row else start
+    if day >= end:
+        cur.execute(f"DROP TABLE {name}")
+        return f"{name} supprimée"
+    nxt = day + timedelta(days=1)
+    cur.execute(LEVELS[0][2].format(source=name), (day, nxt))
+    cur.execute("INSERT INTO retention_state (level, done_until) VALUES ('raw', %s)"
+                " ON CONFLICT (level) DO UPDATE SET done_until = EXCLUDED.done_until", (nxt,))
+    return f"{name} {day:%Y-%m-%d} agrégée"
+
+
+def _raw_default_batch(cur, cutoff: datetime) -> str | None:
+    """Lignes hors des partitions mensuelles (temp_logs_default : horodatages
+    anciens ou aberrants) : agrégées puis supprimées jour par jour."""
+    day = _oldest_day(cur, "temp_logs_default", "timestamp")
+    if day is None or day >= cutoff:
+        return None
+    nxt = day + timedelta(days=1)
+    cur.execute(LEVELS[0][2].format(source="temp_logs_default"), (day, nxt))
+    cur.execute("DELETE FROM temp_logs_default WHERE timestamp >= %s AND timestamp < %s",
+                (day, nxt))
+    return f"temp_logs_default {day:%Y-%m-%d} ({cur.rowcount} lignes)"
+
+
+def run_batch() -> str | None:
+    """Traite le plus ancien lot expiré (tous niveaux confondus).
+    Retourne une description du lot, None si rien à faire."""
+    if not storage.ENABLED:
+        return None
+    conn = storage.connect()
+    try:
+        cur   = conn.cursor()
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        for table, col, agg_sql, days in LEVELS:
+            cutoff = today - timedelta(days=days)
+            if table == "temp_logs":
+                archived = archive.archived_until("temp_logs")
+                if archived is None:
+                    continue            # jamais archivé : on ne purge pas le brut
+                cutoff = min(cutoff, archived)
+            if table == "temp_logs" and storage.IS_PG and partitions.is_partitioned(cur):
+                res = _raw_partition_batch(cur, cutoff) or _raw_default_batch(cur, cutoff)
+                if res:
+                    conn.commit()
+                    return res
+                continue
+            day = _oldest_day(cur, table, col)
+            if day is None or day >= cutoff:
+                continue
+            nxt = day + timedelta(days=1)
+            cur.execute(agg_sql.format(source=table), (day, nxt))
+            cur.execute(f"DELETE FROM {table} WHERE {col} >= %s AND {col} < %s", (day, nxt))
+            n = cur.rowcount
+            conn.commit()
+            return f"{table} {day:%Y-%m-%d} ({n} lignes)"
+        return None
+    finally:
+        conn.close()
+
+
+def run_all(max_batches: int = 1000) -> int:
+    """Enchaîne les lots (usage manuel / CLI). Retourne le nb de lots."""
+    done = 0
+    while done < max_batches:
+        try:
+            res = run_batch()
+        except Exception as e:
+            log(f"Retention ERR: {e}"); break
+        if res is None:
+            break
+        log(f"Retention : {res}")
+        done += 1
+    return done
+
+
+if __name__ == "__main__":
+    init_retention_db()
+    print(f"{run_all()} lot(s) traité(s)")
@@ -0,0 +1,155 @@
+"""ringbuffer.py — Derniers relevés en mémoire, par pièce et par mesure.
+
+Tampon circulaire à capacité fixe (array('q') horodatages epoch + array('f')
+valeurs) rempli par le pipeline samples : lectures sans I/O pour la vue LIST,
+la courbe 24h du salon et les règles d'alerte. Sauvegardé sur disque à l'arrêt
+et rechargé au démarrage.
+"""
+import json, os
+from array import array
+from datetime import datetime
+from config import RING_DAYS, RING_SNAPSHOT, log
+from archive import to_epoch
+import samples
+
+METRICS  = ("temp_radiateur", "temp_shelly", "consigne")
+CAPACITY = RING_DAYS * 24 * 60          # jusqu'à un relevé par minute
+SPARK    = "▁▂▃▄▅▆▇█"
+
+
+class RingBuffer:
+    __slots__ = ("ts", "vals", "pos", "count")
+
+    def __init__(self, capacity: int = CAPACITY):
+        self.ts    = array("q", bytes(8 * capacity))
+        self.vals  = array("f", bytes(4 * capacity))
+        self.pos   = 0      # prochain emplacement écrit
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, ts: int, v: float):
+        self.ts[self.pos], self.vals[self.pos] = ts, v
+        self.pos   = (self.pos + 1) % len(self.ts)
+        self.count = min(self.count + 1, len(self.ts))
+
+    def last(self) -> tuple[int, float] | None:
+        if not self.count:
+            return None
+        i = self.pos - 1
+        return self.ts[i], self.vals[i]
+
+    def items(self, since: int = 0):
+        """(ts, valeur) chronologiques, depuis `since` inclus."""
+        cap = len(self.ts)
+        for k in range(self.count):
+            i = (self.pos - self.count + k) % cap
+            if self.ts[i] >= since:
+                yield self.ts[i], self.vals[i]
+
+
+BUFFERS: dict[tuple[str, str], RingBuffer] = {}
+
+
+def buffer(room: str, metric: str) -> RingBuffer:
+    key = (room, metric)
+    if key not in BUFFERS:
+        BUFFERS[key] = RingBuffer()
+    return BUFFERS[key]
+
+
+@samples.subscribe
+def on_sample(s: dict):
+    ts = to_epoch(s["ts"])
+    for metric in METRICS:
+        if s[metric] is not None:
+            buffer(s["room"], metric).append(ts, s[metric])
+
+
+# ---------------------------------------------------------------------------
+# LECTURES
+# ---------------------------------------------------------------------------
+def latest(room: str, metric: str, max_age: int | None = None) -> float | None:
+    rb = BUFFERS.get((room, metric))
+    last = rb.last() if rb else None
+    if last is None:
+        return None
+    if max_age is not None and to_epoch(datetime.now()) - last[0] > max_age:
+        return None
+    return round(last[1], 2)
+
+
+def current(rooms: list[str], shelly_room: str, max_age: int):
+    """(data, shelly_t) au format de get_current_data si toutes les pièces ont
+    un relevé radiateur de moins de max_age secondes, sinon None."""
+    data = {}
+    for room in rooms:
+        t = latest(room, "temp_radiateur", max_age)
+        if t is None:
+            return None
+        data[room] = {"temp": t, "target": latest(room, "consigne", max_age)}
+    return data, latest(shelly_room, "temp_shelly", max_age)
+
+
+def hourly_means(room: str, metric: str, hours: int = 24) -> list[float | None]:
+    """Moyenne par heure glissante sur les `hours` dernières heures."""
+    now  = to_epoch(datetime.now())
+    sums = [0.0] * hours; ns = [0] * hours
+    rb   = BUFFERS.get((room, metric))
+    if rb:
+        for ts, v in rb.items(now - hours * 3600):
+            k = min(hours - 1, (ts - (now - hours * 3600)) // 3600)
+            sums[k] += v; ns[k] += 1
+    return [s / n if n else None for s, n in zip(sums, ns)]
+
+
+def sparkline(room: str, metric: str, hours: int = 24) -> str:
+    means = hourly_means(room, metric, hours)
+    vals  = [m for m in means if m is not None]
+    if not vals:
+        return ""
+    lo, hi = min(vals), max(vals)
+    span   = (hi - lo) or 1.0
+    line   = "".join(" " if m is None else SPARK[int((m - lo) / span * (len(SPARK) - 1))]
+                     for m in means)
+    return f"{line}  {lo:.1f}°→{hi:.1f}°"
+
+
+# ---------------------------------------------------------------------------
+# SAUVEGARDE
+# ---------------------------------------------------------------------------
+def snapshot(path: str = RING_SNAPSHOT):
+    """Écrit un index JSON (1re ligne) puis les tableaux bruts, ordre chronologique."""
+    try:
+        index, blobs = [], []
+        for (room, metric), rb in BUFFERS.items():
+            items = list(rb.items())
+            index.append([room, metric, len(items)])
+            blobs.append((array("q", (t for t, _ in items)), array("f", (v for _, v in items))))
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(json.dumps(index).encode() + b"\n")
+            for ts, vals in blobs:
+                ts.tofile(f); vals.tofile(f)
+        os.replace(tmp, path)
+        log(f"Ring buffer sauvegardé ({sum(n for *_, n in index)} points)")
+    except Exception as e:
+        log(f"Ring buffer snapshot ERR: {e}")
+
+
+def restore(path: str = RING_SNAPSHOT):
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, "rb") as f:
+            index = json.loads(f.readline())
+            for room, metric, n in index:
+                ts, vals = array("q"), array("f")
+                ts.fromfile(f, n); vals.fromfile(f, n)
+                rb = buffer(room, metric)
+                for t, v in zip(ts, vals):
+                    rb.append(t, v)
+        log(f"Ring buffer restauré ({sum(n for *_, n in index)} points)")
+    except Exception as e:
+        log(f"Ring buffer restore ERR: {e}")
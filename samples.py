@@ -0,0 +1,67 @@
+"""samples.py — Pipeline commun des relevés de température.
+
+Tous les relevés (horaire Overkiz + Shelly, push Shelly local…) passent par
+publish() : écriture dans temp_logs (filtrée par le deadband) puis diffusion
+de tous les relevés aux abonnés en mémoire.
+"""
+from datetime import datetime
+from config import log
+import storage
+from deadband import Deadband
+
+# Abonnés appelés pour chaque relevé : fn(sample: dict)
+_subscribers = []
+_deadband    = Deadband()
+write_failures = 0   # écritures temp_logs échouées d'affilée (alerts.py)
+
+
+def subscribe(fn):
+    """Enregistre un abonné (utilisable en décorateur)."""
+    _subscribers.append(fn)
+    return fn
+
+
+def make_sample(room: str, temp_radiateur: float | None = None,
+                temp_shelly: float | None = None, consigne: float | None = None,
+                heure_creuse: bool | None = None, ts: datetime | None = None) -> dict:
+    return {"ts": ts or datetime.now(), "room": room,
+            "temp_radiateur": temp_radiateur, "temp_shelly": temp_shelly,
+            "consigne": consigne, "heure_creuse": heure_creuse}
+
+
+def _insert(samples: list[dict]) -> bool:
+    global write_failures
+    if not storage.ENABLED or not samples:
+        return True
+    try:
+        conn = storage.connect()
+        cur  = conn.cursor()
+        for s in samples:
+            cur.execute(
+                "INSERT INTO temp_logs (timestamp, room, temp_radiateur, temp_shelly,"
+                " consigne, heure_creuse) VALUES (%s,%s,%s,%s,%s,%s)",
+                (s["ts"], s["room"], s["temp_radiateur"], s["temp_shelly"],
+                 s["consigne"], s["heure_creuse"])
+            )
+        conn.commit(); cur.close(); conn.close()
+        write_failures = 0
+        return True
+    except Exception as e:
+        write_failures += 1
+        log(f"Samples insert ERR: {e}")
+        return False
+
+
+def publish(samples: list[dict], store: bool = True):
+    """Enregistre les relevés (si store) puis notifie les abonnés."""
+    if store:
+        kept = [s for s in samples if _deadband.keep(s)]
+        if _insert(kept):                 # échec : la base garde l'ancien point
+            for s in kept:
+                _deadband.stored(s)
+    for s in samples:
+        for fn in _subscribers:
+            try:
+                fn(s)
+            except Exception as e:
+                log(f"Samples abonné {getattr(fn, '__name__', fn)} ERR: {e}")
@@ -1,19 +1,19 @@
 """scheduler.py — Gestion des programmations BEC et radiateurs avec persistance DB."""
-import psycopg2
 from datetime import datetime
-from config import DB_URL, log
+from config import log
+import storage
 
 
 def init_scheduler_db():
-    if not DB_URL:
+    if not storage.ENABLED:
         return
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = storage.connect()
         cur  = conn.cursor()
-        cur.execute("""
+        cur.execute(f"""
             CREATE TABLE IF NOT EXISTS scheduled_actions (
-                id SERIAL PRIMARY KEY,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                id {storage.ID_PK},
+                created_at TIMESTAMP DEFAULT {storage.TS_DEFAULT},
                 target_dt  TIMESTAMP NOT NULL,
                 action     TEXT NOT NULL,   -- 'BEC_HOME', 'BEC_ABSENCE', 'RADS_HOME', 'RADS_ABSENCE'
                 label      TEXT,            -- description libre ex: 'Retour jeudi soir'
@@ -29,10 +29,10 @@ def init_scheduler_db():
 
 def save_scheduled(target_dt: datetime, action: str, label: str, chat_id: int) -> int | None:
     """Sauvegarde une programmation et retourne son ID."""
-    if not DB_URL:
+    if not storage.ENABLED:
         return None
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = storage.connect()
         cur  = conn.cursor()
         cur.execute(
             "INSERT INTO scheduled_actions (target_dt, action, label, chat_id)"
@@ -47,13 +47,13 @@ def save_scheduled(target_dt: datetime, action: str, label: str, chat_id: int) -
 
 
 def mark_done(sched_id: int):
-    if not DB_URL:
+    if not storage.ENABLED:
         return
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = storage.connect()
         cur  = conn.cursor()
         cur.execute(
-            "UPDATE scheduled_actions SET done=TRUE, done_at=NOW() WHERE id=%s",
+            f"UPDATE scheduled_actions SET done=TRUE, done_at={storage.NOW} WHERE id=%s",
             (sched_id,)
         )
         conn.commit(); cur.close(); conn.close()
@@ -63,10 +63,10 @@ def mark_done(sched_id: int):
 
 def cancel_scheduled(sched_id: int, chat_id: int) -> bool:
     """Annule une programmation si elle appartient au bon chat."""
-    if not DB_URL:
+    if not storage.ENABLED:
         return False
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = storage.connect()
         cur  = conn.cursor()
         cur.execute(
             "DELETE FROM scheduled_actions WHERE id=%s AND chat_id=%s AND done=FALSE",
@@ -81,14 +81,14 @@ def cancel_scheduled(sched_id: int, chat_id: int) -> bool:
 
 def get_pending(chat_id: int | None = None) -> list[dict]:
     """Retourne les programmations en attente (non exécutées, futures)."""
-    if not DB_URL:
+    if not storage.ENABLED:
         return []
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = storage.connect()
         cur  = conn.cursor()
-        q = """SELECT id, target_dt, action, label, chat_id
+        q = f"""SELECT id, target_dt, action, label, chat_id
                FROM scheduled_actions
-               WHERE done=FALSE AND target_dt > NOW()"""
+               WHERE done=FALSE AND target_dt > {storage.NOW}"""
         params = []
         if chat_id:
             q += " AND chat_id=%s"
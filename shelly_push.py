@@ -0,0 +1,146 @@
+"""shelly_push.py — Ingestion locale des mesures Shelly Plus (MQTT ou RPC HTTP).
+
+Les Shelly Plus publient leurs NotifyStatus sur MQTT (<prefix>/events/rpc) ou
+peuvent les POSTer en HTTP. Chaque mesure rejoint le pipeline samples, comme
+perform_record, et sert de valeur fraîche à heating.get_shelly_temp().
+
+Test sans matériel :
+    python shelly_push.py http://localhost:8000/shelly/rpc 20.5   # POST simulé
+    python shelly_push.py mqtt 20.5                                # broker local
+"""
+import asyncio, hmac, json, sys, time
+from datetime import datetime
+from config import (SHELLY_ID, SHELLY_ROOM, SHELLY_PUSH_TOKEN, SHELLY_PUSH_MAX_AGE,
+                    MQTT_HOST, MQTT_PORT, MQTT_TOPIC, log)
+from bec import is_heure_creuse
+import samples
+
+try:
+    import aiomqtt
+except ImportError:
+    aiomqtt = None
+
+_last = {"tC": None, "ts": 0.0}
+_loop = None
+
+
+def latest(max_age: int = SHELLY_PUSH_MAX_AGE) -> float | None:
+    """Dernière température poussée si elle a moins de max_age secondes."""
+    if _last["tC"] is None or time.time() - _last["ts"] > max_age:
+        return None
+    return _last["tC"]
+
+
+def bind_loop(loop: asyncio.AbstractEventLoop):
+    """Boucle asyncio du bot : les notifications reçues hors boucle y sont relayées."""
+    global _loop
+    _loop = loop
+
+
+# ---------------------------------------------------------------------------
+# DÉCODAGE
+# ---------------------------------------------------------------------------
+def parse_notification(payload: dict) -> tuple[float, float] | None:
+    """Retourne (tC, ts_epoch) depuis un NotifyStatus/NotifyFullStatus ou un
+    statut brut temperature:0 ; None si le message ne porte pas de température.
+    ValueError si le message est mal formé."""
+    if not isinstance(payload, dict):
+        return None
+    params = payload.get("params", payload)
+    if not isinstance(params, dict):
+        raise ValueError(f"params invalides : {type(params).__name__}")
+    comp   = params.get("temperature:0", params)
+    t      = comp.get("tC") if isinstance(comp, dict) else None
+    if t is None:
+        return None
+    return float(t), float(params.get("ts") or time.time())
+
+
+def _accepts(src: str | None) -> bool:
+    # Les Shelly Plus s'annoncent "shellyplusht-<mac>" ; SHELLY_ID est la MAC
+    return not (SHELLY_ID and src and SHELLY_ID.lower() not in src.lower())
+
+
+def _ingest(t: float, ts: float):
+    _last.update(tC=t, ts=ts)
+    dt = datetime.fromtimestamp(ts)
+    samples.publish([samples.make_sample(SHELLY_ROOM, temp_shelly=t,
+                                         heure_creuse=is_heure_creuse(dt), ts=dt)])
+
+
+def handle_notification(payload: dict) -> bool:
+    """Traite une notification ; utilisable depuis n'importe quel thread."""
+    parsed = parse_notification(payload)
+    if parsed is None or not _accepts(payload.get("src")):
+        return False
+    if _loop is not None and _loop.is_running():
+        _loop.call_soon_threadsafe(_ingest, *parsed)
+    else:
+        _ingest(*parsed)
+    return True
+
+
+def handle_http(body: bytes, token: str | None) -> int:
+    """Corps POST sur /shelly/rpc → code HTTP."""
+    if SHELLY_PUSH_TOKEN and not hmac.compare_digest((token or "").encode(),
+                                                     SHELLY_PUSH_TOKEN.encode()):
+        return 403
+    try:
+        return 202 if handle_notification(json.loads(body or b"{}")) else 204
+    except (ValueError, TypeError, AttributeError):
+        return 400
+
+
+# ---------------------------------------------------------------------------
+# MQTT
+# ---------------------------------------------------------------------------
+async def run_mqtt():
+    """Abonnement au broker local, reconnexion automatique."""
+    if aiomqtt is None:
+        log("Shelly push MQTT : paquet aiomqtt absent, mode désactivé")
+        return
+    while True:
+        try:
+            async with aiomqtt.Client(MQTT_HOST, MQTT_PORT) as client:
+                await client.subscribe(MQTT_TOPIC)
+                log(f"Shelly push MQTT : abonné {MQTT_TOPIC} @ {MQTT_HOST}:{MQTT_PORT}")
+                async for msg in client.messages:
+                    try:
+                        handle_notification(json.loads(msg.payload))
+                    except (ValueError, TypeError, AttributeError) as e:
+                        log(f"Shelly push MQTT : message ignoré ({e})")
+        except Exception as e:
+            log(f"Shelly push MQTT ERR: {e} — reconnexion dans 30s")
+            await asyncio.sleep(30)
+
+
+# ---------------------------------------------------------------------------
+# PUBLIEUR SIMULÉ
+# ---------------------------------------------------------------------------
+def fake_notification(t: float) -> dict:
+    src = f"shellyplusht-{(SHELLY_ID or 'simu').lower()}"
+    return {"src": src, "dst": f"{src}/events", "method": "NotifyStatus",
+            "params": {"ts": time.time(), "temperature:0": {"id": 0, "tC": t}}}
+
+
+async def simulate(target: str, t: float):
+    payload = fake_notification(t)
+    if target == "mqtt":
+        if aiomqtt is None:
+            sys.exit("aiomqtt requis pour simuler en MQTT")
+        async with aiomqtt.Client(MQTT_HOST, MQTT_PORT) as client:
+            await client.publish(MQTT_TOPIC.replace("+", payload["src"]),
+                                 json.dumps(payload))
+        print(f"publié sur {MQTT_HOST}:{MQTT_PORT}")
+    else:
+        import httpx
+        headers = {"X-Shelly-Token": SHELLY_PUSH_TOKEN} if SHELLY_PUSH_TOKEN else {}
+        async with httpx.AsyncClient() as c:
+            r = await c.post(target, json=payload, headers=headers, timeout=5)
+        print(f"HTTP {r.status_code}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    asyncio.run(simulate(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else 20.0))
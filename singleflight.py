@@ -0,0 +1,62 @@
+"""singleflight.py — Fusion des appels concurrents identiques.
+
+Tant qu'une opération est en cours pour une clé, les appelants suivants
+attendent la même tâche et reçoivent le même résultat (ou la même exception) :
+un double appui ou deux utilisateurs simultanés ne déclenchent qu'un login,
+un scan d'équipements et une exécution de commandes.
+
+La clé d'une fonction décorée par @coalesce est (nom, arguments) : les
+lectures sans paramètre sont fusionnées entre elles, les écritures seulement
+si leurs paramètres sont identiques (HOME et ABSENCE restent distinctes).
+L'annulation d'un appelant n'annule pas l'opération partagée.
+
+L'opération tourne dans un contexte ratelimit.shared() : si un appelant
+interactif rejoint une opération lancée par une tâche de fond, elle passe
+en priorité interactive (ratelimit.escalate).
+"""
+import asyncio, functools
+import ratelimit
+
+_inflight: dict[tuple, tuple[asyncio.Task, list]] = {}   # clé → (tâche, priorité partagée)
+stats = {"calls": 0, "shared": 0}
+
+
+def _freeze(v):
+    if isinstance(v, (list, tuple, set)):
+        return tuple(_freeze(x) for x in v)
+    if isinstance(v, dict):
+        return tuple(sorted((k, _freeze(x)) for k, x in v.items()))
+    return v
+
+
+async def do(key: tuple, fn, *args, **kwargs):
+    """Exécute fn(*args, **kwargs) ou rejoint l'exécution en cours pour key."""
+    stats["calls"] += 1
+    flight = _inflight.get(key)
+    if flight is None:
+        ctx, cell = ratelimit.shared()
+        fut = asyncio.get_running_loop().create_task(fn(*args, **kwargs), context=ctx)
+        _inflight[key] = (fut, cell)
+        def done(f):
+            if _inflight.get(key, (None,))[0] is f:
+                del _inflight[key]
+        fut.add_done_callback(done)
+    else:
+        fut, cell = flight
+        stats["shared"] += 1
+        if ratelimit.current() == ratelimit.INTERACTIVE:
+            ratelimit.escalate(cell)
+    return await asyncio.shield(fut)
+
+
+def coalesce(fn):
+    """Décorateur : fusion des appels concurrents de fn à arguments égaux."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        key = (fn.__qualname__, _freeze(args), _freeze(kwargs))
+        return await do(key, fn, *args, **kwargs)
+    return wrapper
+
+
+def pending() -> int:
+    return len(_inflight)
@@ -0,0 +1,134 @@
+"""storage.py — Accès base : PostgreSQL (production) ou SQLite embarqué.
+
+Sans DATABASE_URL, les mêmes tables et requêtes tournent sur un fichier SQLite
+local (SQLITE_PATH, journal WAL). Les modules écrivent leurs requêtes avec des
+paramètres %s et passent par les helpers ci-dessous pour les rares
+fonctions SQL qui diffèrent entre les deux moteurs.
+"""
+import sqlite3
+import psycopg2
+from datetime import datetime
+from config import DB_URL, SQLITE_PATH, log
+
+IS_PG   = bool(DB_URL)
+ENABLED = IS_PG or bool(SQLITE_PATH)
+BACKEND = "postgres" if IS_PG else ("sqlite" if ENABLED else "aucune")
+
+# Fragments DDL / SQL propres au moteur
+ID_PK      = "SERIAL PRIMARY KEY" if IS_PG else "INTEGER PRIMARY KEY AUTOINCREMENT"
+TS_DEFAULT = "CURRENT_TIMESTAMP" if IS_PG else "(datetime('now', 'localtime'))"
+NOW        = "NOW()" if IS_PG else "datetime('now', 'localtime')"
+
+# Horodatages SQLite : texte ISO 'AAAA-MM-JJ HH:MM:SS[.ffffff]' (heure locale naïve)
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP", lambda b: datetime.fromisoformat(b.decode()))
+
+
+def hour(col: str) -> str:
+    return f"CAST(EXTRACT(HOUR FROM {col}) AS INTEGER)" if IS_PG \
+        else f"CAST(strftime('%H', {col}) AS INTEGER)"
+
+
+def minute(col: str) -> str:
+    return f"CAST(EXTRACT(MINUTE FROM {col}) AS INTEGER)" if IS_PG \
+        else f"CAST(strftime('%M', {col}) AS INTEGER)"
+
+
+def dow(col: str) -> str:
+    """Jour de semaine, 0 = dimanche (les deux moteurs)."""
+    return f"CAST(EXTRACT(DOW FROM {col}) AS INTEGER)" if IS_PG \
+        else f"CAST(strftime('%w', {col}) AS INTEGER)"
+
+
+def month(col: str) -> str:
+    return f"to_char({col}, 'YYYY-MM')" if IS_PG else f"strftime('%Y-%m', {col})"
+
+
+def epoch(col: str) -> str:
+    """Secondes epoch de l'horodatage naïf (lu comme UTC)."""
+    return f"CAST(EXTRACT(EPOCH FROM {col}) AS BIGINT)" if IS_PG \
+        else f"CAST(ROUND((julianday({col}) - 2440587.5) * 86400) AS INTEGER)"
+
+
+def trunc_hour(col: str) -> str:
+    return f"date_trunc('hour', {col})" if IS_PG \
+        else f"strftime('%Y-%m-%d %H:00:00', {col})"
+
+
+def trunc_day(col: str) -> str:
+    return f"date_trunc('day', {col})" if IS_PG \
+        else f"strftime('%Y-%m-%d 00:00:00', {col})"
+
+
+def as_datetime(v) -> datetime:
+    """Les agrégats SQLite (MIN, MAX…) perdent le type TIMESTAMP : texte ISO."""
+    return datetime.fromisoformat(v) if isinstance(v, str) else v
+
+
+# ---------------------------------------------------------------------------
+# CONNEXIONS
+# ---------------------------------------------------------------------------
+class _SqliteCursor:
+    """Curseur SQLite acceptant la syntaxe psycopg2 (%s, DDL multi-instructions)."""
+    def __init__(self, cur):
+        self._cur = cur
+
+    def execute(self, sql: str, params=()):
+        if not params and sql.strip().rstrip(";").count(";"):
+            self._cur.executescript(sql)
+        else:
+            self._cur.execute(sql.replace("%s", "?"), tuple(params))
+        return self
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+
+class _SqliteConn:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return _SqliteCursor(self._conn.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def connect():
+    """Connexion au moteur actif (mêmes méthodes que psycopg2 pour nos usages)."""
+    if IS_PG:
+        return psycopg2.connect(DB_URL)
+    if not ENABLED:
+        raise RuntimeError("aucune base configurée")
+    # check_same_thread=False : stream() est consommé paquet par paquet via
+    # asyncio.to_thread (un thread différent à chaque fois) et fermé depuis la
+    # boucle ; une connexion n'est jamais utilisée par deux threads à la fois.
+    conn = sqlite3.connect(SQLITE_PATH, timeout=10, check_same_thread=False,
+                           detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return _SqliteConn(conn)
+
+
+def stream(sql: str, params=(), name: str = "stream_cur", size: int = 5000):
+    """Lignes par paquets de `size`, mémoire bornée : curseur serveur nommé
+    sous PostgreSQL, curseur SQLite (déjà paresseux) sinon."""
+    conn = connect()
+    try:
+        cur = conn.cursor(name=name) if IS_PG else conn.cursor()
+        if IS_PG:
+            cur.itersize = size
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(size)
+            if not rows:
+                break
+            yield rows
+        cur.close()
+    finally:
+        conn.close()
+
+
+if ENABLED and not IS_PG:
+    log(f"Stockage : SQLite embarqué ({SQLITE_PATH})")
@@ -0,0 +1,198 @@
+"""tariff.py — Moteur tarifaire : périodes HC/HP (et couleurs Tempo) compilées.
+
+Un tarif = un planning journalier de transitions (HC_TRANSITIONS, ou un
+planning saisonnier TARIFF_SEASONS) et, en Tempo, une couleur par jour lue
+dans TEMPO_FILE (JSON {"AAAA-MM-JJ": "bleu|blanc|rouge"}, bleu par défaut ;
+le jour Tempo court de 06h00 à 06h00). Il est compilé en une table triée
+d'intervalles (début epoch, code de période) sur les années utiles :
+
+  - period() / is_hc() / next_change() : bisect O(log n) pour un instant
+  - classify() / hc_mask()             : np.searchsorted sur des tableaux
+
+Les heures sont des heures locales murales (naïves, comme en base) : une
+transition à 00h56 reste à 00h56 de part et d'autre d'un changement d'heure.
+Les datetimes avec fuseau sont d'abord ramenés en heure locale (TARIFF_TZ).
+"""
+import json, os
+import numpy as np
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from config import (HC_TRANSITIONS, TARIFF, TARIFF_SEASONS, TARIFF_TZ,
+                    TEMPO_FILE, log)
+from archive import to_epoch, to_datetime
+
+TEMPO_TRANSITIONS = [(6 * 60, False), (22 * 60, True)]
+TEMPO_DAY_START   = 6 * 60
+COLOURS = ("bleu", "blanc", "rouge")
+
+# Codes de période : index dans PERIODS
+PERIODS = (["HP", "HC"] if TARIFF != "tempo"
+           else [f"{p}_{c.upper()}" for c in COLOURS for p in ("HP", "HC")])
+IS_HC  = np.array([p.startswith("HC") for p in PERIODS])
+
+_starts: list[int] = []          # débuts d'intervalle (epoch), triés
+_codes:  list[int] = []
+_np_starts = np.empty(0, dtype="i8")
+_np_codes  = np.empty(0, dtype="i1")
+_years: tuple[int, int] | None = None
+_tempo: dict[str, str] = {}
+_tempo_mtime = 0.0
+
+
+def _naive(dt: datetime | None) -> datetime:
+    if dt is None:
+        return datetime.now()
+    return dt.astimezone(ZoneInfo(TARIFF_TZ)).replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def _schedule(day: datetime) -> list[tuple[int, bool]]:
+    """Transitions du jour (saison en vigueur : dernière date MM-JJ atteinte)."""
+    if TARIFF == "tempo":
+        return TEMPO_TRANSITIONS
+    if not TARIFF_SEASONS:
+        return HC_TRANSITIONS
+    key = f"{day.month:02d}-{day.day:02d}"
+    past = [k for k in sorted(TARIFF_SEASONS) if k <= key]
+    return TARIFF_SEASONS[past[-1] if past else max(TARIFF_SEASONS)]
+
+
+def _colour(day: datetime) -> int:
+    return COLOURS.index(_tempo.get(day.strftime("%Y-%m-%d"), "bleu"))
+
+
+def _code(day: datetime, minute: int, hc: bool) -> int:
+    if TARIFF != "tempo":
+        return int(hc)
+    tempo_day = day if minute >= TEMPO_DAY_START else day - timedelta(days=1)
+    return 2 * _colour(tempo_day) + int(hc)
+
+
+def _load_tempo():
+    global _tempo, _tempo_mtime
+    if TARIFF != "tempo" or not os.path.exists(TEMPO_FILE):
+        return False
+    mtime = os.path.getmtime(TEMPO_FILE)
+    if mtime == _tempo_mtime:
+        return False
+    try:
+        with open(TEMPO_FILE) as f:
+            _tempo = {k: v.lower() for k, v in json.load(f).items() if v.lower() in COLOURS}
+        _tempo_mtime = mtime
+        return True
+    except Exception as e:
+        log(f"Tarif Tempo ERR: {e}"); return False
+
+
+def compile_table(first_year: int, last_year: int):
+    """Table d'intervalles du 1er janvier first_year au 1er janvier last_year+1."""
+    global _starts, _codes, _np_starts, _np_codes, _years
+    starts, codes = [], []
+    day = datetime(first_year, 1, 1)
+    while day.year <= last_year:
+        sched = sorted(_schedule(day))
+        # État à minuit = dernier état du planning (la veille)
+        points = [(0, sched[-1][1])] + [(m, hc) for m, hc in sched if m > 0]
+        if TARIFF == "tempo":
+            points.append((TEMPO_DAY_START, _state_at(sched, TEMPO_DAY_START)))
+        for m, hc in sorted(set(points)):
+            code = _code(day, m, hc)
+            if not codes or codes[-1] != code:
+                starts.append(to_epoch(day) + m * 60); codes.append(code)
+        day += timedelta(days=1)
+    _starts, _codes = starts, codes
+    _np_starts = np.array(starts, dtype="i8")
+    _np_codes  = np.array(codes, dtype="i1")
+    _years = (first_year, last_year)
+
+
+def _state_at(sched: list[tuple[int, bool]], minute: int) -> bool:
+    past = [hc for m, hc in sched if m <= minute]
+    return past[-1] if past else sched[-1][1]
+
+
+def ensure(first: datetime, last: datetime):
+    """Recompile si la table ne couvre pas [first, last] ou si Tempo a changé."""
+    y0, y1 = first.year, last.year + 1
+    if _load_tempo() or _years is None or y0 < _years[0] or y1 > _years[1]:
+        if _years:
+            y0, y1 = min(y0, _years[0]), max(y1, _years[1])
+        compile_table(y0, y1)
+
+
+# ---------------------------------------------------------------------------
+# INSTANT UNIQUE
+# ---------------------------------------------------------------------------
+def _code_at(dt: datetime) -> int:
+    ensure(dt, dt)     # avant toute lecture des tables (recompilation possible)
+    return _codes[bisect_right(_starts, to_epoch(dt)) - 1]
+
+
+def period(dt: datetime | None = None) -> str:
+    return PERIODS[_code_at(_naive(dt))]
+
+
+def is_hc(dt: datetime | None = None) -> bool:
+    return bool(IS_HC[_code_at(_naive(dt))])
+
+
+def next_change(dt: datetime | None = None, hc_only: bool = False) -> datetime:
+    """Prochain changement de période (ou seulement de HC/HP si hc_only)."""
+    dt = _naive(dt)
+    ensure(dt, dt + timedelta(days=2))
+    i, hc = bisect_right(_starts, to_epoch(dt)) - 1, is_hc(dt)
+    for j in range(i + 1, len(_starts)):
+        if not hc_only or bool(IS_HC[_codes[j]]) != hc:
+            return to_datetime(_starts[j])
+    return dt + timedelta(days=1)
+
+
+def seconds_until_change(dt: datetime | None = None) -> int:
+    dt = _naive(dt)
+    return int((next_change(dt) - dt.replace(microsecond=0)).total_seconds())
+
+
+def label(dt: datetime | None = None) -> str:
+    dt = _naive(dt)
+    nxt = next_change(dt, hc_only=True)
+    colour = f" {period(dt).split('_')[1].lower()}" if TARIFF == "tempo" else ""
+    if is_hc(dt):
+        return f"🟢 HC{colour} jusqu'à {nxt:%Hh%M}"
+    return f"🔴 HP{colour} — prochain HC à {nxt:%Hh%M}"
+
+
+# ---------------------------------------------------------------------------
+# VECTORISÉ
+# ---------------------------------------------------------------------------
+def classify(ts: np.ndarray) -> np.ndarray:
+    """Codes de période (index PERIODS) pour des epochs int64 en heure locale."""
+    ts = np.asarray(ts, dtype="i8")
+    if not len(ts):
+        return np.empty(0, dtype="i1")
+    ensure(to_datetime(ts.min()), to_datetime(ts.max()))
+    return _np_codes[np.searchsorted(_np_starts, ts, side="right") - 1]
+
+
+def hc_mask(ts: np.ndarray) -> np.ndarray:
+    return IS_HC[classify(ts)]
+
+
+def hc_hours(day: datetime | None = None) -> set[int]:
+    """Heures du jour majoritairement en HC (affichages par heure)."""
+    day = _naive(day).replace(hour=0, minute=0, second=0, microsecond=0)
+    minutes = to_epoch(day) + np.arange(24 * 60, dtype="i8") * 60
+    share = hc_mask(minutes).reshape(24, 60).mean(axis=1)
+    return {h for h in range(24) if share[h] > 0.5}
+
+
+def integral(weights: np.ndarray, ts: np.ndarray) -> np.ndarray:
+    """∫ weights[période(t)] dt depuis le début de la table, aux instants ts
+    (epochs) : le poids d'un intervalle [a, b) est integral(b) − integral(a)."""
+    ts = np.asarray(ts, dtype="i8")
+    if not len(ts):
+        return np.empty(0)
+    ensure(to_datetime(ts.min()), to_datetime(ts.max()))
+    w   = np.asarray(weights, dtype="f8")[_np_codes]
+    cum = np.concatenate([[0.0], np.cumsum(w[:-1] * np.diff(_np_starts))])
+    i   = np.searchsorted(_np_starts, ts, side="right") - 1
+    return cum[i] + w[i] * (ts - _np_starts[i])
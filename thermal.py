@@ -0,0 +1,96 @@
+"""thermal.py — Modèle thermique du 1er ordre (RC) par pièce.
+
+    dT/dt = a·T + c + b·u       (°C/h, u = 1 si le radiateur chauffe)
+
+soit τ = −1/a (constante de temps, h), T_ext = −c/a (température d'équilibre
+radiateur coupé) et b la vitesse de chauffe à pleine puissance (°C/h).
+
+La série de la pièce (archive locale + base, archive.history) est remise sur
+une grille régulière (deadband.reconstruct), dérivée par différences finies,
+puis ajustée en une seule résolution de moindres carrés NumPy sur tous les
+segments chauffe / arrêt. Les intervalles à cheval sur un trou de données
+sont écartés. u est estimé par consigne > température radiateur.
+
+    python thermal.py [pièce] [jours]
+"""
+import sys
+import numpy as np
+from datetime import datetime, timedelta
+from config import CONFORT_VALS, DEADBAND_MAX_GAP
+import archive
+from deadband import reconstruct
+
+STEP     = 300          # pas de la grille (s)
+MIN_ROWS = 24           # intervalles exploitables minimum
+
+
+def fit_arrays(t: np.ndarray, temp: np.ndarray, u: np.ndarray,
+               step: int = STEP) -> dict | None:
+    """Ajuste le modèle sur une grille régulière (t en s, NaN = inconnu)."""
+    dT = np.diff(temp) * (3600 / step)
+    T0, u0 = temp[:-1], u[:-1]
+    ok = np.isfinite(dT) & np.isfinite(T0) & np.isfinite(u0)
+    if ok.sum() < MIN_ROWS:
+        return None
+    X = np.column_stack([T0[ok], np.ones(ok.sum()), u0[ok]])
+    y = dT[ok]
+    coef, *_ = np.linalg.lstsq(X, y, rcond=None)
+    resid = y - X @ coef
+    a, c, b = map(float, coef)
+    on    = int(u0[ok].sum())
+    return {
+        "tau_h": -1 / a if a < 0 else None,
+        "t_ext": -c / a if a < 0 else None,
+        "power": b if on else None,
+        "rmse":  float(np.sqrt(np.mean(resid ** 2))),
+        "n":     int(ok.sum()), "n_on": on,
+        "hours": float((t[-1] - t[0]) / 3600) if len(t) else 0.0,
+    }
+
+
+def room_series(room: str, start: datetime, end: datetime, step: int = STEP) -> dict | None:
+    """Grille régulière : t, temp (ambiance sinon radiateur), consigne, u (chauffe)."""
+    data = archive.history("temp_logs", room, start - timedelta(seconds=DEADBAND_MAX_GAP), end)
+    if not len(data["ts"]):
+        return None
+    at  = np.arange(archive.to_epoch(start), archive.to_epoch(end), step, dtype="i8")
+    ts  = data["ts"]
+    rad = data["temp_radiateur"].astype("f8")
+    # Sonde d'ambiance si la pièce en a une, sinon sonde du radiateur
+    shelly = data["temp_shelly"].astype("f8")
+    temp = reconstruct(ts, shelly if np.isfinite(shelly).any() else rad, at, "linear")
+    # Décision du thermostat : dernières valeurs lues (escalier)
+    cons = reconstruct(ts, data["consigne"].astype("f8"), at, "step")
+    rad  = reconstruct(ts, rad, at, "step")
+    with np.errstate(invalid="ignore"):
+        u = np.where(np.isfinite(cons) & np.isfinite(rad), (cons > rad).astype("f8"), np.nan)
+    return {"t": at, "temp": temp, "consigne": cons, "u": u}
+
+
+def fit_room(room: str, days: int = 30, step: int = STEP) -> dict | None:
+    end = datetime.now()
+    s   = room_series(room, end - timedelta(days=days), end, step)
+    return fit_arrays(s["t"], s["temp"], s["u"], step) if s else None
+
+
+def format_fit(room: str, f: dict | None) -> str:
+    if not f:
+        return f"<b>{room}</b> : données insuffisantes"
+    tau   = f"τ={f['tau_h']:.1f}h" if f["tau_h"] else "τ=—"
+    power = f"chauffe {f['power']:+.2f}°/h" if f["power"] is not None else "chauffe —"
+    t_ext = f"équilibre {f['t_ext']:.1f}°" if f["t_ext"] is not None else ""
+    return (f"<b>{room}</b> : {tau}  {power}  {t_ext}\n"
+            f"<code>  err {f['rmse']:.2f}°/h  n={f['n']} ({f['n_on']} en chauffe)</code>")
+
+
+def report(rooms: list[str] | None = None, days: int = 30) -> str:
+    rooms = rooms or [v["name"] for v in CONFORT_VALS.values()]
+    lines = [f"🧪 <b>MODÈLE THERMIQUE</b> ({days}j)", ""]
+    lines += [format_fit(r, fit_room(r, days)) for r in rooms]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    room = sys.argv[1] if len(sys.argv) > 1 else None
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    print(report([room] if room else None, days))
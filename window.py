@@ -0,0 +1,146 @@
+"""window.py — Détection de fenêtre ouverte (chute rapide de température).
+
+Pour chaque série (pièce, métrique) de relevés, la pente est estimée par
+régression linéaire sur les WINDOW_MINUTES dernières minutes, à partir de
+sommes glissantes (n, Σt, Σv, Σt², Σtv) mises à jour en O(1) par relevé.
+Une pente inférieure à −WINDOW_DROP_C_H °C/h (au moins WINDOW_MIN_SAMPLES
+relevés) ouvre un épisode : alerte et, si WINDOW_ECO et que la pièce était
+en HOME (dernière consigne connue plus proche de la consigne calibrée HOME
+que de l'éco), passage du radiateur en éco (apply_heating_mode "ABSENCE").
+L'épisode se ferme quand la baisse a cessé (pente ≥ 0) et au moins
+WINDOW_HOLD_MIN minutes après son début ; seul un radiateur basculé par le
+détecteur repasse alors en HOME.
+
+Après un changement de consigne (détecteur, bot, planning), la température
+du radiateur chute d'elle-même : sa série est ignorée et vidée pendant
+WINDOW_SETTLE_MIN minutes.
+
+La latence dépend de la cadence des relevés : push Shelly et RAD_SAMPLE_S de
+quelques minutes pour une détection en minutes.
+"""
+import asyncio
+from collections import deque
+from datetime import datetime
+from config import (CONFORT_VALS, WINDOW_MINUTES, WINDOW_DROP_C_H, WINDOW_MIN_SAMPLES,
+                    WINDOW_HOLD_MIN, WINDOW_ECO, WINDOW_SETTLE_MIN, log)
+from archive import to_epoch
+import samples, alerts, calibration
+
+METRICS = ("temp_radiateur", "temp_shelly")
+HOME    = {v["name"]: v["temp"] for v in CONFORT_VALS.values()}
+ECO     = {v["name"]: v["eco"] for v in CONFORT_VALS.values()}
+REBASE  = 86400     # recentrage de l'origine des temps (précision des sommes)
+
+
+class SlidingSlope:
+    """Pente (°C/h) des relevés d'une fenêtre glissante, en O(1) amorti."""
+
+    def __init__(self, span_s: int):
+        self.span = span_s
+        self.pts  = deque()
+        self.t0   = None
+        self.n = self.st = self.sv = self.stt = self.stv = 0.0
+
+    def _add(self, t: float, v: float, sign: int):
+        self.n += sign; self.st += sign * t; self.sv += sign * v
+        self.stt += sign * t * t; self.stv += sign * t * v
+
+    def append(self, ts: int, v: float):
+        if self.t0 is None or ts - self.t0 > REBASE:
+            self.t0 = ts
+            pts, self.pts = list(self.pts), deque()
+            self.n = self.st = self.sv = self.stt = self.stv = 0.0
+            for t, x in pts:
+                self._push(t, x)
+        self._push(ts, v)
+        while self.pts and ts - self.pts[0][0] > self.span:
+            t, x = self.pts.popleft()
+            self._add(t - self.t0, x, -1)
+
+    def _push(self, ts: int, v: float):
+        self.pts.append((ts, v))
+        self._add(ts - self.t0, v, 1)
+
+    def slope(self) -> float | None:
+        den = self.n * self.stt - self.st * self.st
+        if self.n < WINDOW_MIN_SAMPLES or den <= 0:
+            return None
+        return (self.n * self.stv - self.st * self.sv) / den * 3600
+
+
+_slopes: dict[tuple[str, str], SlidingSlope] = {}
+open_since: dict[str, datetime] = {}       # pièces en épisode « fenêtre ouverte »
+_eco: set[str] = set()                     # pièces passées en éco par le détecteur
+_consigne: dict[str, tuple[datetime, float]] = {}   # dernière consigne relevée
+_changed: dict[str, datetime] = {}         # dernier changement de consigne
+
+
+def _was_home(room: str) -> bool:
+    """La dernière consigne relevée correspond-elle au mode HOME (calibré) ?"""
+    last = _consigne.get(room)
+    if last is None or room not in HOME:
+        return False
+    at, c = last
+    return (abs(c - calibration.setpoint(room, HOME[room], at))
+            < abs(c - calibration.setpoint(room, ECO[room], at)))
+
+
+def _settling(room: str, ts: datetime) -> bool:
+    since = _changed.get(room)
+    return since is not None and (ts - since).total_seconds() < WINDOW_SETTLE_MIN * 60
+
+
+def mode_changed(room: str):
+    """Consigne écrite sur le radiateur (heating.apply_heating_mode)."""
+    _changed[room] = datetime.now()
+    _slopes.pop((room, "temp_radiateur"), None)
+
+
+def _switch(mode: str, room: str):
+    from heating import apply_heating_mode
+    async def go():
+        try:
+            log(f"Fenêtre {room} → {mode} : {await apply_heating_mode(mode, [room])}")
+        except Exception as e:
+            log(f"Fenêtre {room} {mode} ERR: {e}")
+    try:
+        asyncio.get_running_loop().create_task(go())
+    except RuntimeError:
+        log(f"Fenêtre {room} : pas de boucle asyncio, {mode} non appliqué")
+
+
+@samples.subscribe
+def on_sample(s: dict):
+    room, ts = s["room"], s["ts"]
+    c = s.get("consigne")
+    if c is not None:                      # push Shelly : pas de consigne
+        prev = _consigne.get(room)
+        if prev is not None and prev[1] != c:
+            _changed[room] = ts
+            _slopes.pop((room, "temp_radiateur"), None)
+        _consigne[room] = (ts, c)
+    for metric in METRICS:
+        v = s.get(metric)
+        if v is None or (metric == "temp_radiateur" and _settling(room, ts)):
+            continue
+        sl = _slopes.get((room, metric))
+        if sl is None:
+            sl = _slopes[(room, metric)] = SlidingSlope(WINDOW_MINUTES * 60)
+        sl.append(to_epoch(ts), v)
+        slope = sl.slope()
+        if slope is None:
+            continue
+        if room not in open_since and slope <= -WINDOW_DROP_C_H:
+            open_since[room] = ts
+            alerts.notify(("fenêtre", room), f"🪟 Fenêtre ouverte ? {room} : "
+                          f"{slope:+.1f}°C/h ({metric.split('_')[1]}, {v:.1f}°C)")
+            if WINDOW_ECO and _was_home(room):
+                _eco.add(room)
+                _switch("ABSENCE", room)
+        elif (room in open_since and slope >= 0
+              and (ts - open_since[room]).total_seconds() >= WINDOW_HOLD_MIN * 60):
+            del open_since[room]
+            log(f"Fenêtre {room} : baisse terminée")
+            if room in _eco:
+                _eco.discard(room)
+                _switch("HOME", room)